@@ -15,6 +15,7 @@ usage ()
     Commands:
     install     Install pip
     test        Test code and show coverage
+    bench       Run conversion benchmarks and print JSON results
     clean       Clean associated files
 
     Options:
@@ -54,6 +55,9 @@ case $1 in
     test )
         coverage run runtests.py && coverage report -m
         exit $? ;;
+    bench )
+        python runbenchmarks.py
+        exit $? ;;
     clean )
         find . \( -name *.pyc -o -name __pycache__ -o -name .coverage -o -name *,cover\) -delete
         exit $? ;;
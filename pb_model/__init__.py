@@ -0,0 +1,5 @@
+import django
+
+if django.VERSION < (3, 2):
+    # django >= 3.2 finds the app config by itself
+    default_app_config = 'pb_model.apps.DjangoPBConfig'
@@ -1,8 +1,22 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import logging
+
 from django.apps import AppConfig  # pragma: no cover
+from django.conf import settings
 
 
 class DjangoPBConfig(AppConfig):  # pragma: no cover
     name = 'pb_model'  # pragma: no cover
+
+    def ready(self):
+        # debug logging of conversions with settings.DEBUG, unless the level
+        # of pb_model logger is configured already
+        logger = logging.getLogger(self.name)
+        if settings.DEBUG and logger.level == logging.NOTSET:
+            logger.setLevel(logging.DEBUG)
+
+        if getattr(settings, 'PB_MODEL_WARMUP', False):
+            from .models import warm_up
+            warm_up()
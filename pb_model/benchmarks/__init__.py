@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of to_pb/from_pb conversion over test models.
+
+Run with ``runbenchmarks.py`` at repository root, results are emitted as JSON
+to compare across releases and protobuf backends.
+"""
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+import platform
+import sys
+import time
+
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import google.protobuf
+from google.protobuf.internal import api_implementation
+
+
+class Case(object):
+    """A benchmarked operation
+
+    :param name: unique name of the case, ex: ``main.to_pb``
+    :param func: callable running the operation once
+    :param rows: number of rows handled by one call, to compute row throughput
+    :param setup: optional callable run once before measuring
+    """
+
+    def __init__(self, name, func, rows=1, setup=None):
+        self.name = name
+        self.func = func
+        self.rows = rows
+        self.setup = setup
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values
+    """
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_case(case, iterations, warmup=3):
+    """Measure a case, queries are counted in a separate call so that query
+    logging doesn't affect timing
+
+    :returns: dict of results
+    """
+    if case.setup is not None:
+        case.setup()
+    for _ in range(warmup):
+        case.func()
+
+    with CaptureQueriesContext(connection) as queries:
+        case.func()
+
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        case.func()
+        latencies.append(time.perf_counter() - start)
+
+    total = sum(latencies)
+    latencies.sort()
+    return {
+        'name': case.name,
+        'rows': case.rows,
+        'iterations': iterations,
+        'total_s': total,
+        'ops_per_s': iterations / total if total else None,
+        'rows_per_s': iterations * case.rows / total if total else None,
+        'latency_us': {
+            'min': latencies[0] * 1e6,
+            'p50': percentile(latencies, 0.50) * 1e6,
+            'p90': percentile(latencies, 0.90) * 1e6,
+            'p99': percentile(latencies, 0.99) * 1e6,
+            'max': latencies[-1] * 1e6,
+        },
+        'queries_per_op': len(queries.captured_queries),
+    }
+
+
+def environment():
+    """Versions and protobuf backend the results were measured with
+    """
+    return {
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': sys.platform,
+        'django': django.get_version(),
+        'protobuf': google.protobuf.__version__,
+        'protobuf_backend': api_implementation.Type(),
+        'database': connection.vendor,
+    }
+
+
+def run(cases, iterations, name_filter=None, log=None):
+    """Run cases and collect results
+
+    :param cases: iterable of :class:`Case`
+    :param iterations: number of measured calls per case
+    :param name_filter: only run cases whose name contains this string
+    :param log: optional file to report progress to
+    :returns: dict with ``environment`` and ``results``
+    """
+    results = []
+    for case in cases:
+        if name_filter and name_filter not in case.name:
+            continue
+        result = run_case(case, iterations)
+        if log is not None:
+            log.write('{name}: {ops_per_s:.1f} ops/s, p50 {p50:.1f}us, {queries} queries\n'.format(
+                name=case.name, ops_per_s=result['ops_per_s'] or 0,
+                p50=result['latency_us']['p50'], queries=result['queries_per_op']))
+        results.append(result)
+    return {'environment': environment(), 'results': results}
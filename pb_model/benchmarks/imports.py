@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Import-time benchmark of pb_model modules, measured by ``python -X importtime``
+in fresh interpreters with Django already set up, so that only the cost of
+pb_model and what it imports on top of Django is counted.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+MODULES = ('pb_model.fields', 'pb_model.models')
+
+_SCRIPT = '''
+import json, logging, sys
+import django
+from django.conf import settings
+settings.configure(INSTALLED_APPS=[])
+django.setup()
+before = set(sys.modules)
+{imports}
+json.dump({{
+    'modules': sorted(set(sys.modules) - before),
+    'root_handlers': len(logging.root.handlers),
+}}, sys.stdout)
+'''
+
+
+def import_time(modules=MODULES, runs=5):
+    """Measure import time of modules
+
+    :param modules: names of modules imported, in order
+    :param runs: number of fresh interpreters measured, the fastest run is reported
+    :returns: dict with cumulative microseconds per module of the fastest run,
+        modules newly imported and number of handlers of root logger afterwards
+    """
+    script = _SCRIPT.format(imports='\n'.join('import {}'.format(module) for module in modules))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))] +
+        [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    env.pop('DJANGO_SETTINGS_MODULE', None)
+
+    best = None
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+                                 universal_newlines=True)
+        times = _parse_importtime(process.stderr, modules)
+        if best is None or sum(times.values()) < sum(best[0].values()):
+            best = times, json.loads(process.stdout)
+
+    times, loaded = best
+    return {
+        'import_us': times,
+        'total_us': sum(times.values()),
+        'modules': loaded['modules'],
+        'root_handlers': loaded['root_handlers'],
+    }
+
+
+def _parse_importtime(output, modules):
+    # lines of "import time: self [us] | cumulative | imported package"
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        if name in modules and cumulative.strip().isdigit():
+            times[name] = int(cumulative)
+    return times
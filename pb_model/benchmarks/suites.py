@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pb_model.tests import models, models_pb2
+from pb_model.tests.fixtures import create_dataset
+
+from .harness import Case
+
+
+def cases(rows):
+    """Benchmark cases over a dataset created by create_dataset(rows)
+    """
+    samples = create_dataset(rows)
+    relation, main, root = samples['relation'], samples['main'], samples['root']
+    relation_pb, main_pb, root_pb_obj = relation.to_pb(), main.to_pb(), root.to_pb()
+    main_bytes, root_bytes = main_pb.SerializeToString(), root_pb_obj.SerializeToString()
+
+    return [
+        Case('relation.to_pb', lambda: relation.to_pb(depth=0)),
+        Case('relation.from_pb', lambda: models.Relation().from_pb(relation_pb)),
+        Case('main.to_pb', main.to_pb),
+        Case('main.to_pb.depth0', lambda: main.to_pb(depth=0)),
+        Case('main.to_pb_serialize.depth0', lambda: main.to_pb(depth=0).SerializeToString()),
+        Case('main.to_pb_bytes.depth0', lambda: main.to_pb_bytes(depth=0)),
+        Case('main.from_pb', lambda: models.Main().from_pb(main_pb)),
+        Case('main.parse_from_pb', lambda: models.Main().from_pb(models_pb2.Main.FromString(main_bytes))),
+        Case('main.from_pb_bytes', lambda: models.Main().from_pb_bytes(main_bytes)),
+        Case('root.to_pb', root.to_pb),
+        Case('root.to_pb_serialize', lambda: root.to_pb().SerializeToString()),
+        Case('root.to_pb_bytes', root.to_pb_bytes),
+        Case('root.from_pb', lambda: models.Root().from_pb(root_pb_obj)),
+        Case('root.parse_from_pb', lambda: models.Root().from_pb(models_pb2.Root.FromString(root_bytes))),
+        Case('root.from_pb_bytes', lambda: models.Root().from_pb_bytes(root_bytes)),
+        Case('main.queryset.per_row_to_pb', lambda: [m.to_pb() for m in models.Main.objects.all()], rows=rows),
+        Case('main.queryset.to_pb_list', lambda: models.Main.objects.all().to_pb_list(), rows=rows),
+        Case('main.queryset.iter_pb', lambda: list(models.Main.objects.all().iter_pb(chunk_size=500)), rows=rows),
+        Case('root.queryset.to_pb_list', lambda: models.Root.objects.all().to_pb_list(), rows=rows),
+    ]
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Length-delimited framing of protobuf messages, each frame is the message
+size as varint followed by the serialized message, same as
+``writeDelimitedTo()``/``parseDelimitedFrom()`` of the Java runtime.
+"""
+
+import io
+
+from .models import DjangoPBModelError
+
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_START_GROUP = 3
+WIRETYPE_END_GROUP = 4
+WIRETYPE_FIXED32 = 5
+
+# 64 bits in 7 bits groups
+_MAX_VARINT_SIZE = 10
+
+
+def encode_varint(value):
+    """Encode a non-negative integer as protobuf varint
+
+    :param value: int
+    :returns: bytes
+    """
+    _bytes = bytearray()
+    while value > 0x7f:
+        _bytes.append((value & 0x7f) | 0x80)
+        value >>= 7
+    _bytes.append(value)
+    return bytes(_bytes)
+
+
+def varint_size(value):
+    """Getting the number of bytes of encode_varint(value)
+
+    :param value: int
+    :returns: int
+    """
+    size = 1
+    while value > 0x7f:
+        value >>= 7
+        size += 1
+    return size
+
+
+def encode_delimited(data):
+    """Frame serialized message with its size
+
+    :param data: serialized message bytes
+    :returns: bytes
+    """
+    return encode_varint(len(data)) + data
+
+
+def iter_delimited(stream, max_size=None):
+    """Iterate over serialized messages of a length-delimited stream, reading
+    only one frame at a time
+
+    :param stream: bytes or file-like object with ``read(size)``
+    :param max_size: maximum allowed size of a single message, None for no limit
+    :returns: generator of serialized message bytes
+    :raises DjangoPBModelError: if stream is truncated or a frame is too large
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+
+    while True:
+        size = _read_varint(stream)
+        if size is None:
+            return
+        if max_size is not None and size > max_size:
+            raise DjangoPBModelError(
+                "Delimited message of {} bytes exceeds limit of {} bytes".format(size, max_size))
+        yield _read_exactly(stream, size)
+
+
+def iter_repeated_field(stream, field_number, max_size=None):
+    """Iterate over serialized messages of a repeated message field of a
+    serialized wrapper message, reading only one field at a time, other
+    fields of the wrapper are skipped
+
+    :param stream: bytes or file-like object with ``read(size)``
+    :param field_number: number of the repeated field in the wrapper message
+    :param max_size: maximum allowed size of a single message, None for no limit
+    :returns: generator of serialized message bytes
+    :raises DjangoPBModelError: if stream is truncated or malformed, or a message is too large
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+
+    while True:
+        tag = _read_varint(stream)
+        if tag is None:
+            return
+        number, wire_type = tag >> 3, tag & 0x7
+        if wire_type == WIRETYPE_LENGTH_DELIMITED:
+            size = _read_varint(stream)
+            if size is None:
+                raise DjangoPBModelError("Truncated field {} in wrapper message".format(number))
+            if number != field_number:
+                _read_exactly(stream, size)
+                continue
+            if max_size is not None and size > max_size:
+                raise DjangoPBModelError(
+                    "Message of {} bytes exceeds limit of {} bytes".format(size, max_size))
+            yield _read_exactly(stream, size)
+        else:
+            _skip_value(stream, number, wire_type)
+
+
+def split_fields(data):
+    """Split a serialized message into fields
+
+    :param data: serialized message
+    :returns: generator of (field number, bytes of the field, tag included)
+    :raises DjangoPBModelError: if data is truncated or malformed
+    """
+    for number, _, _, chunk in iter_fields(data):
+        yield number, chunk
+
+
+def iter_fields(data):
+    """Iterate over fields of a serialized message, in wire order, repeated
+    fields and fields occurring more than once are yielded per occurrence
+
+    :param data: serialized message, bytes
+    :returns: generator of (field number, wire type, value, bytes of the field,
+        tag included), value is an int for varints, bytes for fixed size and
+        length-delimited values without the length, None for groups
+    :raises DjangoPBModelError: if data is truncated or malformed
+    """
+    pos, end = 0, len(data)
+    while pos < end:
+        start = pos
+        tag = data[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = _decode_varint(data, pos)
+        number, wire_type = tag >> 3, tag & 0x7
+        if number == 0:
+            raise DjangoPBModelError("Invalid field number 0")
+        if wire_type == WIRETYPE_VARINT and pos < end and data[pos] < 0x80:
+            # single byte varint, the most common value
+            value = data[pos]
+            pos += 1
+        else:
+            value, pos = _decode_value(data, pos, number, wire_type)
+        if pos > end:
+            raise DjangoPBModelError("Truncated field {}".format(number))
+        yield number, wire_type, value, data[start:pos]
+
+
+def _decode_value(data, pos, number, wire_type):
+    if wire_type == WIRETYPE_VARINT:
+        return _decode_varint(data, pos)
+    if wire_type == WIRETYPE_LENGTH_DELIMITED:
+        size, pos = _decode_varint(data, pos)
+        return data[pos:pos + size], pos + size
+    if wire_type == WIRETYPE_FIXED64:
+        return data[pos:pos + 8], pos + 8
+    if wire_type == WIRETYPE_FIXED32:
+        return data[pos:pos + 4], pos + 4
+    if wire_type == WIRETYPE_START_GROUP:
+        while True:
+            tag, pos = _decode_varint(data, pos)
+            if tag == (number << 3 | WIRETYPE_END_GROUP):
+                return None, pos
+            _, pos = _decode_value(data, pos, tag >> 3, tag & 0x7)
+    raise DjangoPBModelError("Unsupported wire type {} of field {}".format(wire_type, number))
+
+
+def _decode_varint(data, pos):
+    value = shift = 0
+    while True:
+        if shift >= _MAX_VARINT_SIZE * 7:
+            raise DjangoPBModelError("Malformed varint")
+        try:
+            _byte = data[pos]
+        except IndexError:
+            raise DjangoPBModelError("Truncated varint")
+        pos += 1
+        value |= (_byte & 0x7f) << shift
+        if not _byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _skip_value(stream, number, wire_type):
+    if wire_type == WIRETYPE_LENGTH_DELIMITED:
+        size = _read_varint(stream)
+        if size is None:
+            raise DjangoPBModelError("Truncated field {}".format(number))
+        _read_exactly(stream, size)
+    elif wire_type == WIRETYPE_VARINT:
+        if _read_varint(stream) is None:
+            raise DjangoPBModelError("Truncated field {}".format(number))
+    elif wire_type == WIRETYPE_FIXED64:
+        _read_exactly(stream, 8)
+    elif wire_type == WIRETYPE_FIXED32:
+        _read_exactly(stream, 4)
+    else:
+        raise DjangoPBModelError("Unsupported wire type {} of field {}".format(wire_type, number))
+
+
+def _read_varint(stream):
+    """Read a varint from stream with _decode_varint(), None at the end of stream"""
+    _bytes = bytearray()
+    while True:
+        _byte = stream.read(1)
+        if not _byte:
+            if not _bytes:
+                return None
+            raise DjangoPBModelError("Truncated varint in delimited stream")
+        _bytes += _byte
+        if not _byte[0] & 0x80 or len(_bytes) > _MAX_VARINT_SIZE:
+            return _decode_varint(_bytes, 0)[0]
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise DjangoPBModelError(
+                "Truncated delimited message, {} of {} bytes read".format(size - remaining, size))
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import sys
+import base64
 import logging
+import collections
+import datetime
+import functools
 import json
+import math
+import struct
 import uuid
 
 from django.db import models
@@ -11,13 +16,10 @@ from django.conf import settings
 from django.utils import timezone
 
 from google.protobuf.descriptor import FieldDescriptor
-from google.protobuf.any_pb2 import Any
 
-logging.basicConfig()
+from . import instrumentation
+
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.WARNING)
-if settings.DEBUG:
-    LOGGER.setLevel(logging.DEBUG)
 
 
 PB_FIELD_TYPE_TIMESTAMP = FieldDescriptor.MAX_TYPE + 1
@@ -27,14 +29,43 @@ PB_FIELD_TYPE_MESSAGE = FieldDescriptor.MAX_TYPE + 4
 PB_FIELD_TYPE_REPEATED_MESSAGE = FieldDescriptor.MAX_TYPE + 5
 PB_FIELD_TYPE_MESSAGE_MAP = FieldDescriptor.MAX_TYPE + 6
 PB_FIELD_TYPE_MESSAGE_ANY = FieldDescriptor.MAX_TYPE + 7
+PB_FIELD_TYPE_ENUM_NAME = FieldDescriptor.MAX_TYPE + 8
+
+EnumTables = collections.namedtuple('EnumTables', ['names_by_number', 'numbers_by_name'])
+_enum_tables = {}  # {enum full name: EnumTables}
+
+
+def enum_tables(enum_type):
+    """Getting lookup tables between numbers and names of an enum, built
+    once per enum
+
+    :param enum_type: protobuf enum descriptor
+    :returns: EnumTables of dicts
+    """
+    try:
+        return _enum_tables[enum_type.full_name]
+    except KeyError:
+        pass
+    tables = EnumTables({number: value.name for number, value in enum_type.values_by_number.items()},
+                        {value.name: value.number for value in enum_type.values})
+    _enum_tables[enum_type.full_name] = tables
+    return tables
+
+
+def enum_choices(enum_type, by_name=False):
+    """Getting django choices of an enum
+
+    :param enum_type: protobuf enum descriptor
+    :param by_name: choices of names instead of numbers
+    :returns: list of (value, label)
+    """
+    return [(value.name if by_name else value.number, value.name) for value in enum_type.values]
 
 
 def _defaultfield_to_pb(pb_obj, pb_field, dj_field_value):
     """ handling any fields conversion to protobuf
     """
     LOGGER.debug("Django Value field, assign proto msg field: {} = {}".format(pb_field.name, dj_field_value))
-    if sys.version_info < (3,) and type(dj_field_value) is buffer:
-        dj_field_value = bytes(dj_field_value)
     setattr(pb_obj, pb_field.name, dj_field_value)
 
 
@@ -45,6 +76,41 @@ def _defaultfield_from_pb(instance, dj_field_name, pb_field, pb_value):
     setattr(instance, dj_field_name, pb_value)
 
 
+_TIMESTAMP_FULL_NAME = 'google.protobuf.Timestamp'
+_EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+_EPOCH_AWARE = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+_SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def datetime_to_timestamp(value, use_tz=None):
+    """Converting datetime to seconds and nanos of a Timestamp, same as
+    ``Timestamp.FromDatetime()`` but without a time tuple round trip
+
+    :param value: aware datetime, or naive datetime in UTC if ``USE_TZ`` is off
+    :param use_tz: settings.USE_TZ, read from settings if None
+    :returns: Tuple of (seconds, nanos)
+    :raises ValueError: if value is naive while ``USE_TZ`` is on
+    """
+    if value.tzinfo is not None and value.utcoffset() is not None:
+        delta = value - _EPOCH_AWARE
+    elif settings.USE_TZ if use_tz is None else use_tz:
+        raise ValueError("Naive datetime can't be converted to Timestamp with USE_TZ: {}".format(value))
+    else:
+        delta = value - _EPOCH_NAIVE
+    return delta.days * _SECONDS_PER_DAY + delta.seconds, delta.microseconds * 1000
+
+
+def timestamp_to_datetime(seconds, nanos, use_tz=None):
+    """Converting seconds and nanos of a Timestamp to datetime, truncated to
+    microseconds as ``Timestamp.ToDatetime()``
+
+    :param use_tz: settings.USE_TZ, read from settings if None
+    :returns: datetime in UTC, aware if ``USE_TZ`` is on
+    """
+    epoch = _EPOCH_AWARE if (settings.USE_TZ if use_tz is None else use_tz) else _EPOCH_NAIVE
+    return epoch + datetime.timedelta(seconds=seconds, microseconds=nanos // 1000)
+
+
 def _datetimefield_to_pb(pb_obj, pb_field, dj_field_value):
     """handling Django DateTimeField field
 
@@ -53,10 +119,9 @@ def _datetimefield_to_pb(pb_obj, pb_field, dj_field_value):
     :param dj_field_value: Currently proecessing django field value
     :returns: None
     """
-    if getattr(getattr(pb_obj, pb_field.name), 'FromDatetime', False):
-        if settings.USE_TZ:
-            dj_field_value = timezone.make_naive(dj_field_value, timezone=timezone.utc)
-        getattr(pb_obj, pb_field.name).FromDatetime(dj_field_value)
+    if pb_field.message_type is not None and pb_field.message_type.full_name == _TIMESTAMP_FULL_NAME:
+        timestamp = getattr(pb_obj, pb_field.name)
+        timestamp.seconds, timestamp.nanos = datetime_to_timestamp(dj_field_value)
 
 
 def _datetimefield_from_pb(instance, dj_field_name, pb_field, pb_value):
@@ -66,32 +131,349 @@ def _datetimefield_from_pb(instance, dj_field_name, pb_field, pb_value):
     :param pb_value: Currently processing protobuf message value
     :returns: None
     """
-    dt = pb_value.ToDatetime()
-    if settings.USE_TZ:
-        dt = timezone.localtime(timezone.make_aware(dt, timezone.utc))
     # FIXME: not datetime field
-    setattr(instance, dj_field_name, dt)
+    setattr(instance, dj_field_name, timestamp_to_datetime(pb_value.seconds, pb_value.nanos))
 
 
 def _uuid_to_pb(pb_obj, pb_field, dj_field_value):
-    """handling Django UUIDField field
+    """handling Django UUIDField field, to 16 bytes for ``bytes`` field or
+    canonical string otherwise
 
     :param pb_obj: protobuf message obj which is return value of to_pb()
     :param pb_field: protobuf message field which is current processing field
     :param dj_field_value: Currently proecessing django field value
     :returns: None
     """
-    setattr(pb_obj, pb_field.name, str(dj_field_value))
+    if pb_field.type == FieldDescriptor.TYPE_BYTES:
+        setattr(pb_obj, pb_field.name, dj_field_value.bytes)
+    else:
+        setattr(pb_obj, pb_field.name, str(dj_field_value))
 
 
 def _uuid_from_pb(instance, dj_field_name, pb_field, pb_value):
-    """handling string object to dj UUIDField
+    """handling string or 16 bytes object to dj UUIDField
 
     :param dj_field_name: Currently target django field's name
     :param pb_value: Currently processing protobuf message value
     :returns: None
     """
-    setattr(instance, dj_field_name, uuid.UUID(pb_value))
+    if pb_field.type == FieldDescriptor.TYPE_BYTES:
+        setattr(instance, dj_field_name, uuid.UUID(bytes=pb_value))
+    else:
+        setattr(instance, dj_field_name, uuid.UUID(pb_value))
+
+
+# set by a serializer to the default value of a field without presence,
+# which protobuf JSON mapping omits
+JSON_OMITTED = type('JSONOmitted', (object,), {'__repr__': lambda self: 'JSON_OMITTED'})()
+
+_JSON_INT64_TYPES = frozenset([FieldDescriptor.CPPTYPE_INT64, FieldDescriptor.CPPTYPE_UINT64])
+_JSON_FLOAT_TYPES = frozenset([FieldDescriptor.CPPTYPE_FLOAT, FieldDescriptor.CPPTYPE_DOUBLE])
+
+
+def has_presence(pb_field):
+    """Whether a field tracks being set, so that default values are
+    serialized as well, same as ``FieldDescriptor.has_presence`` of later
+    protobuf versions
+
+    :param pb_field: protobuf field descriptor
+    :returns: bool
+    """
+    if pb_field.label == FieldDescriptor.LABEL_REPEATED:
+        return False
+    # proto3 optional fields are in a synthetic oneof
+    return (pb_field.message_type is not None or pb_field.containing_oneof is not None or
+            pb_field.containing_type.file.syntax != 'proto3')
+
+
+def _shortest_float(value):
+    """Shortest float with the same 4 byte float value, as json_format formats
+    float fields
+    """
+    _float = _FIXED_FORMATS[FieldDescriptor.TYPE_FLOAT]
+    precision = 6
+    rounded = float('{0:.{1}g}'.format(value, precision))
+    while _float.unpack(_float.pack(rounded))[0] != value:
+        precision += 1
+        rounded = float('{0:.{1}g}'.format(value, precision))
+    return rounded
+
+
+def scalar_to_json(pb_field, value):
+    """Getting the protobuf JSON mapping of a value assigned to a singular
+    scalar field, same as ``json_format.MessageToDict()`` of a message with
+    the value assigned
+
+    :param pb_field: protobuf field descriptor
+    :param value: python value, type checked and converted as by assigning it
+    :returns: JSON compatible value, or JSON_OMITTED
+    """
+    from google.protobuf.internal import type_checkers
+
+    value = type_checkers.GetTypeChecker(pb_field).CheckValue(value)
+    if not value and not has_presence(pb_field):
+        return JSON_OMITTED
+
+    cpp_type = pb_field.cpp_type
+    if cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+        enum_value = pb_field.enum_type.values_by_number.get(value)
+        return value if enum_value is None else enum_value.name
+    if pb_field.type == FieldDescriptor.TYPE_BYTES:
+        return base64.b64encode(value).decode('utf-8')
+    if cpp_type in _JSON_INT64_TYPES:
+        return str(value)
+    if cpp_type in _JSON_FLOAT_TYPES:
+        if math.isinf(value):
+            return 'Infinity' if value > 0 else '-Infinity'
+        if math.isnan(value):
+            return 'NaN'
+        if cpp_type == FieldDescriptor.CPPTYPE_FLOAT:
+            return _shortest_float(value)
+    return value
+
+
+def timestamp_to_json(seconds, nanos):
+    """Format Timestamp seconds and nanos as RFC 3339 string, same as
+    ``Timestamp.ToJsonString()``
+    """
+    total_seconds = seconds + nanos // 10 ** 9
+    nanos = nanos % 10 ** 9
+    result = (_EPOCH_NAIVE + datetime.timedelta(seconds=total_seconds)).isoformat()
+    if nanos == 0:
+        return result + 'Z'
+    if nanos % 10 ** 6 == 0:
+        return result + '.%03dZ' % (nanos // 10 ** 6)
+    if nanos % 10 ** 3 == 0:
+        return result + '.%06dZ' % (nanos // 10 ** 3)
+    return result + '.%09dZ' % nanos
+
+
+def field_wire_type(pb_field):
+    """Getting the wire type of a field, of each element of repeated fields
+    which aren't packed
+
+    :param pb_field: protobuf field descriptor
+    :returns: int, one of the ``WIRETYPE_*`` of :mod:`pb_model.delimited`
+    """
+    from .delimited import (WIRETYPE_FIXED32, WIRETYPE_FIXED64, WIRETYPE_LENGTH_DELIMITED,
+                            WIRETYPE_START_GROUP, WIRETYPE_VARINT)
+
+    _type = pb_field.type
+    if _type in _VARINT_DECODERS:
+        return WIRETYPE_VARINT
+    if _type in _FIXED_FORMATS:
+        return WIRETYPE_FIXED32 if _FIXED_FORMATS[_type].size == 4 else WIRETYPE_FIXED64
+    if _type == FieldDescriptor.TYPE_GROUP:
+        return WIRETYPE_START_GROUP
+    return WIRETYPE_LENGTH_DELIMITED
+
+
+def _wire_tag(number, wire_type):
+    from .delimited import encode_varint
+    return encode_varint(number << 3 | wire_type)
+
+
+def _zigzag_encode(value, bits):
+    return ((value << 1) ^ (value >> (bits - 1))) & ((1 << bits) - 1)
+
+
+def _encode_scalar(pb_field, value):
+    """Wire format of a type checked value, without the tag"""
+    from .delimited import encode_varint
+
+    _type = pb_field.type
+    if _type == FieldDescriptor.TYPE_SINT32:
+        return encode_varint(_zigzag_encode(value, 32))
+    if _type == FieldDescriptor.TYPE_SINT64:
+        return encode_varint(_zigzag_encode(value, 64))
+    if _type in _VARINT_DECODERS:
+        # negative int32 and enum values are sign extended to 64 bits
+        return encode_varint(int(value) & 0xffffffffffffffff)
+    if _type in _FIXED_FORMATS:
+        return _FIXED_FORMATS[_type].pack(value)
+    if _type == FieldDescriptor.TYPE_STRING:
+        value = value.encode('utf-8')
+    return encode_varint(len(value)) + value
+
+
+def scalar_to_wire(pb_field, value):
+    """Getting the wire format of a value assigned to a singular scalar field,
+    same as the field in ``SerializeToString()`` of a message with the value
+    assigned
+
+    :param pb_field: protobuf field descriptor
+    :param value: python value, type checked and converted as by assigning it
+    :returns: bytes, empty for default values omitted from the wire
+    """
+    from google.protobuf.internal import type_checkers
+
+    value = type_checkers.GetTypeChecker(pb_field).CheckValue(value)
+    if not value and not has_presence(pb_field):
+        return b''
+    return _wire_tag(pb_field.number, field_wire_type(pb_field)) + _encode_scalar(pb_field, value)
+
+
+def length_delimited_to_wire(pb_field, data):
+    """Getting the wire format of a message field from serialized message
+
+    :param pb_field: protobuf field descriptor
+    :param data: serialized message
+    :returns: bytes
+    """
+    from .delimited import WIRETYPE_LENGTH_DELIMITED, encode_varint
+
+    return _wire_tag(pb_field.number, WIRETYPE_LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+
+def timestamp_to_wire(seconds, nanos):
+    """Serialize a Timestamp, same as ``Timestamp.SerializeToString()``"""
+    from .delimited import encode_varint
+
+    data = b''
+    if seconds:
+        data += b'\x08' + encode_varint(seconds & 0xffffffffffffffff)
+    if nanos:
+        data += b'\x10' + encode_varint(nanos & 0xffffffffffffffff)
+    return data
+
+
+def _timestamp_field_to_json(pb_field, seconds, nanos):
+    return timestamp_to_json(seconds, nanos)
+
+
+def _timestamp_field_to_wire(pb_field, seconds, nanos):
+    return length_delimited_to_wire(pb_field, timestamp_to_wire(seconds, nanos))
+
+
+# functions(pb_field, ...) encoding a singular scalar value and a Timestamp
+# field in protobuf JSON mapping or wire format
+_Encoding = collections.namedtuple('_Encoding', ['scalar', 'timestamp'])
+_JSON_ENCODING = _Encoding(scalar_to_json, _timestamp_field_to_json)
+_WIRE_ENCODING = _Encoding(scalar_to_wire, _timestamp_field_to_wire)
+
+
+def _defaultfield_encode(encoding, pb_field, dj_field_value):
+    """JSON and wire format counterpart of _defaultfield_to_pb
+    """
+    if pb_field.message_type is not None:
+        # same error as assigning a message field
+        raise AttributeError("Assignment not allowed to field \"{}\" in protocol message object.".format(
+            pb_field.name))
+    return encoding.scalar(pb_field, dj_field_value)
+
+
+def _datetimefield_encode(encoding, pb_field, dj_field_value):
+    """JSON and wire format counterpart of _datetimefield_to_pb
+    """
+    if pb_field.message_type is not None and pb_field.message_type.full_name == _TIMESTAMP_FULL_NAME:
+        return encoding.timestamp(pb_field, *datetime_to_timestamp(dj_field_value))
+    return None
+
+
+def _uuid_encode(encoding, pb_field, dj_field_value):
+    """JSON and wire format counterpart of _uuid_to_pb
+    """
+    if pb_field.type == FieldDescriptor.TYPE_BYTES:
+        return encoding.scalar(pb_field, dj_field_value.bytes)
+    return encoding.scalar(pb_field, str(dj_field_value))
+
+
+def _encoding_serializers(encoding):
+    return {
+        _defaultfield_to_pb: functools.partial(_defaultfield_encode, encoding),
+        _datetimefield_to_pb: functools.partial(_datetimefield_encode, encoding),
+        _uuid_to_pb: functools.partial(_uuid_encode, encoding),
+    }
+
+
+# {to_pb serializer: function(pb_field, dj_field_value) returning its protobuf
+# JSON mapping, JSON_OMITTED or None if nothing is assigned}, fields of other
+# serializers are converted through a message by to_pb_dict()
+json_serializers = _encoding_serializers(_JSON_ENCODING)
+
+# {to_pb serializer: function(pb_field, dj_field_value) returning the wire
+# format of the field or None if nothing is assigned}, fields of other
+# serializers are converted through a message by to_pb_bytes()
+wire_serializers = _encoding_serializers(_WIRE_ENCODING)
+
+
+_VARINT_DECODERS = {
+    FieldDescriptor.TYPE_INT32: lambda value: _to_signed(value, 32),
+    FieldDescriptor.TYPE_ENUM: lambda value: _to_signed(value, 32),
+    FieldDescriptor.TYPE_INT64: lambda value: _to_signed(value, 64),
+    FieldDescriptor.TYPE_UINT32: lambda value: value & 0xffffffff,
+    FieldDescriptor.TYPE_UINT64: lambda value: value & 0xffffffffffffffff,
+    FieldDescriptor.TYPE_SINT32: lambda value: _zigzag_decode(value & 0xffffffff),
+    FieldDescriptor.TYPE_SINT64: lambda value: _zigzag_decode(value & 0xffffffffffffffff),
+    FieldDescriptor.TYPE_BOOL: lambda value: bool(value & 0xffffffffffffffff),
+}
+_FIXED_FORMATS = {
+    FieldDescriptor.TYPE_FIXED32: struct.Struct('<I'),
+    FieldDescriptor.TYPE_SFIXED32: struct.Struct('<i'),
+    FieldDescriptor.TYPE_FLOAT: struct.Struct('<f'),
+    FieldDescriptor.TYPE_FIXED64: struct.Struct('<Q'),
+    FieldDescriptor.TYPE_SFIXED64: struct.Struct('<q'),
+    FieldDescriptor.TYPE_DOUBLE: struct.Struct('<d'),
+}
+
+TimestampValue = collections.namedtuple('TimestampValue', ['seconds', 'nanos'])
+
+
+def _to_signed(value, bits):
+    value &= (1 << bits) - 1
+    sign = 1 << (bits - 1)
+    return (value ^ sign) - sign
+
+
+def _zigzag_decode(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def _decode_string(value):
+    return value.decode('utf-8')
+
+
+def _decode_bytes(value):
+    return value
+
+
+def wire_decoder(pb_field):
+    """Getting the function decoding a singular scalar field from wire format,
+    the counterpart of scalar_to_wire(), to the same value as the field of
+    the parsed message
+
+    :param pb_field: protobuf field descriptor
+    :returns: function of an int of a varint, or bytes of fixed size or
+        length-delimited value, raising ValueError for invalid UTF-8 strings
+    """
+    _type = pb_field.type
+    if _type in _VARINT_DECODERS:
+        return _VARINT_DECODERS[_type]
+    if _type in _FIXED_FORMATS:
+        _unpack = _FIXED_FORMATS[_type].unpack
+        return lambda value: _unpack(value)[0]
+    if _type == FieldDescriptor.TYPE_STRING:
+        return _decode_string
+    return _decode_bytes
+
+
+def wire_to_timestamp(data):
+    """Decode a serialized Timestamp, the counterpart of timestamp_to_wire()
+
+    :param data: serialized Timestamp, or concatenated ones which are merged
+    :returns: TimestampValue of (seconds, nanos), usable as a Timestamp
+        message by _datetimefield_from_pb
+    """
+    from .delimited import WIRETYPE_VARINT, iter_fields
+
+    seconds = nanos = 0
+    for number, wire_type, value, _ in iter_fields(data):
+        if wire_type == WIRETYPE_VARINT:
+            if number == 1:
+                seconds = _to_signed(value, 64)
+            elif number == 2:
+                nanos = _to_signed(value, 32)
+    return TimestampValue(seconds, nanos)
 
 
 class ProtoBufFieldMixin(object):
@@ -114,6 +496,8 @@ class ProtoBufAnyField(models.BinaryField, ProtoBufFieldMixin):
         setattr(instance, dj_field_name, pb_value)
 
     def pre_save(self, model_instance, add):
+        from google.protobuf.any_pb2 import Any
+
         value = getattr(model_instance, self.name)
 
         if not isinstance(value, Any):
@@ -125,11 +509,36 @@ class ProtoBufAnyField(models.BinaryField, ProtoBufFieldMixin):
         if value is None:
             return value
 
+        from google.protobuf.any_pb2 import Any
         _any = Any()
         _any.ParseFromString(value)
         return _any
 
 
+class EnumNameField(models.CharField, ProtoBufFieldMixin):
+    """Storing enum values by name, generated for fields listed in
+    ``pb_2_dj_enum_name_fields``
+    """
+
+    @staticmethod
+    def to_pb(pb_obj, pb_field, dj_field_value):
+        try:
+            number = enum_tables(pb_field.enum_type).numbers_by_name[dj_field_value]
+        except KeyError:
+            raise ValueError("Unknown name {!r} of enum {}".format(dj_field_value, pb_field.enum_type.full_name))
+        setattr(pb_obj, pb_field.name, number)
+
+    @staticmethod
+    def from_pb(instance, dj_field_name, pb_field, pb_value):
+        try:
+            name = enum_tables(pb_field.enum_type).names_by_number[pb_value]
+        except KeyError:
+            from .models import DjangoPBModelError
+            raise DjangoPBModelError("Unknown value {} of enum {} in field: {}".format(
+                pb_value, pb_field.enum_type.full_name, pb_field.name))
+        setattr(instance, dj_field_name, name)
+
+
 class JSONField(models.TextField):
     def from_db_value(self, value, expression, connection, context=None):
         return self._deserialize(value)
@@ -182,9 +591,16 @@ class RepeatedMessageField(models.ManyToManyField, ProtoBufFieldMixin):
                 raise AttributeError('Can only be accessed via an instance.')
 
             if self._field_name not in instance.__dict__:
-                instance.__dict__[self._field_name] = [self.related_manager_cls(instance).get(id=id_) for id_ in getattr(instance, self._index_field_name)]
+                if instrumentation.tracers:
+                    with instrumentation.trace(instance, self._field_name, instrumentation.LOAD, None):
+                        instance.__dict__[self._field_name] = self._load(instance)
+                else:
+                    instance.__dict__[self._field_name] = self._load(instance)
             return instance.__dict__[self._field_name]
 
+        def _load(self, instance):
+            return [self.related_manager_cls(instance).get(id=id_) for id_ in getattr(instance, self._index_field_name)]
+
         def __set__(self, instance, value):
             instance.__dict__[self._field_name] = value
 
@@ -214,12 +630,14 @@ class RepeatedMessageField(models.ManyToManyField, ProtoBufFieldMixin):
 
     @staticmethod
     def to_pb(pb_obj, pb_field, dj_field_value):
-        getattr(pb_obj, pb_field.name).extend([m.to_pb() for m in dj_field_value])
+        repeated = getattr(pb_obj, pb_field.name)
+        for m in dj_field_value:
+            m._to_pb_into(repeated.add())
 
     @staticmethod
     def from_pb(instance, dj_field_name, pb_field, pb_value):
         related_model = instance._meta.get_field(dj_field_name).related_model
-        setattr(instance, dj_field_name, [related_model().from_pb(pb_message) for pb_message in pb_value])
+        setattr(instance, dj_field_name, [instance._related_from_pb(related_model, pb_message) for pb_message in pb_value])
 
 
 class RepeatedForeignField(JSONField):
@@ -241,9 +659,16 @@ class MessageMapField(models.ManyToManyField, ProtoBufFieldMixin):
                 raise AttributeError('Can only be accessed via an instance.')
 
             if self._field_name not in instance.__dict__:
-                instance.__dict__[self._field_name] = {key: self.related_manager_cls(instance).get(id=id_) for key, id_ in getattr(instance, self._index_field_name).items()}
+                if instrumentation.tracers:
+                    with instrumentation.trace(instance, self._field_name, instrumentation.LOAD, None):
+                        instance.__dict__[self._field_name] = self._load(instance)
+                else:
+                    instance.__dict__[self._field_name] = self._load(instance)
             return instance.__dict__[self._field_name]
 
+        def _load(self, instance):
+            return {key: self.related_manager_cls(instance).get(id=id_) for key, id_ in getattr(instance, self._index_field_name).items()}
+
         def __set__(self, instance, value):
             instance.__dict__[self._field_name] = value
 
@@ -273,10 +698,11 @@ class MessageMapField(models.ManyToManyField, ProtoBufFieldMixin):
 
     @staticmethod
     def to_pb(pb_obj, pb_field, dj_field_value):
+        map_field = getattr(pb_obj, pb_field.name)
         for key in dj_field_value:
-            getattr(pb_obj, pb_field.name)[key].CopyFrom(dj_field_value[key].to_pb())
+            dj_field_value[key]._to_pb_into(map_field[key])
 
     @staticmethod
     def from_pb(instance, dj_field_name, pb_field, pb_value):
         related_model = instance._meta.get_field(dj_field_name).related_model
-        setattr(instance, dj_field_name, {key: related_model().from_pb(pb_message) for key, pb_message in pb_value.items()})
+        setattr(instance, dj_field_name, {key: instance._related_from_pb(related_model, pb_message) for key, pb_message in pb_value.items()})
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import logging
+
+from django.core.exceptions import FieldDoesNotExist
+from google.protobuf.descriptor import FieldDescriptor
+
+from . import fields
+from .models import DjangoPBModelError, ProtoBufMixin
+
+LOGGER = logging.getLogger(__name__)
+
+
+def bulk_save(model, instances, using=None, batch_size=None):
+    """Write instances converted from protobuf with as few queries as possible
+
+    Unsaved related instances built from nested messages are saved first.
+    Instances are then written with bulk_create(), or one by one with save()
+    if the model has many-to-many message fields, which bulk_create() skips.
+
+    :param model: ProtoBufMixin model class
+    :param instances: list of new instances of model
+    :param using: database alias, defaults to the write database of model
+    :param batch_size: number of rows per INSERT query of bulk_create()
+    :returns: list of written instances
+    """
+    for instance in instances:
+        _save_related(instance, using)
+
+    if any(issubclass(type(f), fields.ProtoBufFieldMixin) for f in model._meta.many_to_many):
+        for instance in instances:
+            instance.save(using=using)
+        return instances
+    return model._default_manager.db_manager(using).bulk_create(instances, batch_size=batch_size)
+
+
+def _save_related(instance, using):
+    for dj_field in instance._meta.concrete_fields:
+        if dj_field.many_to_one and dj_field.is_cached(instance):
+            related = dj_field.get_cached_value(instance)
+            if related is not None and related._state.adding:
+                _save_related(related, using)
+                related.save(using=using)
+                # refresh <fk>_id, which was set while related had no pk
+                setattr(instance, dj_field.name, related)
+
+    for dj_field in instance._meta.many_to_many:
+        if issubclass(type(dj_field), fields.ProtoBufFieldMixin):
+            related_set = getattr(instance, dj_field.attname)
+            for related in (related_set.values() if isinstance(related_set, dict) else related_set):
+                if related._state.adding:
+                    _save_related(related, using)
+                    related.save(using=using)
+
+
+def bulk_upsert(model, instances, using=None, batch_size=None):
+    """Write instances converted from protobuf, updating existing rows with
+    the same key instead of creating them
+
+    The key is ``pb_natural_key`` of model if defined or the primary key
+    otherwise, existing rows are looked up with a single ``in_bulk``. New
+    rows are written with bulk_create() and existing ones with
+    bulk_update(), or one by one with save() as bulk_save() does.
+
+    :param model: ProtoBufMixin model class
+    :param instances: list of new instances of model
+    :param using: database alias, defaults to the write database of model
+    :param batch_size: number of rows per query
+    :returns: list of booleans, True for instances written as new rows
+    """
+    manager = model._default_manager.db_manager(using)
+    dj_key = _unique_key_field(model)
+    keys = [getattr(instance, dj_key) for instance in instances]
+    existing = manager.in_bulk([key for key in keys if key is not None], field_name=dj_key)
+
+    created, to_create, to_update = [], [], []
+    for instance, key in zip(instances, keys):
+        row = existing.get(key) if key is not None else None
+        if row is None:
+            to_create.append(instance)
+        else:
+            instance.pk = row.pk
+            instance._state.adding = False
+            to_update.append(instance)
+        created.append(row is None)
+
+    for instance in instances:
+        _save_related(instance, using)
+
+    if any(issubclass(type(f), fields.ProtoBufFieldMixin) for f in model._meta.many_to_many):
+        for instance in instances:
+            instance.save(using=using)
+        return created
+
+    manager.bulk_create(to_create, batch_size=batch_size)
+    update_fields = [f.name for f in model._meta.concrete_fields if not f.primary_key]
+    if to_update and update_fields:
+        manager.bulk_update(to_update, update_fields, batch_size=batch_size)
+    return created
+
+
+def _unique_key_field(model):
+    """Getting the django field name of the key of model, to look rows up
+    with ``in_bulk``
+
+    :param model: ProtoBufMixin model class
+    :returns: django field name
+    :raises DjangoPBModelError: if the field doesn't exist or isn't unique
+    """
+    _, dj_key = model._pb_key_fields()
+    try:
+        dj_field = model._meta.get_field(dj_key)
+    except FieldDoesNotExist:
+        raise DjangoPBModelError("pb_natural_key of {} is mapped to no django field: {}".format(
+            model.__name__, dj_key))
+    if not dj_field.unique and not any(
+            constraint.fields == (dj_key,) for constraint in model._meta.total_unique_constraints):
+        raise DjangoPBModelError("pb_natural_key of {} must be mapped to a unique django field: {}".format(
+            model.__name__, dj_key))
+    return dj_key
+
+
+class IngestionContext(object):
+    """Identity map shared by the nested messages of an ingestion batch.
+
+    Nested messages converted through the context are deduplicated by their
+    key, the primary key or ``pb_natural_key`` of the related model, so a
+    related row referenced many times in a batch becomes a single instance::
+
+        context = IngestionContext(resolve_existing=True)
+        instances = context.from_pb_list(Main, pb_objs)
+
+    With ``resolve_existing``, keys of nested messages are looked up with one
+    ``in_bulk`` per related model before converting, and existing rows are used
+    instead of instances built from the messages.
+
+    Keys set by reference-only relations (``pb_2_dj_reference_fields``) are
+    checked for existence with one query per related model per batch.
+    """
+
+    def __init__(self, resolve_existing=False):
+        self.resolve_existing = resolve_existing
+        self._instances = collections.defaultdict(dict)  # {model: {key: instance}}
+        self._references = collections.defaultdict(set)  # {(model, field name): keys}
+        self._validated_references = collections.defaultdict(set)
+
+    def from_pb(self, model, pb_obj):
+        """Convert a protobuf message to a new instance of model
+
+        :param model: ProtoBufMixin model class
+        :param pb_obj: protobuf message of model
+        :returns: Django model instance
+        """
+        return model().from_pb(pb_obj, context=self)
+
+    def from_pb_list(self, model, pb_objs):
+        """Convert a batch of protobuf messages to new instances of model
+
+        :param model: ProtoBufMixin model class
+        :param pb_objs: iterable of protobuf messages of model
+        :returns: list of Django model instances
+        """
+        pb_objs = list(pb_objs)
+        if self.resolve_existing:
+            self.preload(model, pb_objs)
+        instances = [self.from_pb(model, pb_obj) for pb_obj in pb_objs]
+        self.validate_references()
+        return instances
+
+    def preload(self, model, pb_objs):
+        """Fetch existing rows referenced by nested messages of given messages,
+        with one query per related model
+
+        :param model: ProtoBufMixin model class
+        :param pb_objs: iterable of protobuf messages of model
+        :returns: None
+        :raises DjangoPBModelError: if the key of a related model isn't unique
+        """
+        keys = collections.defaultdict(set)
+        for pb_obj in pb_objs:
+            self._collect_keys(model, pb_obj, model.pb_2_dj_field_map, keys)
+
+        for related_model, model_keys in keys.items():
+            dj_key = _unique_key_field(related_model)
+            missing = model_keys.difference(self._instances[related_model])
+            if not missing:
+                continue
+            found = related_model._default_manager.in_bulk(list(missing), field_name=dj_key)
+            LOGGER.debug("Resolved {} of {} {} keys from database".format(
+                len(found), len(missing), related_model.__name__))
+            self._instances[related_model].update(found)
+
+    def resolve(self, related_model, pb_message):
+        """Getting the instance of a nested message, converting it only the
+        first time its key is seen
+
+        :param related_model: ProtoBufMixin model class of the nested message
+        :param pb_message: nested protobuf message
+        :returns: Django model instance
+        """
+        key = related_model._pb_key(pb_message)
+        if key is None:
+            return self.from_pb(related_model, pb_message)
+
+        instances = self._instances[related_model]
+        if key not in instances:
+            instances[key] = self.from_pb(related_model, pb_message)
+        return instances[key]
+
+    def reference(self, related_model, field_name, key):
+        """Record a key set by a reference-only relation, to be checked by
+        validate_references()
+
+        :param related_model: Django model class of the relation
+        :param field_name: django field name of related model the key refers to
+        :param key: key value
+        :returns: None
+        """
+        if key not in self._validated_references[(related_model, field_name)]:
+            self._references[(related_model, field_name)].add(key)
+
+    def validate_references(self):
+        """Check that rows referenced since last call exist, with one query
+        per related model
+
+        :raises DjangoPBModelError: if any referenced row does not exist
+        :returns: None
+        """
+        references, self._references = self._references, collections.defaultdict(set)
+        for (related_model, field_name), keys in references.items():
+            found = set(related_model._default_manager.filter(
+                **{'%s__in' % field_name: list(keys)}).values_list(field_name, flat=True))
+            missing = keys.difference(found)
+            if missing:
+                raise DjangoPBModelError("Referenced {} not found by {}: {}".format(
+                    related_model.__name__, field_name, sorted(missing)))
+            self._validated_references[(related_model, field_name)].update(keys)
+
+    def _collect_keys(self, model, pb_obj, pb_dj_field_map, keys):
+        dj_fields = model._pb_dj_fields()
+        for pb_field, pb_value in pb_obj.ListFields():
+            dj_field_name = pb_dj_field_map.get(pb_field.name, pb_field.name)
+            if isinstance(dj_field_name, dict):
+                self._collect_keys(model, pb_value, dj_field_name, keys)
+                continue
+            if pb_field.name in model.pb_2_dj_reference_fields:
+                continue
+
+            dj_field = dj_fields.get(dj_field_name)
+            if dj_field is None or not dj_field.is_relation or pb_field.message_type is None:
+                continue
+            related_model = dj_field.related_model
+            if not issubclass(related_model, ProtoBufMixin):
+                continue
+
+            if isinstance(dj_field, fields.MessageMapField):
+                pb_messages = pb_value.values()
+            elif isinstance(dj_field, fields.RepeatedMessageField):
+                pb_messages = pb_value
+            elif pb_field.label != FieldDescriptor.LABEL_REPEATED and not dj_field.many_to_many:
+                pb_messages = [pb_value]
+            else:
+                # plain m2m and reverse relations are not converted by from_pb()
+                continue
+
+            for pb_message in pb_messages:
+                key = related_model._pb_key(pb_message)
+                if key is not None:
+                    keys[related_model].add(key)
+                self._collect_keys(related_model, pb_message, related_model.pb_2_dj_field_map, keys)
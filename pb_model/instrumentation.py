@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Optional instrumentation of the conversion path.
+
+Conversion of each field by to_pb()/from_pb() is traced only while at least
+one :class:`Tracer` is installed, otherwise the cost is a single check of
+``tracers`` per field. For example, to find which field makes to_pb() slow::
+
+    with ConversionStats() as stats:
+        Main.objects.all().to_pb_list()
+    stats.dump()
+"""
+
+import collections
+import contextlib
+import json
+import sys
+import threading
+import time
+import warnings
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+TO_PB = 'to_pb'
+FROM_PB = 'from_pb'
+LOAD = 'load'  # loading of many-to-many message fields by their descriptors
+
+Frame = collections.namedtuple('Frame', ['model', 'field', 'operation'])
+
+tracers = []  # installed tracers
+class_creation_times = {}  # {model label: (seconds, number of generated fields)}
+_local = threading.local()
+_wrapped_connections = []
+_wrapped_lock = threading.Lock()
+
+
+def current_path():
+    """Getting the fields being converted in current thread, outermost first
+
+    :returns: tuple of :class:`Frame`
+    """
+    return tuple(getattr(_local, 'stack', ()))
+
+
+def format_path(path):
+    """Format a field path, ex: ``tests.Main.fk_field > tests.Relation.deeper_relation``
+    """
+    return ' > '.join('{}.{}'.format(frame.model, frame.field) for frame in path)
+
+
+@contextlib.contextmanager
+def trace(instance, field_name, operation, pb_obj):
+    """Notify installed tracers around conversion of a field
+
+    :param instance: Django model instance being converted
+    :param field_name: protobuf field name, or django field name for LOAD
+    :param operation: TO_PB, FROM_PB or LOAD
+    :param pb_obj: message converted to (TO_PB), the field value (FROM_PB)
+        or None (LOAD)
+    """
+    frame = Frame(instance._meta.label, field_name, operation)
+    stack = _local.__dict__.setdefault('stack', [])
+    stack.append(frame)
+    _tracers = list(tracers)
+    for tracer in _tracers:
+        tracer.enter(frame, pb_obj)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for tracer in reversed(_tracers):
+            tracer.exit(frame, pb_obj, elapsed)
+        stack.pop()
+
+
+def install(tracer):
+    """Start notifying tracer of conversions and queries
+
+    Queries are seen on the connections of current thread, and on those
+    connecting in any thread while a tracer is installed, ex: threads of
+    ``sync_to_async()``. Connections opened earlier by other threads and kept
+    open, ex: with ``CONN_MAX_AGE``, aren't seen.
+    """
+    if not tracers:
+        for conn in connections.all():
+            _wrap_connection(conn)
+        connection_created.connect(_connection_created)
+    tracers.append(tracer)
+
+
+def uninstall(tracer):
+    """Stop notifying tracer
+    """
+    tracers.remove(tracer)
+    if not tracers:
+        connection_created.disconnect(_connection_created)
+        with _wrapped_lock:
+            while _wrapped_connections:
+                _wrapped_connections.pop().execute_wrappers.remove(_execute_wrapper)
+
+
+def _wrap_connection(conn):
+    with _wrapped_lock:
+        if _execute_wrapper not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_execute_wrapper)
+            _wrapped_connections.append(conn)
+
+
+def _connection_created(sender, connection, **kwargs):
+    if tracers:
+        _wrap_connection(connection)
+
+
+def dump_class_creation_times(stream=None, limit=None):
+    """Write time spent generating fields of ProtoBufMixin models at class
+    creation, slowest first
+
+    :param stream: file to write to, defaults to stdout
+    :param limit: maximum number of models written, None for all
+    """
+    stream = stream or sys.stdout
+    rows = sorted(class_creation_times.items(), key=lambda item: item[1][0], reverse=True)
+    stream.write('{:<48} {:>8} {:>12}\n'.format('model', 'fields', 'time (ms)'))
+    for label, (elapsed, created) in rows[:limit]:
+        stream.write('{:<48} {:>8} {:>12.3f}\n'.format(label, created, elapsed * 1000))
+    stream.write('{:<48} {:>8} {:>12.3f}\n'.format(
+        'total ({} models)'.format(len(rows)), sum(created for _, created in class_creation_times.values()),
+        sum(elapsed for elapsed, _ in class_creation_times.values()) * 1000))
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    if tracers:
+        path = current_path()
+        for tracer in list(tracers):
+            tracer.query(path, sql)
+    return execute(sql, params, many, context)
+
+
+class Tracer(object):
+    """Base class of conversion tracers, usable as context manager to install
+    it for the duration of a block
+    """
+
+    def enter(self, frame, pb_obj):
+        """Called before converting a field"""
+
+    def exit(self, frame, pb_obj, elapsed):
+        """Called after converting a field, with elapsed seconds"""
+
+    def query(self, path, sql):
+        """Called for each database query, with the fields being converted"""
+
+    def install(self):
+        install(self)
+        return self
+
+    def uninstall(self):
+        uninstall(self)
+
+    def __enter__(self):
+        return self.install()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.uninstall()
+
+
+class ConversionStats(Tracer):
+    """Aggregate per model/field/operation call counts, cumulative time,
+    bytes produced and queries triggered
+
+    Time, bytes and queries of a relation field include its nested fields.
+    Bytes are the growth of ``ByteSize()`` of the message built by to_pb(),
+    measured for top level fields only, as each measure sizes the whole
+    message being built; nested fields report 0.
+    """
+
+    FIELDS = ('model', 'field', 'operation', 'calls', 'time', 'bytes', 'queries')
+
+    def __init__(self):
+        self._stats = {}
+        self._queries = 0
+        self._local = threading.local()
+
+    def enter(self, frame, pb_obj):
+        stack = self._local.__dict__.setdefault('stack', [])
+        start_bytes = pb_obj.ByteSize() if frame.operation == TO_PB and not stack else None
+        stack.append((start_bytes, self._queries))
+
+    def exit(self, frame, pb_obj, elapsed):
+        start_bytes, start_queries = self._local.stack.pop()
+        entry = self._stats.setdefault(frame, [0, 0.0, 0, 0])
+        entry[0] += 1
+        entry[1] += elapsed
+        if start_bytes is not None:
+            entry[2] += pb_obj.ByteSize() - start_bytes
+        entry[3] += self._queries - start_queries
+
+    def query(self, path, sql):
+        self._queries += 1
+
+    def reset(self):
+        self._stats.clear()
+
+    def get_stats(self, sort='time'):
+        """Getting aggregated stats
+
+        :param sort: key to sort by in descending order
+        :returns: list of dicts with keys of ``FIELDS``
+        """
+        rows = [dict(zip(self.FIELDS, tuple(frame) + tuple(values))) for frame, values in self._stats.items()]
+        return sorted(rows, key=lambda row: row[sort], reverse=True)
+
+    def dump(self, stream=None, sort='time', format='text'):
+        """Write aggregated stats as a text table or JSON
+
+        :param stream: file to write to, defaults to stdout
+        :param sort: key to sort by in descending order
+        :param format: ``text`` or ``json``
+        """
+        stream = stream or sys.stdout
+        rows = self.get_stats(sort)
+        if format == 'json':
+            json.dump(rows, stream, indent=2)
+            stream.write('\n')
+            return
+
+        stream.write('{:<40} {:<8} {:>8} {:>12} {:>10} {:>8}\n'.format(
+            'field', 'op', 'calls', 'time (ms)', 'bytes', 'queries'))
+        for row in rows:
+            stream.write('{:<40} {:<8} {:>8} {:>12.3f} {:>10} {:>8}\n'.format(
+                '{}.{}'.format(row['model'], row['field']), row['operation'], row['calls'],
+                row['time'] * 1000, row['bytes'], row['queries']))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class pb_query_budget(Tracer):
+    """Check queries issued while converting fields, such as loading foreign
+    keys, many-to-many managers and many-to-many message fields, usable as
+    context manager or test assertion::
+
+        with pb_query_budget(max_queries=0):
+            Main.objects.all().to_pb_list()
+
+    Queries outside conversion, such as fetching rows and prefetching, are not
+    counted. When leaving the block, the budget is checked and the offending
+    field paths are reported, most queries first.
+
+    :param max_queries: maximum number of queries issued by conversion
+    :param max_queries_per_field: maximum number of queries issued by
+        conversion of a single field path, which catches per-row queries
+        even when total budget is large
+    :param action: ``raise`` QueryBudgetExceeded or ``warn`` with RuntimeWarning
+    """
+
+    def __init__(self, max_queries=None, max_queries_per_field=None, action='raise'):
+        if action not in ('raise', 'warn'):
+            raise ValueError("action must be 'raise' or 'warn'")
+        self.max_queries = max_queries
+        self.max_queries_per_field = max_queries_per_field
+        self.action = action
+        self.queries = collections.Counter()  # {field path: number of queries}
+
+    def query(self, path, sql):
+        if path:
+            self.queries[path] += 1
+
+    @property
+    def total(self):
+        return sum(self.queries.values())
+
+    def violations(self):
+        """Getting the reasons the budget is exceeded, empty if it isn't
+
+        :returns: list of messages
+        """
+        messages = []
+        if self.max_queries is not None and self.total > self.max_queries:
+            messages.append("{} queries issued by protobuf conversion, budget is {}".format(
+                self.total, self.max_queries))
+        if self.max_queries_per_field is not None:
+            for path, count in self.queries.most_common():
+                if count > self.max_queries_per_field:
+                    messages.append("{} queries issued by converting {}, budget per field is {}".format(
+                        count, format_path(path), self.max_queries_per_field))
+        return messages
+
+    def report(self):
+        """Format queries per field path, most queries first
+        """
+        return '\n'.join('  {:>6}  {}'.format(count, format_path(path))
+                         for path, count in self.queries.most_common())
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super(pb_query_budget, self).__exit__(exc_type, exc_value, traceback)
+        violations = self.violations()
+        if exc_type is not None or not violations:
+            return
+        message = '\n'.join(violations + ['Queries per field:', self.report()])
+        if self.action == 'raise':
+            raise QueryBudgetExceeded(message)
+        warnings.warn(message, RuntimeWarning, stacklevel=2)
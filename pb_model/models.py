@@ -1,78 +1,119 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
 import logging
-import six
+import threading
+import time
 
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models.fields.reverse_related import ManyToOneRel
-from django.conf import settings
+from django.db.models.fields.reverse_related import ForeignObjectRel
 
 from google.protobuf.descriptor import FieldDescriptor
 
-from . import fields
+from . import fields, instrumentation
 
-logging.basicConfig()
 LOGGER = logging.getLogger(__name__)
-LOGGER.setLevel(logging.WARNING)
-if settings.DEBUG:
-    LOGGER.setLevel(logging.DEBUG)
+
+# instances being converted by to_pb() in current thread, outermost first
+_converting = threading.local()
 
 
 class DjangoPBModelError(Exception):
     pass
 
 
+# {pb field full name: kind of field}, shared by all models as every model of
+# a message classifies the same descriptors
+_field_kinds = {}
+
+
 class Meta(type(models.Model)):
     def __init__(self, name, bases, attrs):
         super(Meta, self).__init__(name, bases, attrs)
+        _start = time.perf_counter()
         self.pb_2_dj_field_serializers = self._pb_2_dj_default_field_serializers.copy()
         self.pb_2_dj_field_serializers.update(attrs.get('pb_2_dj_field_serializers', {}))
-
         self.pb_auto_field_type_mapping = self._pb_auto_field_type_mapping.copy()
         self.pb_auto_field_type_mapping.update(attrs.get('pb_auto_field_type_mapping', {}))
 
-        if self._meta.proxy:
-            # prevent duplicated field in proxy model
+        _created = 0
+        if self.pb_model is not None and not self._meta.proxy:
+            # proxy models skip it to prevent duplicated field
             # ref: https://github.com/myyang/django-pb-model/issues/29
-            return
-
-        if self.pb_model is not None:
             if self.pb_2_dj_fields == '__all__':
                 self.pb_2_dj_fields = self.pb_model.DESCRIPTOR.fields_by_name.keys()
 
+            _fields_by_name = self.pb_model.DESCRIPTOR.fields_by_name
             for pb_field_name in self.pb_2_dj_fields:
-                pb_field_descriptor = self.pb_model.DESCRIPTOR.fields_by_name[pb_field_name]
+                pb_field_descriptor = _fields_by_name[pb_field_name]
                 dj_field_name = self.pb_2_dj_field_map.get(pb_field_name, pb_field_name)
                 if not isinstance(dj_field_name, dict) and dj_field_name not in attrs:
                     field = self._create_field(pb_field_descriptor)
                     if field is not None:
                         field.contribute_to_class(self, dj_field_name)
+                        _created += 1
+
+        instrumentation.class_creation_times[self._meta.label] = (time.perf_counter() - _start, _created)
 
     def _create_field(self, message_field):
-        message_field_type = message_field.type
+        kind = Meta._field_kind(message_field)
 
-        if Meta._is_message_map_field(message_field):
+        if kind == fields.PB_FIELD_TYPE_MESSAGE_MAP:
             mapped_message = message_field.message_type.fields_by_name['value'].message_type
             return self._create_message_map_field(message_field.containing_type.name, mapped_message.name,
                                                   message_field.name)
-        elif Meta._is_map_field(message_field):
+        elif kind == fields.PB_FIELD_TYPE_MAP:
             return self._create_map_field()
-        elif Meta._is_repeated_message_field(message_field):
+        elif kind == fields.PB_FIELD_TYPE_REPEATED_MESSAGE:
             return self._create_repeated_message_field(message_field.containing_type.name,
                                                        message_field.message_type.name, message_field.name)
-        elif Meta._is_repeated_field(message_field):
+        elif kind == fields.PB_FIELD_TYPE_REPEATED:
             return self._create_repeated_field()
-        elif Meta._is_message_field(message_field):
-            if message_field.message_type.name == 'Timestamp':
-                return self._create_timestamp_field()
-            elif message_field.message_type.name == 'Any':
-                return self._create_protobuf_any_field()
-            else:
-                return self._create_message_field(message_field.containing_type.name, message_field.message_type.name,
-                                                  message_field.name)
+        elif kind == fields.PB_FIELD_TYPE_TIMESTAMP:
+            return self._create_timestamp_field()
+        elif kind == fields.PB_FIELD_TYPE_MESSAGE_ANY:
+            return self._create_protobuf_any_field()
+        elif kind == fields.PB_FIELD_TYPE_MESSAGE:
+            return self._create_message_field(message_field.containing_type.name, message_field.message_type.name,
+                                              message_field.name)
+        elif kind == FieldDescriptor.TYPE_ENUM:
+            if message_field.name in self.pb_2_dj_enum_name_fields:
+                return self._create_enum_name_field(message_field.enum_type)
+            return self._create_generic_field(kind, message_field.enum_type)
+        else:
+            return self._create_generic_field(kind)
+
+    @staticmethod
+    def _field_kind(field_descriptor):
+        """
+        Classifies a protobuf field as a key of `pb_auto_field_type_mapping`, cached by full name of the field.
+        :param field_descriptor: protobuf field descriptor
+        :return: PB_FIELD_TYPE_* constant of message, repeated and map fields, otherwise protobuf field type
+        """
+        try:
+            return _field_kinds[field_descriptor.full_name]
+        except KeyError:
+            pass
+
+        if Meta._is_message_map_field(field_descriptor):
+            kind = fields.PB_FIELD_TYPE_MESSAGE_MAP
+        elif Meta._is_map_field(field_descriptor):
+            kind = fields.PB_FIELD_TYPE_MAP
+        elif Meta._is_repeated_message_field(field_descriptor):
+            kind = fields.PB_FIELD_TYPE_REPEATED_MESSAGE
+        elif Meta._is_repeated_field(field_descriptor):
+            kind = fields.PB_FIELD_TYPE_REPEATED
+        elif Meta._is_message_field(field_descriptor):
+            kind = {
+                'Timestamp': fields.PB_FIELD_TYPE_TIMESTAMP,
+                'Any': fields.PB_FIELD_TYPE_MESSAGE_ANY,
+            }.get(field_descriptor.message_type.name, fields.PB_FIELD_TYPE_MESSAGE)
         else:
-            return self._create_generic_field(message_field_type)
+            kind = field_descriptor.type
+        _field_kinds[field_descriptor.full_name] = kind
+        return kind
 
     @staticmethod
     def _is_message_field(field_descriptor):
@@ -98,8 +139,10 @@ class Meta(type(models.Model)):
         :param field_descriptor: protobuf field descriptor
         :return: bool
         """
-        return field_descriptor.message_type is not None and set(
-            field_descriptor.message_type.fields_by_name.keys()) == {'key', 'value'}
+        if field_descriptor.message_type is None:
+            return False
+        _fields_by_name = field_descriptor.message_type.fields_by_name
+        return len(_fields_by_name) == 2 and 'key' in _fields_by_name and 'value' in _fields_by_name
 
     @staticmethod
     def _is_message_map_field(field_descriptor):
@@ -111,15 +154,28 @@ class Meta(type(models.Model)):
         return Meta._is_map_field(field_descriptor) and Meta._is_message_field(
             field_descriptor.message_type.fields_by_name['value'])
 
-    def _create_generic_field(self, type_):
+    def _create_generic_field(self, type_, enum_type=None):
         """
         Creates a django field of the type that is defined in `pb_auto_field_type_mapping`.
         :param type_: Protobuf field type.
+        :param enum_type: Protobuf enum descriptor of enum fields, its values are the choices of the field.
         :return: Django field.
         """
         field_type = self.pb_auto_field_type_mapping[type_]
+        if enum_type is not None:
+            return field_type(null=True, choices=fields.enum_choices(enum_type))
         return field_type(null=True)
 
+    def _create_enum_name_field(self, enum_type):
+        """
+        Creates a django field storing names of an enum.
+        :param enum_type: Protobuf enum descriptor.
+        :return: EnumNameField
+        """
+        field_type = self.pb_auto_field_type_mapping[fields.PB_FIELD_TYPE_ENUM_NAME]
+        choices = fields.enum_choices(enum_type, by_name=True)
+        return field_type(null=True, choices=choices, max_length=max(len(name) for name, _ in choices))
+
     def _create_timestamp_field(self):
         field_type = self.pb_auto_field_type_mapping[fields.PB_FIELD_TYPE_TIMESTAMP]
         return field_type()
@@ -163,7 +219,478 @@ class Meta(type(models.Model)):
         field_type = self.pb_auto_field_type_mapping[fields.PB_FIELD_TYPE_MESSAGE_MAP]
         return field_type(to=related_type, related_name='%s_%s' % (own_type, field_name))
 
-class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
+def _cycle_key(instance):
+    if instance.pk is None:
+        return id(instance)
+    return instance._meta.concrete_model, instance.pk
+
+
+def _is_converting(instance):
+    return _cycle_key(instance) in getattr(_converting, 'ancestors', ())
+
+
+def _prefetched_to_pb(objs, lookups, depth):
+    """Convert instances of a model to protobuf messages, prefetching lookups first"""
+    models.prefetch_related_objects(objs, *lookups)
+    return [_obj.to_pb(depth=depth) for _obj in objs]
+
+
+class ProtoBufQuerySet(models.QuerySet):
+    """QuerySet converting its rows to protobuf messages in batches, relations
+    mapped to message fields are prefetched once per batch instead of per row.
+    """
+
+    def to_pb_list(self, depth=None):
+        """Convert all rows to protobuf messages
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: list of ProtoBuf instances
+        """
+        return [_obj.to_pb(depth=depth) for _obj in
+                self.prefetch_related(*self.model._pb_prefetch_lookups(depth))]
+
+    def to_pb_container(self, container_message, field=None, depth=None, chunk_size=None):
+        """Convert all rows directly into the repeated field of a container
+        message, ex: ``message MainList { repeated Main items = 1; }``
+
+        :param container_message: message class, or message instance to fill
+        :param field: name of the repeated field, defaults to the only
+            repeated field of messages of the model
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param chunk_size: number of rows fetched at a time, None to fetch all
+            rows with a single query
+        :returns: ProtoBuf instance of container_message
+        """
+        if isinstance(container_message, type):
+            container_message = container_message()
+        if field is None:
+            field = repeated_field_of(container_message.DESCRIPTOR, self.model)
+        _repeated = getattr(container_message, field)
+
+        if chunk_size is None:
+            _batches = [self.prefetch_related(*self.model._pb_prefetch_lookups(depth))]
+        else:
+            _batches = self._iter_batches(depth, chunk_size)
+        for _objs in _batches:
+            for _obj in _objs:
+                _obj._to_pb_into(_repeated.add(), depth=depth)
+        return container_message
+
+    def iter_pb(self, depth=None, chunk_size=100):
+        """Iterate over protobuf messages of rows, fetching and prefetching
+        relations in chunks of rows
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param chunk_size: number of rows fetched at a time
+        :returns: generator of ProtoBuf instances
+        """
+        for _messages in self._iter_pb_batches(depth, chunk_size):
+            for _message in _messages:
+                yield _message
+
+    def pb_page(self, cursor=None, page_size=100, order_by='pk', depth=None, container=None, field=None):
+        """Convert a page of rows with keyset pagination, see
+        :func:`pb_model.pagination.paginate_pb`
+
+        :returns: :class:`pb_model.pagination.Page`
+        """
+        from .pagination import paginate_pb
+        return paginate_pb(self, cursor=cursor, page_size=page_size, order_by=order_by, depth=depth,
+                           container=container, field=field)
+
+    def iter_pb_bytes(self, depth=None, chunk_size=100, delimited=False, max_bytes=None):
+        """Iterate over serialized protobuf messages of rows, converting every
+        row into the same message, cleared in between, instead of a new one
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param chunk_size: number of rows fetched at a time
+        :param delimited: prefix every message with its size, see :mod:`pb_model.delimited`
+        :param max_bytes: maximum size of yielded bytes, None for no limit.
+            Length-delimited messages are joined in chunks up to this size.
+        :returns: generator of bytes
+        :raises DjangoPBModelError: if a single message exceeds max_bytes
+        """
+        from .delimited import encode_delimited
+
+        _message = self.model.pb_model()
+        _chunk, _chunk_bytes = [], 0
+        for _batch in self._iter_batches(depth, chunk_size):
+            for _obj in _batch:
+                _message.Clear()
+                _obj._to_pb_into(_message, depth=depth)
+                _data = _message.SerializeToString()
+                if delimited:
+                    _data = encode_delimited(_data)
+                if max_bytes is None:
+                    yield _data
+                    continue
+                if len(_data) > max_bytes:
+                    raise DjangoPBModelError("Message of {} pk {} has {} bytes, exceeding limit of {} bytes".format(
+                        self.model.__name__, _obj.pk, len(_data), max_bytes))
+                if not delimited:
+                    yield _data
+                    continue
+                if _chunk_bytes + len(_data) > max_bytes:
+                    yield b''.join(_chunk)
+                    _chunk, _chunk_bytes = [], 0
+                _chunk.append(_data)
+                _chunk_bytes += len(_data)
+        if _chunk:
+            yield b''.join(_chunk)
+
+    def iter_pb_json(self, depth=None, chunk_size=100):
+        """Iterate over the JSON text of an array of rows in protobuf JSON
+        mapping, one row per chunk, ex: for a StreamingHttpResponse
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param chunk_size: number of rows fetched at a time
+        :returns: generator of str
+        """
+        _separator = '['
+        for _batch in self._iter_batches(depth, chunk_size):
+            for _obj in _batch:
+                yield _separator + json.dumps(_obj.to_pb_dict(depth=depth))
+                _separator = ','
+        yield '[]' if _separator == '[' else ']'
+
+    def iter_pb_containers(self, container_message, max_bytes, field=None, depth=None, chunk_size=100):
+        """Convert rows into container messages, ex:
+        ``message MainList { repeated Main items = 1; }``, each serialized to
+        at most max_bytes bytes
+
+        Rows are converted in place as to_pb_container() does. The serialized
+        size of every element, its tag and length prefix included, is counted
+        with ``ByteSize()`` as it is added, and the container is yielded
+        before it would exceed max_bytes.
+
+        :param container_message: message class of containers
+        :param max_bytes: maximum serialized size of a container
+        :param field: name of the repeated field, defaults to the only
+            repeated field of messages of the model
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param chunk_size: number of rows fetched at a time
+        :returns: generator of ProtoBuf instances of container_message
+        :raises DjangoPBModelError: if a single row doesn't fit in max_bytes
+        """
+        from .delimited import WIRETYPE_LENGTH_DELIMITED, varint_size
+
+        if field is None:
+            field = repeated_field_of(container_message.DESCRIPTOR, self.model)
+        _tag_size = varint_size(container_message.DESCRIPTOR.fields_by_name[field].number << 3 |
+                                WIRETYPE_LENGTH_DELIMITED)
+
+        _container = container_message()
+        _repeated, _size = getattr(_container, field), 0
+        for _batch in self._iter_batches(depth, chunk_size):
+            for _obj in _batch:
+                _message = _repeated.add()
+                _obj._to_pb_into(_message, depth=depth)
+                _message_size = _message.ByteSize()
+                _element_size = _tag_size + varint_size(_message_size) + _message_size
+                if _element_size > max_bytes:
+                    raise DjangoPBModelError("Message of {} pk {} has {} bytes, exceeding limit of {} bytes".format(
+                        self.model.__name__, _obj.pk, _element_size, max_bytes))
+                if _size + _element_size > max_bytes:
+                    # move the element which doesn't fit to the next container
+                    _next = container_message()
+                    getattr(_next, field).add().CopyFrom(_message)
+                    del _repeated[-1]
+                    yield _container
+                    _container, _size = _next, 0
+                    _repeated = getattr(_container, field)
+                _size += _element_size
+        if len(_repeated):
+            yield _container
+
+    async def aiter_pb(self, depth=None, chunk_size=100):
+        """Asynchronous version of iter_pb(), usable as ``async for``
+
+        Each chunk of rows is fetched, prefetched and converted within a single
+        thread hop with ``sync_to_async``, so conversion never touches database
+        from the event loop. Django 3.1 and 3.2 have no asynchronous queries,
+        and converting queries lazily past the prefetched relations, ex: cycles.
+        """
+        from asgiref.sync import sync_to_async
+
+        _batches = self._iter_pb_batches(depth, chunk_size)
+        try:
+            while True:
+                _messages = await sync_to_async(next)(_batches, None)
+                if _messages is None:
+                    return
+                for _message in _messages:
+                    yield _message
+        finally:
+            await sync_to_async(_batches.close)()
+
+    async def aget_pb(self, *args, **kwargs):
+        """Asynchronous get() of a single row converted to protobuf message
+
+        The row is fetched, prefetched and converted within a single thread
+        hop with ``sync_to_async``, as aiter_pb() does.
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: ProtoBuf instance
+        """
+        from asgiref.sync import sync_to_async
+        depth = kwargs.pop('depth', None)
+        return await sync_to_async(self._get_pb)(depth, *args, **kwargs)
+
+    def _get_pb(self, depth, *args, **kwargs):
+        return _prefetched_to_pb([self.get(*args, **kwargs)], self.model._pb_prefetch_lookups(depth), depth)[0]
+
+    def _iter_pb_batches(self, depth, chunk_size):
+        for _batch in self._iter_batches(depth, chunk_size):
+            yield [_obj.to_pb(depth=depth) for _obj in _batch]
+
+    def _iter_batches(self, depth, chunk_size):
+        """Iterate over lists of rows with relations converted by to_pb()
+        prefetched, fetching chunk_size rows at a time
+        """
+        _lookups = self.model._pb_prefetch_lookups(depth)
+        _batch = []
+        for _obj in self.iterator(chunk_size=chunk_size):
+            _batch.append(_obj)
+            if len(_batch) >= chunk_size:
+                models.prefetch_related_objects(_batch, *_lookups)
+                yield _batch
+                _batch = []
+        if _batch:
+            models.prefetch_related_objects(_batch, *_lookups)
+            yield _batch
+
+
+# returned by ProtoBufMixin._field_encode() for fields converted through a message
+_VIA_MESSAGE = object()
+# how from_pb_bytes() converts a field besides _VIA_MESSAGE: a singular scalar
+# decoded from wire format, or a singular message merged from its occurrences
+_WIRE_VALUE = object()
+_WIRE_MERGED = object()
+# a singular message converted to a related instance by from_pb_bytes(), or
+# a relation field from_pb() does nothing with
+_WIRE_RELATION = object()
+_WIRE_IGNORED = object()
+
+
+class _ScratchMessage(object):
+    """Message created on first use, for the fields of to_pb_dict() converted
+    through a message
+
+    :param factory: callable creating the message
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self.message = None
+
+    def get(self):
+        if self.message is None:
+            self.message = self._factory()
+        return self.message
+
+
+_nested_message_classes = {}
+
+
+def _nested_message_class(message_class, field_name):
+    """Getting the message class of a message field, cached by field"""
+    _key = (message_class, field_name)
+    if _key not in _nested_message_classes:
+        _nested_message_classes[_key] = type(getattr(message_class(), field_name))
+    return _nested_message_classes[_key]
+
+
+def _parse_message(message_class, data):
+    """FromString() raising DjangoPBModelError"""
+    from google.protobuf.message import DecodeError
+
+    try:
+        return message_class.FromString(data)
+    except DecodeError as e:
+        raise DjangoPBModelError("Can't decode message {}: {}".format(message_class.DESCRIPTOR.full_name, e))
+
+
+def _merge_json(result, other):
+    """Merge protobuf JSON mapping dicts of the same message, recursively"""
+    for key, value in other.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            _merge_json(result[key], value)
+        else:
+            result[key] = value
+
+
+def _copy_mapping(mapping):
+    """Copy a pb_2_dj_field_map, including the dicts of inline messages"""
+    return {key: _copy_mapping(value) if isinstance(value, dict) else value for key, value in mapping.items()}
+
+
+class _Encoder(object):
+    """How ProtoBufMixin._encode_recursively() assembles the fields it
+    encodes, in protobuf JSON mapping or wire format
+    """
+
+    def related(self, instance, depth):
+        """Encoding of a related instance, through to_pb() if it is overridden"""
+        if type(instance).to_pb is not ProtoBufMixin.to_pb:
+            return self.from_message(instance.to_pb(depth=depth))
+        return self.encode(instance, depth)
+
+    @staticmethod
+    def scratch(message_class):
+        return _ScratchMessage(message_class)
+
+
+class _JSONEncoder(_Encoder):
+    """Protobuf JSON mapping dicts, for to_pb_dict()"""
+
+    @staticmethod
+    def serializers():
+        return fields.json_serializers
+
+    @staticmethod
+    def encode(instance, depth):
+        return instance.to_pb_dict(depth)
+
+    @staticmethod
+    def from_message(message):
+        from google.protobuf import json_format
+        return json_format.MessageToDict(message)
+
+    @staticmethod
+    def nested_scratch(scratch, pb_field, message_class):
+        # converted through the message of the parent, merged once by finish()
+        return _ScratchMessage(lambda: getattr(scratch.get(), pb_field.name))
+
+    @staticmethod
+    def assigned_through(scratch):
+        return False
+
+    @staticmethod
+    def message(items, scratch):
+        result = {}
+        for pb_field, value in items:
+            if value is fields.JSON_OMITTED:
+                continue
+            if pb_field.containing_oneof is not None:
+                # the last assigned field of a oneof wins
+                for other in pb_field.containing_oneof.fields:
+                    result.pop(other.json_name, None)
+            result[pb_field.json_name] = value
+        return result
+
+    @staticmethod
+    def message_field(pb_field, value):
+        return value
+
+    @staticmethod
+    def repeated_message_field(pb_field, values):
+        return values or None
+
+    def finish(self, instance, result, scratch):
+        if scratch.message is not None:
+            _merge_json(result, self.from_message(scratch.message))
+        return result
+
+
+class _WireEncoder(_Encoder):
+    """Wire format bytes, for to_pb_bytes(), fields are written in field
+    number order as ``SerializeToString()`` does
+    """
+
+    @staticmethod
+    def serializers():
+        return fields.wire_serializers
+
+    @staticmethod
+    def encode(instance, depth):
+        return instance.to_pb_bytes(depth)
+
+    @staticmethod
+    def from_message(message):
+        return message.SerializeToString()
+
+    @staticmethod
+    def nested_scratch(scratch, pb_field, message_class):
+        # serialized along with the other fields of the nested message
+        return _ScratchMessage(message_class)
+
+    @staticmethod
+    def assigned_through(scratch):
+        return scratch.message is not None
+
+    @staticmethod
+    def message(items, scratch):
+        from .delimited import split_fields
+
+        chunks = []
+        for pb_field, data in items:
+            if pb_field.containing_oneof is not None:
+                # the last assigned field of a oneof wins
+                others = set(f.number for f in pb_field.containing_oneof.fields)
+                chunks = [chunk for chunk in chunks if chunk[0] not in others]
+            if data:
+                chunks.append((pb_field.number, data))
+        if scratch.message is not None:
+            chunks.extend(split_fields(scratch.message.SerializeToString()))
+        chunks.sort(key=lambda chunk: chunk[0])
+        return b''.join(data for _, data in chunks)
+
+    @staticmethod
+    def message_field(pb_field, data):
+        return fields.length_delimited_to_wire(pb_field, data)
+
+    @staticmethod
+    def repeated_message_field(pb_field, values):
+        return b''.join(fields.length_delimited_to_wire(pb_field, data) for data in values) or None
+
+    @staticmethod
+    def finish(instance, data, scratch):
+        if instance._pb_unknown_fields:
+            # written after known fields as SerializeToString() does
+            data += instance._pb_unknown_fields
+        return data
+
+
+_JSON_ENCODER = _JSONEncoder()
+_WIRE_ENCODER = _WireEncoder()
+
+
+def repeated_field_of(descriptor, model):
+    """Getting the name of the only repeated field of messages of model
+
+    :param descriptor: descriptor of the container message
+    :param model: ProtoBufMixin model class
+    :returns: field name
+    :raises DjangoPBModelError: if there is no such field, or more than one
+    """
+    candidates = [f.name for f in descriptor.fields
+                  if f.label == f.LABEL_REPEATED and f.message_type is not None and
+                  f.message_type.full_name == model.pb_model.DESCRIPTOR.full_name]
+    if len(candidates) != 1:
+        raise DjangoPBModelError("Can't find the repeated field of {} in {}, set the field name".format(
+            model.pb_model.DESCRIPTOR.full_name, descriptor.full_name))
+    return candidates[0]
+
+
+def warm_up(model_classes=None):
+    """Build conversion state of models ahead of their first conversion,
+    see ProtoBufMixin._pb_warm_up()
+
+    :param model_classes: ProtoBufMixin models, defaults to all installed ones
+    :returns: list of warmed up models
+    """
+    if model_classes is None:
+        from django.apps import apps
+        model_classes = [m for m in apps.get_models() if issubclass(m, ProtoBufMixin) and m.pb_model is not None]
+    _start = time.perf_counter()
+    for model in model_classes:
+        model._pb_warm_up()
+    LOGGER.info("Warmed up conversion of {} models in {:.1f} ms".format(
+        len(model_classes), (time.perf_counter() - _start) * 1000))
+    return model_classes
+
+
+class ProtoBufMixin(models.Model, metaclass=Meta):
     """This is mixin for model.Model.
     By setting attribute ``pb_model``, you can specify target ProtoBuf Message
     to handle django model.
@@ -178,6 +705,10 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
     pb_model = None
     pb_2_dj_fields = []  # list of pb field names that are mapped, special case pb_2_dj_fields = '__all__'
     pb_2_dj_field_map = {}  # pb field in keys, dj field in value
+    pb_natural_key = None  # pb field name identifying nested messages instead of the primary key
+    pb_2_dj_reference_fields = []  # pb field names of relations deserialized to the related key only
+    pb_2_dj_enum_name_fields = []  # pb field names of enums generated as fields storing value names
+    pb_strict_enums = False  # reject unknown enum values in from_pb()
 
     # defaults for models.DateTimeField and models.UUIDField
     # these serializers would be overwrited by definition in pb_2_dj_field_serializers if any
@@ -216,6 +747,7 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
         fields.PB_FIELD_TYPE_REPEATED_MESSAGE: fields.RepeatedMessageField,
         fields.PB_FIELD_TYPE_MESSAGE_MAP: fields.MessageMapField,
         fields.PB_FIELD_TYPE_MESSAGE_ANY: fields.ProtoBufAnyField,
+        fields.PB_FIELD_TYPE_ENUM_NAME: fields.EnumNameField,
     }  # pb field type in key, dj field type in value
     """
     {ProtoBuf-field-name: Django-field-name} key-value pair mapping to handle
@@ -226,6 +758,11 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
 
     default_serializers = (fields._defaultfield_to_pb, fields._defaultfield_from_pb)
 
+    objects = ProtoBufQuerySet.as_manager()
+
+    _pb_ingestion_context = None
+    _pb_unknown_fields = None  # serialized fields unknown to pb_model, kept by from_pb_bytes()
+
     def __init__(self, *args, **kwargs):
         super(ProtoBufMixin, self).__init__(*args, **kwargs)
         for m2m_field in self._meta.many_to_many:
@@ -246,6 +783,13 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
             kwargs['force_insert'] = False
             super(ProtoBufMixin, self).save(*args, **kwargs)
 
+    async def asave(self, *args, **kwargs):
+        """Asynchronous version of save(), saving within a single thread hop
+        with ``sync_to_async``, many-to-many message fields included
+        """
+        from asgiref.sync import sync_to_async
+        await sync_to_async(self.save)(*args, **kwargs)
+
     def _to_pb(self, _dj_field_name, _field, _pb_obj, _dj_fields,
                _dj_pb_field_map, depth):
         _dj_f_name = _dj_pb_field_map.get(_dj_field_name, _dj_field_name)
@@ -253,24 +797,55 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
             LOGGER.warning("No such django field: {}".format(_dj_f_name))
             return
         try:
-            _dj_f_value = getattr(self, _dj_f_name)
-            _dj_f_type = _dj_fields[_dj_f_name]
-            if _dj_f_type.null and _dj_f_value is None:
+            _value = self._pb_field_value(_dj_f_name, _field, _dj_fields, depth)
+            if _value is None:
                 return
+            _dj_f_type, _dj_f_value, is_relation = _value
 
-            # See if there's a custom serializer for this field relation or not
-            field_serializers = self._get_serializers(type(_dj_f_type), _field)
-            if field_serializers and field_serializers != self.default_serializers:
-                self._value_to_protobuf(_pb_obj, _field, type(_dj_f_type), _dj_f_value)
+            if is_relation:
+                self._relation_to_protobuf(_pb_obj, _field, _dj_f_type, _dj_f_value, depth)
             else:
-                if _dj_f_type.is_relation and not issubclass(type(_dj_f_type), fields.ProtoBufFieldMixin):
-                    self._relation_to_protobuf(_pb_obj, _field, _dj_f_type, _dj_f_value, depth)
-                else:
-                    self._value_to_protobuf(_pb_obj, _field, type(_dj_f_type), _dj_f_value)
+                self._value_to_protobuf(_pb_obj, _field, type(_dj_f_type), _dj_f_value)
         except AttributeError as e:
-            LOGGER.error("Fail to serialize field: {} for {}. Error: {}".format(_dj_f_name, self._meta.model, e))
-            raise DjangoPBModelError(
-                "Can't serialize Model({})'s field: {}. Err: {}".format(_dj_f_name, self._meta.model, e))
+            self._raise_serialize_error(_dj_f_name, e)
+
+    def _pb_field_value(self, _dj_f_name, _field, _dj_fields, depth):
+        """Getting the django field and value converted to a message field
+
+        :returns: tuple of (django field, value, is relation), or None if the
+            field is not converted
+        """
+        _dj_f_type = _dj_fields[_dj_f_name]
+
+        # See if there's a custom serializer for this field relation or not
+        field_serializers = self._get_serializers(type(_dj_f_type), _field)
+        is_custom = field_serializers and field_serializers != self.default_serializers
+        is_relation = (not is_custom and _dj_f_type.is_relation and
+                       not issubclass(type(_dj_f_type), fields.ProtoBufFieldMixin))
+        if is_relation and depth is not None and depth <= 0:
+            # don't load relation which won't be converted
+            LOGGER.debug(
+                "Django Relation field '{}', capped by depth, not converting".format(
+                    _field.name))
+            return None
+
+        if isinstance(_dj_f_type, ForeignObjectRel):
+            # reverse relation, accessed by its accessor name
+            try:
+                _dj_f_value = getattr(self, _dj_f_type.get_accessor_name())
+            except ObjectDoesNotExist:
+                # no row relates to this one by one-to-one field
+                return None
+        else:
+            _dj_f_value = getattr(self, _dj_f_name)
+        if _dj_f_type.null and _dj_f_value is None:
+            return None
+        return _dj_f_type, _dj_f_value, is_relation
+
+    def _raise_serialize_error(self, _dj_f_name, e):
+        LOGGER.error("Fail to serialize field: {} for {}. Error: {}".format(_dj_f_name, self._meta.model, e))
+        raise DjangoPBModelError(
+            "Can't serialize Model({})'s field: {}. Err: {}".format(_dj_f_name, self._meta.model, e))
 
     def _to_proto_recursively(self, _pb_obj, _pb_dj_field_map, _dj_fields,
                               depth):
@@ -282,30 +857,296 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
                                            depth=depth)
             else:
                 _field = _pb_obj.DESCRIPTOR.fields_by_name[_pb_field.name]
-                self._to_pb(_dj_field_name, _field, _pb_obj, _dj_fields, _pb_dj_field_map, depth=depth)
+                if instrumentation.tracers:
+                    with instrumentation.trace(self, _field.name, instrumentation.TO_PB, _pb_obj):
+                        self._to_pb(_dj_field_name, _field, _pb_obj, _dj_fields, _pb_dj_field_map, depth=depth)
+                else:
+                    self._to_pb(_dj_field_name, _field, _pb_obj, _dj_fields, _pb_dj_field_map, depth=depth)
 
-    def to_pb(self, depth=None):
+    def to_pb(self, depth=None, into=None):
         """Convert django model to protobuf instance by pre-defined name
 
         :param depth: depth of relation been recursively converted. None means
             unlimited, 0 means no relation will be converted.
+        :param into: existing ProtoBuf instance of pb_model to convert into
+            instead of a new one, see fill_pb()
 
         :returns: ProtoBuf instance
         """
-        _pb_obj = self.pb_model()
+        _pb_obj = self.pb_model() if into is None else into
+        self.fill_pb(_pb_obj, depth)
 
+        # formatting the message is deferred to enabled handlers
+        LOGGER.info("Converted Protobuf [%s]: %s", _pb_obj.DESCRIPTOR.full_name, _pb_obj)
+        return _pb_obj
+
+    def fill_pb(self, _pb_obj, depth=None):
+        """Convert into an existing message of pb_model, in place, ex: a
+        message field of another message or a message reused for many rows
+
+        Fields are set over the current content of the message, fields of
+        None values are left untouched, so call ``Clear()`` before reusing
+        a message.
+
+        :param _pb_obj: ProtoBuf instance of pb_model
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: _pb_obj
+        """
         # Mapping from proto field to Django field
         _pb_to_dj_mapping = self.pb_2_dj_field_map
 
         # Flat list of all Django fields
-        _dj_fields = {f.name: f for f in self._meta.get_fields()}
-
-        self._to_proto_recursively(_pb_obj, _pb_to_dj_mapping, _dj_fields, depth)
+        _dj_fields = self._pb_dj_fields()
 
-        LOGGER.info("Converted Protobuf [{}]: {}".format(
-            _pb_obj.DESCRIPTOR.full_name, _pb_obj))
+        _ancestors = _converting.__dict__.setdefault('ancestors', [])
+        _ancestors.append(_cycle_key(self))
+        try:
+            self._to_proto_recursively(_pb_obj, _pb_to_dj_mapping, _dj_fields, depth)
+        finally:
+            _ancestors.pop()
+        if self._pb_unknown_fields:
+            _pb_obj.MergeFromString(self._pb_unknown_fields)
         return _pb_obj
 
+    def _to_pb_into(self, _pb_obj, depth=None):
+        """Convert into given empty message, ex: ``repeated.add()``, without
+        building an intermediate message, unless to_pb() is overridden
+
+        :param _pb_obj: ProtoBuf instance of pb_model
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: None
+        """
+        if type(self).to_pb is not ProtoBufMixin.to_pb:
+            _pb_obj.CopyFrom(self.to_pb(depth=depth))
+        else:
+            self.fill_pb(_pb_obj, depth)
+
+    def to_pb_dict(self, depth=None):
+        """Convert django model to the protobuf JSON mapping of pb_model,
+        equal to ``json_format.MessageToDict(self.to_pb(depth=depth))``,
+        straight from model attributes without building the message
+
+        Fields of serializers without a JSON counterpart in
+        ``fields.json_serializers``, ex: custom serializers and
+        ProtoBufFieldMixin fields, are converted into a message first.
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: dict
+        """
+        return self._encode(_JSON_ENCODER, depth)
+
+    def to_pb_json(self, depth=None, **kwargs):
+        """Convert django model to JSON text in protobuf JSON mapping, see to_pb_dict()
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :param kwargs: arguments of ``json.dumps()``
+        :returns: str
+        """
+        return json.dumps(self.to_pb_dict(depth=depth), **kwargs)
+
+    def to_pb_bytes(self, depth=None):
+        """Serialize django model to protobuf wire format, equal to
+        ``self.to_pb(depth=depth).SerializeToString()``, straight from model
+        attributes without building the message
+
+        Fields of serializers without a wire format counterpart in
+        ``fields.wire_serializers``, ex: custom serializers and
+        ProtoBufFieldMixin fields, are converted into a message first.
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: bytes
+        """
+        return self._encode(_WIRE_ENCODER, depth)
+
+    def _encode(self, _encoder, depth):
+        """Protobuf JSON mapping or wire format of the model, see to_pb_dict()
+        and to_pb_bytes()
+
+        :param _encoder: _JSON_ENCODER or _WIRE_ENCODER
+        """
+        _scratch = _encoder.scratch(self.pb_model)
+        _ancestors = _converting.__dict__.setdefault('ancestors', [])
+        _ancestors.append(_cycle_key(self))
+        try:
+            _result, _ = self._encode_recursively(
+                _encoder, self.pb_model, self.pb_2_dj_field_map, self._pb_dj_fields(), depth, _scratch)
+        finally:
+            _ancestors.pop()
+        return _encoder.finish(self, _result, _scratch)
+
+    def _encode_recursively(self, _encoder, _message_class, _pb_dj_field_map, _dj_fields, depth, _scratch):
+        """Encoding of the fields of a message, the counterpart of
+        _to_proto_recursively()
+
+        :param _scratch: _ScratchMessage of the message, for fields converted through it
+        :returns: tuple of (encoded message, whether any field is assigned)
+        """
+        _items, _assigned = [], False
+        for _pb_field in _message_class.DESCRIPTOR.fields:
+            _dj_field_name = _pb_dj_field_map.get(_pb_field.name, _pb_field.name)
+            if isinstance(_dj_field_name, dict):
+                _nested_class = _nested_message_class(_message_class, _pb_field.name)
+                _nested, _nested_assigned = self._encode_recursively(
+                    _encoder, _nested_class, _dj_field_name, _dj_fields, depth,
+                    _encoder.nested_scratch(_scratch, _pb_field, _nested_class))
+                if _nested_assigned:
+                    _items.append((_pb_field, _encoder.message_field(_pb_field, _nested)))
+                    _assigned = True
+                continue
+
+            _dj_f_name = _pb_dj_field_map.get(_dj_field_name, _dj_field_name)
+            if _dj_f_name not in _dj_fields:
+                LOGGER.warning("No such django field: {}".format(_dj_f_name))
+                continue
+            try:
+                _value = self._pb_field_value(_dj_f_name, _pb_field, _dj_fields, depth)
+                if _value is None:
+                    continue
+                _dj_f_type, _dj_f_value, is_relation = _value
+                _encoded = self._field_encode(_encoder, _pb_field, _dj_f_type, _dj_f_value, is_relation, depth)
+                if _encoded is _VIA_MESSAGE:
+                    if is_relation:
+                        self._relation_to_protobuf(_scratch.get(), _pb_field, _dj_f_type, _dj_f_value, depth)
+                    else:
+                        self._value_to_protobuf(_scratch.get(), _pb_field, type(_dj_f_type), _dj_f_value)
+                    continue
+            except AttributeError as e:
+                self._raise_serialize_error(_dj_f_name, e)
+
+            if _encoded is None:
+                continue
+            _assigned = True
+            _items.append((_pb_field, _encoded))
+        return _encoder.message(_items, _scratch), _assigned or _encoder.assigned_through(_scratch)
+
+    def _field_encode(self, _encoder, _pb_field, _dj_f_type, _dj_f_value, is_relation, depth):
+        """Getting the encoding of a field value
+
+        :returns: encoded value, fields.JSON_OMITTED, None if nothing is
+            assigned, or _VIA_MESSAGE if the field has to be converted through
+            a message
+        """
+        _cls = type(self)
+        if is_relation:
+            if (_cls._relation_to_protobuf is not ProtoBufMixin._relation_to_protobuf or
+                    _cls._m2m_to_protobuf is not ProtoBufMixin._m2m_to_protobuf):
+                # conversion hooks are overridden
+                return _VIA_MESSAGE
+            return self._relation_encode(_encoder, _pb_field, _dj_f_type, _dj_f_value, depth)
+
+        if (_pb_field.label == FieldDescriptor.LABEL_REPEATED or
+                _cls._value_to_protobuf is not ProtoBufMixin._value_to_protobuf):
+            return _VIA_MESSAGE
+        _serializer = _encoder.serializers().get(self._get_serializers(type(_dj_f_type), _pb_field)[0])
+        if _serializer is None:
+            return _VIA_MESSAGE
+        return _serializer(_pb_field, _dj_f_value)
+
+    def _relation_encode(self, _encoder, pb_field, dj_field_type, dj_field_value, depth):
+        """Encoding counterpart of _relation_to_protobuf()"""
+        next_depth = depth-1 if depth is not None else None
+        if dj_field_type.many_to_many or dj_field_type.one_to_many:
+            return _encoder.repeated_message_field(pb_field, [
+                _encoder.related(_obj, next_depth) for _obj in dj_field_value.all() if not _is_converting(_obj)])
+        if _is_converting(dj_field_value):
+            LOGGER.debug("Django Relation field '{}' refers to an instance being converted, skipping".format(
+                pb_field.name))
+            return None
+        return _encoder.message_field(pb_field, _encoder.related(dj_field_value, next_depth))
+
+    async def ato_pb(self, depth=None):
+        """Asynchronous version of to_pb(), relations are prefetched and
+        converted within a single thread hop with ``sync_to_async``, see
+        ProtoBufQuerySet.aiter_pb()
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: ProtoBuf instance
+        """
+        from asgiref.sync import sync_to_async
+        _messages = await sync_to_async(_prefetched_to_pb)([self], self._pb_prefetch_lookups(depth), depth)
+        return _messages[0]
+
+    @classmethod
+    def _pb_dj_fields(cls):
+        """Getting django fields by name, including reverse relations
+
+        The mapping is cached on the model class and rebuilt whenever django
+        expires the fields cache of ``_meta``, ex: a model relating to this
+        one is registered later.
+
+        :returns: dict of {field name: field}, must not be modified
+        """
+        _fields = cls._meta.get_fields()
+        _cache = cls.__dict__.get('_pb_dj_fields_cache')
+        if _cache is None or _cache[0] is not _fields:
+            _cache = (_fields, {f.name: f for f in _fields})
+            cls._pb_dj_fields_cache = _cache
+        return _cache[1]
+
+    @classmethod
+    def _pb_warm_up(cls):
+        """Build state which is otherwise built lazily by the first conversion:
+        django fields by name, related models, prefetch lookups, manager
+        classes of many-to-many fields and the protobuf message class
+        """
+        cls._pb_dj_fields()
+        cls._pb_prefetch_lookups()
+        for _field in cls._meta.many_to_many:
+            for _klass in cls.__mro__:
+                if _field.attname in _klass.__dict__:
+                    # cached property creating the manager class
+                    getattr(_klass.__dict__[_field.attname], 'related_manager_cls')
+                    break
+        cls.pb_model()
+
+    @classmethod
+    def _pb_dj_field_names(cls, pb_descriptor=None, pb_dj_field_map=None):
+        """Iterate over pb fields and mapped django field names, including
+        fields of nested inline mappings
+
+        :returns: generator of (pb field descriptor, django field name)
+        """
+        if pb_descriptor is None:
+            pb_descriptor, pb_dj_field_map = cls.pb_model.DESCRIPTOR, cls.pb_2_dj_field_map
+        for _pb_field in pb_descriptor.fields:
+            _dj_field_name = pb_dj_field_map.get(_pb_field.name, _pb_field.name)
+            if isinstance(_dj_field_name, dict):
+                for _item in cls._pb_dj_field_names(_pb_field.message_type, _dj_field_name):
+                    yield _item
+            else:
+                yield _pb_field, _dj_field_name
+
+    @classmethod
+    def _pb_prefetch_lookups(cls, depth=None, _path=()):
+        """Getting prefetch_related() lookups of relations converted by to_pb()
+
+        :param depth: depth of relation been recursively converted, same as to_pb()
+        :returns: list of lookups
+        """
+        if depth is not None and depth <= 0:
+            return []
+        _path = _path + (cls,)
+        next_depth = depth-1 if depth is not None else None
+        _dj_fields = cls._pb_dj_fields()
+
+        lookups = []
+        for _pb_field, _dj_field_name in cls._pb_dj_field_names():
+            _dj_field = _dj_fields.get(_dj_field_name)
+            if (_dj_field is None or not _dj_field.is_relation or
+                    issubclass(type(_dj_field), fields.ProtoBufFieldMixin)):
+                continue
+            if isinstance(_dj_field, ForeignObjectRel):
+                _lookup_name = _dj_field.get_accessor_name()
+            else:
+                _lookup_name = _dj_field_name
+            lookups.append(_lookup_name)
+            related_model = _dj_field.related_model
+            # stop at cycles, their depth is unknown before converting
+            if issubclass(related_model, ProtoBufMixin) and related_model not in _path:
+                lookups.extend('%s__%s' % (_lookup_name, _lookup) for _lookup in
+                               related_model._pb_prefetch_lookups(next_depth, _path))
+        return lookups
+
     def _relation_to_protobuf(self, pb_obj, pb_field, dj_field_type,
                               dj_field_value, depth):
         """Handling relation to protobuf
@@ -319,11 +1160,6 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
         :returns: None
 
         """
-        if isinstance(dj_field_type, ManyToOneRel):
-            LOGGER.debug(
-                "Django Relation field '{}' is reverse related, skipping".format(
-                pb_field.name))
-            return
         if depth is None or depth > 0:
             LOGGER.debug(
                 "Django Relation field '{}', recursively serializing".format(
@@ -337,11 +1173,19 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
             return
 
         next_depth = depth-1 if depth is not None else None
-        if dj_field_type.many_to_many:
+        if dj_field_type.many_to_many or dj_field_type.one_to_many:
+            # m2m and reverse foreign key relations are both managers
             self._m2m_to_protobuf(pb_obj, pb_field, dj_field_value, next_depth)
+        elif _is_converting(dj_field_value):
+            # ex: foreign key back to the parent of a reverse relation
+            LOGGER.debug(
+                "Django Relation field '{}' refers to an instance being converted, skipping".format(
+                    pb_field.name))
         else:
-            getattr(pb_obj, pb_field.name).CopyFrom(dj_field_value.to_pb(
-                depth=next_depth))
+            _message = getattr(pb_obj, pb_field.name)
+            # mark the field as set, even if no field of message is
+            _message.SetInParent()
+            dj_field_value._to_pb_into(_message, depth=next_depth)
 
     def _m2m_to_protobuf(self, pb_obj, pb_field, dj_m2m_field, next_depth):
         """
@@ -370,8 +1214,14 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
         :returns: None
 
         """
-        getattr(pb_obj, pb_field.name).extend(
-            [_m2m.to_pb(depth=next_depth) for _m2m in dj_m2m_field.all()])
+        _repeated = getattr(pb_obj, pb_field.name)
+        for _m2m in dj_m2m_field.all():
+            if _is_converting(_m2m):
+                # ex: many to many relation back to an instance being converted
+                LOGGER.debug("Django Relation field '{}' item refers to an instance being converted, skipping".format(
+                    pb_field.name))
+                continue
+            _m2m._to_pb_into(_repeated.add(), depth=next_depth)
 
     def _get_serializers(self, dj_field_type, pb_field=None):
         """Getting the correct serializers for a field type
@@ -412,19 +1262,269 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
         s_funcs = self._get_serializers(dj_field_type, pb_field)
         s_funcs[0](pb_obj, pb_field, dj_field_value)
 
-    def from_pb(self, _pb_obj):
+    def from_pb(self, _pb_obj, context=None):
         """Convert given protobuf obj to mixin Django model
 
+        :param context: optional :class:`pb_model.ingestion.IngestionContext`
+            shared by nested messages of the same ingestion batch
         :returns: Django model instance
         """
-        _dj_field_map = {f.name: f for f in self._meta.get_fields()}
+        _dj_field_map = self._pb_dj_fields()
         _pb_dj_field_map = self.pb_2_dj_field_map
         LOGGER.debug("ListFields() returns only fields which contain a value")
-        self._from_pb_recursively(_dj_field_map, _pb_obj, _pb_dj_field_map)
+        self._pb_ingestion_context = context
+        try:
+            self._from_pb_recursively(_dj_field_map, _pb_obj, _pb_dj_field_map)
+        finally:
+            self._pb_ingestion_context = None
+
+        LOGGER.info("Converted Django model instance: %s", self)
+        return self
+
+    async def afrom_pb(self, _pb_obj, context=None):
+        """Asynchronous version of from_pb()
 
-        LOGGER.info("Converted Django model instance: {}".format(self))
+        Conversion runs on the event loop, unless an ingestion context is given,
+        which may query database and then runs within a single thread hop with
+        ``sync_to_async``.
+
+        :returns: Django model instance
+        """
+        if context is None:
+            return self.from_pb(_pb_obj)
+        from asgiref.sync import sync_to_async
+        return await sync_to_async(self.from_pb)(_pb_obj, context=context)
+
+    def from_pb_bytes(self, data, context=None, preserve_unknown=False):
+        """Convert serialized pb_model message to mixin Django model, equal to
+        ``self.from_pb(self.pb_model.FromString(data), context)``, straight
+        from wire format without parsing the message
+
+        Fields without a wire format decoder, ex: relations, repeated fields,
+        maps and custom serializers, are parsed into a message holding only
+        those fields and converted as from_pb() does.
+
+        :param data: serialized message
+        :param context: optional :class:`pb_model.ingestion.IngestionContext`,
+            same as from_pb()
+        :param preserve_unknown: keep top level fields unknown to pb_model on
+            the instance, to_pb() and to_pb_bytes() write them back
+        :returns: Django model instance
+        :raises DjangoPBModelError: if data is truncated or malformed
+        """
+        _dj_field_map = self._pb_dj_fields()
+        self._pb_ingestion_context = context
+        try:
+            _unknown = self._from_wire_recursively(_dj_field_map, self.pb_model, bytes(data), self.pb_2_dj_field_map,
+                                                   self._pb_wire_plan(), ())
+        finally:
+            self._pb_ingestion_context = None
+        if preserve_unknown:
+            self._pb_unknown_fields = _unknown or None
+
+        LOGGER.info("Converted Django model instance: %s", self)
         return self
 
+    def _from_wire_recursively(self, _dj_field_map, _message_class, _data, _pb_dj_field_map, _plan, _path):
+        """Counterpart of _from_pb_recursively() over wire format, fields are
+        converted in field number order as ListFields() returns them
+
+        :param _plan: _pb_wire_plan() of the model
+        :param _path: names of the pb fields leading from pb_model to the message
+        :returns: bytes of the fields parsed as unknown fields
+        """
+        from .delimited import iter_fields
+
+        _kinds = _plan.setdefault(_path, {})
+        _tracing = bool(instrumentation.tracers)
+        _values = {}  # {field number: (_wire_kind() result, value or list of payloads)}
+        _via_message, _unknown = [], []
+        for _number, _wire_type, _value, _chunk in iter_fields(_data):
+            _key = (_number, _wire_type)
+            _entry = _kinds.get(_key)
+            if _entry is None:
+                _entry = self._wire_kind(_message_class, _number, _wire_type, _pb_dj_field_map, _dj_field_map)
+                if _entry[0] is not None:
+                    # unknown numbers are not cached, they come from data
+                    _kinds[_key] = _entry
+            _kind = _entry[1]
+            if _kind is None:
+                _unknown.append(_chunk)
+                continue
+            if _entry[2]:
+                # the last occurring field of a oneof wins
+                for _other in _entry[2]:
+                    _values.pop(_other, None)
+                _via_message = [_item for _item in _via_message if _item[0] not in _entry[2]]
+            if _kind is _WIRE_IGNORED:
+                if not _tracing:
+                    continue
+                # tracers are notified with the value
+                _kind = _VIA_MESSAGE
+
+            if _kind is _VIA_MESSAGE:
+                _via_message.append((_number, _chunk))
+            elif _kind is _WIRE_MERGED or _kind is _WIRE_RELATION:
+                _values.setdefault(_number, (_entry, []))[1].append(_value)
+            else:
+                try:
+                    _values[_number] = (_entry, _entry[3](_value))
+                except ValueError as e:
+                    raise DjangoPBModelError("Can't decode field {}: {}".format(_entry[0].name, e))
+
+        # fields without presence are not listed with default values
+        _items = [(_number, _entry, _v) for _number, (_entry, _v) in _values.items()
+                  if _v or _entry[5] or _entry[1] is not _WIRE_VALUE]
+        if _via_message:
+            _pb_obj = _parse_message(_message_class, b''.join(_chunk for _, _chunk in _via_message))
+            _items.extend((_f.number, (_f, _VIA_MESSAGE), _v) for _f, _v in _pb_obj.ListFields())
+        _items.sort(key=lambda _item: _item[0])
+
+        for _, _entry, _v in _items:
+            _f, _kind = _entry[0], _entry[1]
+            if _kind is _WIRE_VALUE and _entry[4] is not None and not _tracing:
+                setattr(self, _entry[4], _v)
+                continue
+            if _kind is _WIRE_RELATION:
+                _v = b''.join(_v)
+                if not _tracing and self._pb_ingestion_context is None:
+                    setattr(self, _f.name, _dj_field_map[_f.name].related_model().from_pb_bytes(_v))
+                    continue
+                # through the message tracers and the ingestion context expect
+                _v, _kind = _parse_message(_nested_message_class(_message_class, _f.name), _v), _VIA_MESSAGE
+            _dj_field_name = _pb_dj_field_map.get(_f.name)
+            if _kind is _WIRE_MERGED:
+                if isinstance(_dj_field_name, dict):
+                    self._from_wire_recursively(_dj_field_map, _nested_message_class(_message_class, _f.name),
+                                                b''.join(_v), _dj_field_name, _plan, _path + (_f.name,))
+                    continue
+                _v = fields.wire_to_timestamp(b''.join(_v))
+            elif _kind is _VIA_MESSAGE and hasattr(_v, "DESCRIPTOR") and _dj_field_name is not None:
+                self._from_pb_recursively(_dj_field_map, _v, _dj_field_name)
+                continue
+
+            _dj_f_name = _dj_field_name if _dj_field_name is not None else _f.name
+            if _tracing:
+                with instrumentation.trace(self, _f.name, instrumentation.FROM_PB, _v):
+                    self._from_pb(_dj_field_map, _f, _v, _dj_f_name)
+            else:
+                self._from_pb(_dj_field_map, _f, _v, _dj_f_name)
+        return b''.join(_unknown)
+
+    @classmethod
+    def _pb_wire_plan(cls):
+        """Getting the cache of _wire_kind() results, held by the model class
+
+        The plan is rebuilt whenever the settings it is derived from are
+        changed, ex: ``pb_2_dj_field_serializers`` updated after class
+        creation, or django expires the fields cache of ``_meta``.
+
+        :returns: dict of {path of pb field names from pb_model to the
+            message: {(field number, wire type): result}}
+        """
+        _dj_fields = cls._pb_dj_fields()
+        _settings = (cls.pb_2_dj_field_map, cls.pb_2_dj_field_serializers, cls.default_serializers,
+                     cls.pb_strict_enums, list(cls.pb_2_dj_reference_fields))
+        _cache = cls.__dict__.get('_pb_wire_plan_cache')
+        if _cache is None or _cache[0] is not _dj_fields or _cache[1] != _settings:
+            _snapshot = (_copy_mapping(cls.pb_2_dj_field_map), dict(cls.pb_2_dj_field_serializers),
+                         cls.default_serializers, cls.pb_strict_enums, _settings[4])
+            _cache = cls._pb_wire_plan_cache = (_dj_fields, _snapshot, {})
+        return _cache[2]
+
+    def _wire_kind(self, _message_class, _number, _wire_type, _pb_dj_field_map, _dj_field_map):
+        """How from_pb_bytes() converts an occurrence of a field
+
+        :returns: tuple of (field descriptor, kind, numbers of the other fields
+            of its oneof, decoder of _WIRE_VALUE fields, name of the django
+            field a decoded value is assigned to as is or None if it goes
+            through _from_pb(), whether the field has presence), kind is
+            _WIRE_VALUE, _WIRE_MERGED, _WIRE_RELATION, _WIRE_IGNORED,
+            _VIA_MESSAGE, or None if the parser keeps it as an unknown field
+        """
+        _f = _message_class.DESCRIPTOR.fields_by_number.get(_number)
+        if _f is None:
+            return None, None, (), None, None, False
+        _others = ()
+        if _f.containing_oneof is not None:
+            _others = frozenset(f.number for f in _f.containing_oneof.fields if f.number != _number)
+        _kind = self._field_wire_kind(_f, _wire_type, _pb_dj_field_map, _dj_field_map)
+        if _kind is not _WIRE_VALUE:
+            return _f, _kind, _others, None, None, fields.has_presence(_f)
+
+        # assigning as is, what _from_pb() does with the default serializers
+        _cls = type(self)
+        _dj_f_name = _pb_dj_field_map.get(_f.name, _f.name)
+        _dj_field = _dj_field_map.get(_dj_f_name) if not isinstance(_dj_f_name, dict) else None
+        if (_dj_field is None or _cls._from_pb is not ProtoBufMixin._from_pb or
+                _cls._protobuf_to_value is not ProtoBufMixin._protobuf_to_value or
+                (self.pb_strict_enums and _f.enum_type is not None) or
+                self._get_serializers(type(_dj_field), _f)[1] is not fields._defaultfield_from_pb):
+            _dj_f_name = None
+        return _f, _kind, _others, fields.wire_decoder(_f), _dj_f_name, fields.has_presence(_f)
+
+    def _field_wire_kind(self, _f, _wire_type, _pb_dj_field_map, _dj_field_map):
+        """Getting the kind of _wire_kind() of a known field"""
+        from .delimited import WIRETYPE_LENGTH_DELIMITED
+
+        _expected = fields.field_wire_type(_f)
+        _repeated = _f.label == FieldDescriptor.LABEL_REPEATED
+        if _wire_type != _expected:
+            # repeated scalars are accepted packed or not
+            if _repeated and _wire_type == WIRETYPE_LENGTH_DELIMITED and _f.message_type is None:
+                return _VIA_MESSAGE
+            return None
+        if _f.message_type is None:
+            if _repeated or (_f.enum_type is not None and _f.containing_type.file.syntax != 'proto3'):
+                # closed enums keep unknown values as unknown fields
+                return _VIA_MESSAGE
+            return _WIRE_VALUE
+
+        _dj_field_name = _pb_dj_field_map.get(_f.name)
+        if isinstance(_dj_field_name, dict):
+            return _VIA_MESSAGE if _repeated else _WIRE_MERGED
+        if _repeated and _dj_field_name is not None:
+            _dj_field = _dj_field_map.get(_dj_field_name)
+        else:
+            _dj_field = _dj_field_map.get(_f.name) if _dj_field_name is None else None
+        _cls = type(self)
+        if _dj_field is None or _cls._from_pb is not ProtoBufMixin._from_pb:
+            return _VIA_MESSAGE
+
+        if not _dj_field.is_relation:
+            if (not _repeated and _f.message_type.full_name == fields._TIMESTAMP_FULL_NAME and
+                    _cls._protobuf_to_value is ProtoBufMixin._protobuf_to_value and
+                    self._get_serializers(type(_dj_field), _f)[1] is fields._datetimefield_from_pb):
+                return _WIRE_MERGED
+            return _VIA_MESSAGE
+        return self._relation_wire_kind(_f, _dj_field)
+
+    def _relation_wire_kind(self, _f, _dj_field):
+        """Getting the kind of _wire_kind() of a message field converted to a
+        relation, related instances are converted with from_pb_bytes() and
+        fields of the hooks doing nothing by default are skipped
+        """
+        _cls = type(self)
+        if (isinstance(_dj_field, fields.ProtoBufFieldMixin) or
+                _cls._protobuf_to_relation is not ProtoBufMixin._protobuf_to_relation or
+                self._get_serializers(type(_dj_field), _f) != self.default_serializers):
+            return _VIA_MESSAGE
+        if _dj_field.many_to_many:
+            return _WIRE_IGNORED if _cls._protobuf_to_m2m is ProtoBufMixin._protobuf_to_m2m else _VIA_MESSAGE
+        if isinstance(_dj_field, ForeignObjectRel):
+            if _cls._protobuf_to_reverse_relation is ProtoBufMixin._protobuf_to_reverse_relation:
+                return _WIRE_IGNORED
+            return _VIA_MESSAGE
+
+        _related_model = _dj_field.related_model
+        if (_f.label == FieldDescriptor.LABEL_REPEATED or _f.name in self.pb_2_dj_reference_fields or
+                _cls._related_from_pb is not ProtoBufMixin._related_from_pb or
+                not issubclass(_related_model, ProtoBufMixin) or _related_model.pb_model is None or
+                _related_model.pb_model.DESCRIPTOR is not _f.message_type or
+                _related_model.from_pb is not ProtoBufMixin.from_pb):
+            return _VIA_MESSAGE
+        return _WIRE_RELATION
+
     def _from_pb_recursively(self, _dj_field_map, _pb_obj, _pb_dj_field_map):
         # ListFields only returns fields with values
         for _f, _v in _pb_obj.ListFields():
@@ -433,11 +1533,18 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
                 self._from_pb_recursively(_dj_field_map, _v, _dj_field_name)
             else:
                 _dj_f_name = _dj_field_name if _dj_field_name is not None else _f.name
-                self._from_pb(_dj_field_map, _f, _v, _dj_f_name)
+                if instrumentation.tracers:
+                    with instrumentation.trace(self, _f.name, instrumentation.FROM_PB, _v):
+                        self._from_pb(_dj_field_map, _f, _v, _dj_f_name)
+                else:
+                    self._from_pb(_dj_field_map, _f, _v, _dj_f_name)
 
     def _from_pb(self, _dj_field_map, _f, _v, _dj_f_name):
         _dj_f_type = _dj_field_map[_dj_f_name]
 
+        if self.pb_strict_enums and _f.enum_type is not None:
+            self._check_enum_values(_f, _v)
+
         field_serializers = self._get_serializers(type(_dj_f_type), _f)
         if field_serializers and field_serializers != self.default_serializers:
             self._protobuf_to_value(_dj_f_name, type(_dj_f_type), _f, _v)
@@ -449,6 +1556,19 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
                 return
         self._protobuf_to_value(_dj_f_name, type(_dj_f_type), _f, _v)
 
+    def _check_enum_values(self, pb_field, pb_value):
+        """Checking values of an enum field are defined by the enum
+
+        :param pb_field: Currently processing protobuf enum field
+        :param pb_value: Currently processing protobuf value, or list of values of repeated field
+        :returns: None
+        """
+        _names = fields.enum_tables(pb_field.enum_type).names_by_number
+        for _value in (pb_value if pb_field.label == pb_field.LABEL_REPEATED else (pb_value,)):
+            if _value not in _names:
+                raise DjangoPBModelError("Unknown value {} of enum {} in field: {}".format(
+                    _value, pb_field.enum_type.full_name, pb_field.name))
+
     def _protobuf_to_relation(self, dj_field_name, dj_field, pb_field,
                               pb_value):
         """Handling protobuf nested message to relation key
@@ -464,11 +1584,103 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
             self._protobuf_to_m2m(dj_field_name, dj_field, pb_value)
             return
 
+        if isinstance(dj_field, ForeignObjectRel):
+            self._protobuf_to_reverse_relation(dj_field_name, dj_field, pb_value)
+            return
+
+        if pb_field.name in self.pb_2_dj_reference_fields:
+            self._protobuf_to_reference(dj_field, pb_value)
+            return
+
         if hasattr(dj_field, 'related_model'):
             # django > 1.8 compatible
-            setattr(self, dj_field_name, dj_field.related_model().from_pb(pb_value))
+            setattr(self, dj_field_name, self._related_from_pb(dj_field.related_model, pb_value))
         else:
-            setattr(self, dj_field_name, dj_field.related.model().from_pb(pb_value))
+            setattr(self, dj_field_name, self._related_from_pb(dj_field.related.model, pb_value))
+
+    def _protobuf_to_reference(self, dj_field, pb_value):
+        """Handling nested message of a reference-only relation, the key of
+        related row is taken from the message without building related instance
+
+        :param dj_field: Currently target django foreign key field
+        :param pb_value: Currently processing protobuf message value
+        :returns: None
+        """
+        related_model = dj_field.related_model
+        target_field_name = dj_field.target_field.name
+        pb_field_name = related_model._pb_field_name(target_field_name)
+        if pb_field_name is None:
+            raise DjangoPBModelError(
+                "Can't reference {} by field: {}".format(related_model, target_field_name))
+
+        key = related_model._pb_key(pb_value, pb_field_name)
+        setattr(self, dj_field.attname, key)
+        if key is not None and self._pb_ingestion_context is not None:
+            self._pb_ingestion_context.reference(related_model, target_field_name, key)
+
+    def _related_from_pb(self, related_model, pb_value):
+        """Converting nested message to related model instance, through the
+        ingestion context of current from_pb() call if any
+
+        :param related_model: Django model class of the relation
+        :param pb_value: nested protobuf message
+        :returns: Django model instance
+        """
+        if self._pb_ingestion_context is not None:
+            return self._pb_ingestion_context.resolve(related_model, pb_value)
+        return related_model().from_pb(pb_value)
+
+    @classmethod
+    def _pb_key_fields(cls):
+        """Getting the field pair identifying a message of this model, which is
+        ``pb_natural_key`` if defined or the primary key otherwise
+
+        :returns: Tuple of (pb field name, django field name), pb field name is
+            None when the message has no such field
+        """
+        _cache = cls.__dict__.get('_pb_key_fields_cache')
+        if _cache is None or _cache[0] != cls.pb_natural_key:
+            if cls.pb_natural_key is not None:
+                _key_fields = cls.pb_natural_key, cls.pb_2_dj_field_map.get(cls.pb_natural_key, cls.pb_natural_key)
+            else:
+                _key_fields = cls._pb_field_name(cls._meta.pk.name), cls._meta.pk.name
+            _cache = cls._pb_key_fields_cache = (cls.pb_natural_key, _key_fields)
+        return _cache[1]
+
+    @classmethod
+    def _pb_field_name(cls, dj_field_name):
+        """Getting the top level pb field name mapped to given django field
+
+        :param dj_field_name: django field name
+        :returns: pb field name, None if pb_model has no such field
+        """
+        _names = cls.__dict__.get('_pb_field_names_cache')
+        if _names is None:
+            _names = {}
+            for _pb_name, _dj_name in cls.pb_2_dj_field_map.items():
+                if not isinstance(_dj_name, dict):
+                    _names.setdefault(_dj_name, _pb_name)
+            cls._pb_field_names_cache = _names
+        pb_field_name = _names.get(dj_field_name, dj_field_name)
+        if pb_field_name not in cls.pb_model.DESCRIPTOR.fields_by_name:
+            return None
+        return pb_field_name
+
+    @classmethod
+    def _pb_key(cls, pb_message, pb_field_name=None):
+        """Getting the key of given message, None if unset
+
+        :param pb_message: protobuf message of this model
+        :param pb_field_name: pb field holding the key, defaults to the one of
+            _pb_key_fields()
+        :returns: key value or None
+        """
+        if pb_field_name is None:
+            pb_field_name, _ = cls._pb_key_fields()
+            if pb_field_name is None:
+                return None
+        # proto3 default value means the key is not set
+        return getattr(pb_message, pb_field_name) or None
 
     def _protobuf_to_m2m(self, dj_field_name, dj_field, pb_repeated_set):
         """
@@ -502,6 +1714,21 @@ class ProtoBufMixin(six.with_metaclass(Meta, models.Model)):
         """
         return
 
+    def _protobuf_to_reverse_relation(self, dj_field_name, dj_field, pb_value):
+        """
+        This is hook function to handle nested messages of a reverse relation,
+        such as a reverse foreign key, while converting from protobuf to django.
+        By default, no operation is performed, as related rows can't be
+        assigned before this instance is saved. Override it like
+        `_protobuf_to_m2m()` to create or update related rows.
+
+        :param dj_field_name: Currently target django field's name
+        :param dj_field: Django reverse relation
+        :param pb_value: repeated or singular nested message
+        :returns: None
+        """
+        return
+
     def _protobuf_to_value(self, dj_field_name, dj_field_type, pb_field,
                            pb_value):
         """Handling protobuf singular value
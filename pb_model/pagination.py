@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Keyset (cursor) pagination of ProtoBufMixin querysets.
+
+Pages are selected by the ordering key of the last row of the previous page
+instead of an offset, so any page costs the same index lookup::
+
+    page = paginate_pb(Main.objects.all(), page_size=500)
+    while page.next_cursor:
+        page = paginate_pb(Main.objects.all(), cursor=page.next_cursor, page_size=500)
+
+The ordering column should be indexed and not nullable. Unless it is unique,
+the primary key is added to the ordering to break ties. Cursors are opaque
+url-safe tokens holding the key values of the last row.
+"""
+
+import base64
+import datetime
+import decimal
+import json
+import uuid
+
+from django.db.models import Q, prefetch_related_objects
+
+from .models import DjangoPBModelError, repeated_field_of
+
+
+class Page(object):
+    """Result of :func:`paginate_pb`
+
+    :ivar messages: list of protobuf messages of the page, or the repeated
+        field of ``container`` holding them
+    :ivar next_cursor: cursor of the next page, None on the last page
+    :ivar container: message the page is converted into, if any
+    """
+
+    def __init__(self, messages, next_cursor, container=None):
+        self.messages = messages
+        self.next_cursor = next_cursor
+        self.container = container
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def paginate_pb(queryset, cursor=None, page_size=100, order_by='pk', depth=None, container=None, field=None):
+    """Convert a page of rows of queryset to protobuf messages
+
+    Relations mapped to message fields are prefetched once for the page.
+
+    :param queryset: queryset of a ProtoBufMixin model, its ordering is replaced
+    :param cursor: ``next_cursor`` of the previous page, None for the first page
+    :param page_size: maximum number of rows of the page
+    :param order_by: field name to order by, prefixed by ``-`` for descending order
+    :param depth: depth of relation been recursively converted, same as to_pb()
+    :param container: container message class or instance to convert rows
+        directly into, see ``ProtoBufQuerySet.to_pb_container()``
+    :param field: name of the repeated field of container, defaults to the
+        only repeated field of messages of the model
+    :returns: :class:`Page`
+    :raises DjangoPBModelError: if cursor or page_size is invalid
+    """
+    if isinstance(page_size, bool) or not isinstance(page_size, int) or page_size <= 0:
+        raise DjangoPBModelError("Invalid page_size {!r}: expected a positive integer".format(page_size))
+    descending = order_by.startswith('-')
+    key_fields = _key_fields(queryset.model, order_by.lstrip('-'))
+
+    queryset = queryset.order_by(*[('-' if descending else '') + f.attname for f in key_fields])
+    if cursor is not None:
+        queryset = queryset.filter(_after(key_fields, decode_cursor(cursor, key_fields), descending))
+
+    # one extra row tells whether there is a next page
+    _objs = list(queryset[:page_size + 1])
+    _has_next = len(_objs) > page_size
+    _objs = _objs[:page_size]
+
+    prefetch_related_objects(_objs, *queryset.model._pb_prefetch_lookups(depth))
+    next_cursor = encode_cursor([getattr(_objs[-1], f.attname) for f in key_fields]) if _has_next else None
+    if container is None:
+        return Page([_obj.to_pb(depth=depth) for _obj in _objs], next_cursor)
+
+    if isinstance(container, type):
+        container = container()
+    if field is None:
+        field = repeated_field_of(container.DESCRIPTOR, queryset.model)
+    messages = getattr(container, field)
+    for _obj in _objs:
+        _obj._to_pb_into(messages.add(), depth=depth)
+    return Page(messages, next_cursor, container)
+
+
+def encode_cursor(values):
+    """Encode key values of a row as an opaque url-safe token
+
+    :param values: list of field values
+    :returns: str
+    """
+    data = json.dumps(values, default=_json_default, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, key_fields):
+    """Decode a token of encode_cursor() to key values
+
+    :param cursor: token
+    :param key_fields: list of Django fields the values belong to
+    :returns: list of field values
+    :raises DjangoPBModelError: if cursor is invalid
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(data.decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(key_fields):
+            raise ValueError("expected {} values".format(len(key_fields)))
+        return [f.to_python(value) for f, value in zip(key_fields, values)]
+    except Exception as e:
+        raise DjangoPBModelError("Invalid cursor {!r}: {}".format(cursor, e))
+
+
+def _key_fields(model, name):
+    pk = model._meta.pk
+    dj_field = pk if name == 'pk' else model._meta.get_field(name)
+    if dj_field.primary_key or dj_field.unique:
+        return [dj_field]
+    return [dj_field, pk]
+
+
+def _after(key_fields, values, descending):
+    """Getting the condition of rows after given key values, which is
+    ``(a, b) > (va, vb)`` expanded to ``a > va OR (a = va AND b > vb)``
+    """
+    lookup = 'lt' if descending else 'gt'
+    condition = Q(**{'{}__{}'.format(key_fields[-1].attname, lookup): values[-1]})
+    for dj_field, value in reversed(list(zip(key_fields[:-1], values[:-1]))):
+        condition = (Q(**{'{}__{}'.format(dj_field.attname, lookup): value}) |
+                     Q(**{dj_field.attname: value}) & condition)
+    return condition
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError("{!r} can't be used in a cursor".format(value))
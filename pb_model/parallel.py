@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Conversion of large querysets in worker processes.
+
+Workers are forked from current process, so models and settings are shared
+without re-initializing Django. Database connections of current process are
+closed before forking and workers open their own on first query.
+"""
+
+import collections
+import contextlib
+import logging
+import multiprocessing
+import os
+
+from django.apps import apps
+from django.db import connections, router, transaction
+
+from .delimited import iter_delimited
+from .ingestion import IngestionContext, bulk_save
+from .models import DjangoPBModelError, ProtoBufQuerySet
+
+LOGGER = logging.getLogger(__name__)
+
+
+def export_parallel(queryset, workers=None, chunk_size=1000, ordered=True,
+                    depth=None, delimited=False):
+    """Serialize rows of queryset to protobuf bytes in worker processes
+
+    The queryset is split into primary key ranges of ``chunk_size`` rows, each
+    range is converted with to_pb() and serialized by a worker.
+
+    :param queryset: ProtoBufQuerySet to export
+    :param workers: number of worker processes, defaults to number of CPUs
+    :param chunk_size: number of rows per range handed to a worker
+    :param ordered: yield frames in primary key order, otherwise as soon as
+        a range is done
+    :param depth: depth of relation been recursively converted, same as to_pb()
+    :param delimited: prefix each frame with its size, see :mod:`pb_model.delimited`
+    :returns: generator of serialized messages
+    """
+    if not queryset.query.can_filter():
+        raise DjangoPBModelError("Can't export a sliced queryset in parallel")
+
+    tasks = [(queryset.model._meta.label, queryset.db, queryset.query, first, last, chunk_size, depth, delimited)
+             for first, last in pk_ranges(queryset, chunk_size)]
+    if not tasks:
+        return
+
+    with _worker_pool(workers) as pool:
+        results = pool.imap(_export_range, tasks) if ordered else pool.imap_unordered(_export_range, tasks)
+        for frames in results:
+            for frame in frames:
+                yield frame
+
+
+ShardReport = collections.namedtuple('ShardReport', ['shard', 'pid', 'received', 'written', 'errors'])
+ShardReport.__doc__ = """Result of ingesting a shard of frames by a worker.
+
+``errors`` is a list of (frame index, error message) pairs, frame index is
+None when writing the whole shard failed and its transaction was rolled back.
+"""
+
+
+def ingest_parallel(model, stream, workers=None, shard_size=1000, batch_size=None,
+                    resolve_existing=False, using=None):
+    """Decode length-delimited messages of model and write them in worker processes
+
+    The stream is read incrementally and split into shards of ``shard_size``
+    frames. Each worker decodes a shard with from_pb() through an
+    :class:`~pb_model.ingestion.IngestionContext` and writes it with
+    :func:`~pb_model.ingestion.bulk_save` in its own transaction.
+
+    Workers write through their own connections, so the database must be
+    shared between processes. An in-memory SQLite database is inherited by
+    every worker as a copy, and rows written there never reach the calling
+    process.
+
+    :param model: ProtoBufMixin model class
+    :param stream: bytes or file-like object of length-delimited messages
+    :param workers: number of worker processes, defaults to number of CPUs
+    :param shard_size: number of frames per shard handed to a worker
+    :param batch_size: number of rows per INSERT query
+    :param resolve_existing: use existing rows for nested messages, see IngestionContext
+    :param using: database alias, defaults to the write database of model
+    :returns: list of :class:`ShardReport`, in shard order
+    """
+    using = using or router.db_for_write(model)
+    tasks = ((model._meta.label, using, index, index * shard_size, frames, batch_size, resolve_existing)
+             for index, frames in enumerate(_shards(iter_delimited(stream), shard_size)))
+
+    reports = []
+    with _worker_pool(workers) as pool:
+        # bound the number of shards read ahead of workers
+        max_pending = 2 * (workers or os.cpu_count() or 1)
+        pending = collections.deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_ingest_shard, (task,)))
+            if len(pending) >= max_pending:
+                reports.append(pending.popleft().get())
+        while pending:
+            reports.append(pending.popleft().get())
+    return reports
+
+
+def _shards(frames, shard_size):
+    shard = []
+    for frame in frames:
+        shard.append(frame)
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def pk_ranges(queryset, chunk_size):
+    """Split queryset into ranges of primary keys
+
+    :param queryset: QuerySet to split
+    :param chunk_size: number of rows per range
+    :returns: generator of (first pk, last pk) pairs, both inclusive
+    """
+    first = last = None
+    count = 0
+    for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size):
+        if first is None:
+            first = pk
+        last = pk
+        count += 1
+        if count == chunk_size:
+            yield first, last
+            first, count = None, 0
+    if first is not None:
+        yield first, last
+
+
+@contextlib.contextmanager
+def _worker_pool(workers):
+    _close_connections()
+    pool = multiprocessing.get_context('fork').Pool(workers, initializer=_init_worker)
+    try:
+        yield pool
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _close_connections():
+    """Close connections before forking, so that workers never share a socket
+    with current process
+    """
+    for conn in connections.all():
+        if conn.in_atomic_block and not _is_in_memory_db(conn):
+            raise DjangoPBModelError(
+                "Can't use worker processes within a transaction on database '{}', "
+                "workers won't see its changes".format(conn.alias))
+        # no-op for in-memory sqlite, which workers inherit as a copy
+        conn.close()
+
+
+def _is_in_memory_db(conn):
+    return conn.vendor == 'sqlite' and conn.is_in_memory_db()
+
+
+def _init_worker():
+    for conn in connections.all():
+        if conn.connection is not None and not _is_in_memory_db(conn):
+            # inherited from parent process, drop it without closing the socket
+            conn.connection = None
+
+
+def _range_queryset(model_label, db, query, first, last):
+    queryset = ProtoBufQuerySet(model=apps.get_model(model_label), query=query, using=db)
+    return queryset.filter(pk__gte=first, pk__lte=last).order_by('pk')
+
+
+def _export_range(task):
+    model_label, db, query, first, last, chunk_size, depth, delimited = task
+    LOGGER.debug("Exporting {} rows with pk from {} to {}".format(model_label, first, last))
+    return list(_range_queryset(model_label, db, query, first, last).iter_pb_bytes(
+        depth=depth, chunk_size=chunk_size, delimited=delimited))
+
+
+def _ingest_shard(task):
+    model_label, using, shard, first_index, frames, batch_size, resolve_existing = task
+    model = apps.get_model(model_label)
+    context = IngestionContext(resolve_existing=resolve_existing)
+
+    pb_objs, errors = [], []
+    for index, frame in enumerate(frames, first_index):
+        try:
+            pb_objs.append((index, model.pb_model.FromString(frame)))
+        except Exception as e:
+            errors.append((index, "Can't decode message: {}".format(e)))
+
+    written = 0
+    try:
+        if resolve_existing:
+            context.preload(model, [pb_obj for _, pb_obj in pb_objs])
+        instances = []
+        for index, pb_obj in pb_objs:
+            try:
+                instances.append(context.from_pb(model, pb_obj))
+            except Exception as e:
+                errors.append((index, "Can't convert message: {}".format(e)))
+
+        with transaction.atomic(using=using):
+            context.validate_references()
+            written = len(bulk_save(model, instances, using=using, batch_size=batch_size))
+    except Exception as e:
+        LOGGER.error("Fail to ingest shard {} of {}. Error: {}".format(shard, model_label, e))
+        errors.append((None, str(e)))
+    return ShardReport(shard, os.getpid(), len(frames), written, errors)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Memory profiling of bulk conversions with :mod:`tracemalloc`.
+
+:func:`profile_memory` converts a queryset while tracing allocations and
+reports peak memory, memory allocated per model/field and what is still
+retained after conversion, grouped by kind of object::
+
+    report = profile_memory(Main.objects.all())
+    report.dump()
+
+Tracing slows conversion down several times, only use it to investigate.
+"""
+
+import collections
+import json
+import os
+import sys
+import threading
+import tracemalloc
+
+from . import fields, instrumentation
+
+# kind of retained memory, by the innermost frame of the allocation
+MESSAGES = 'messages'
+INSTANCES = 'instances'
+JSON = 'json'
+DESCRIPTOR_CACHES = 'descriptor caches'
+OTHER = 'other'
+
+_CATEGORY_PATHS = (
+    (JSON, os.path.dirname(json.__file__)),
+    (MESSAGES, os.path.join('google', 'protobuf')),
+    (DESCRIPTOR_CACHES, os.path.abspath(fields.__file__)),
+    (INSTANCES, os.path.join('django', 'db')),
+)
+
+
+class FieldMemory(instrumentation.Tracer):
+    """Aggregate per model/field/operation call counts and memory allocated
+    and not freed while converting the field, nested fields included
+    """
+
+    FIELDS = ('model', 'field', 'operation', 'calls', 'size')
+
+    def __init__(self):
+        self._stats = {}
+        self._local = threading.local()
+
+    def enter(self, frame, pb_obj):
+        self._local.__dict__.setdefault('stack', []).append(tracemalloc.get_traced_memory()[0])
+
+    def exit(self, frame, pb_obj, elapsed):
+        start = self._local.stack.pop()
+        entry = self._stats.setdefault(frame, [0, 0])
+        entry[0] += 1
+        entry[1] += tracemalloc.get_traced_memory()[0] - start
+
+    def get_stats(self, sort='size'):
+        """Getting aggregated stats
+
+        :param sort: key to sort by in descending order
+        :returns: list of dicts with keys of ``FIELDS``
+        """
+        rows = [dict(zip(self.FIELDS, tuple(frame) + tuple(values))) for frame, values in self._stats.items()]
+        return sorted(rows, key=lambda row: row[sort], reverse=True)
+
+
+class MemoryReport(object):
+    """Result of :func:`profile_memory`
+
+    :ivar peak: peak traced memory during conversion, in bytes
+    :ivar retained: memory still allocated after conversion, in bytes
+    :ivar categories: {kind of object: retained bytes}
+    :ivar fields: list of per field dicts, see :class:`FieldMemory`
+    :ivar objects: {name: count} of retained model instances, messages and descriptor caches
+    """
+
+    def __init__(self, peak, retained, categories, fields, objects):
+        self.peak = peak
+        self.retained = retained
+        self.categories = categories
+        self.fields = fields
+        self.objects = objects
+
+    def as_dict(self):
+        return {
+            'peak': self.peak,
+            'retained': self.retained,
+            'categories': self.categories,
+            'fields': self.fields,
+            'objects': self.objects,
+        }
+
+    def dump(self, stream=None, format='text'):
+        """Write the report as text or JSON
+
+        :param stream: file to write to, defaults to stdout
+        :param format: ``text`` or ``json``
+        """
+        stream = stream or sys.stdout
+        if format == 'json':
+            json.dump(self.as_dict(), stream, indent=2)
+            stream.write('\n')
+            return
+
+        stream.write('peak: {} KiB, retained: {} KiB\n'.format(self.peak // 1024, self.retained // 1024))
+        stream.write('\n{:<40} {:>12}\n'.format('retained by', 'size (KiB)'))
+        for category, size in sorted(self.categories.items(), key=lambda item: item[1], reverse=True):
+            stream.write('{:<40} {:>12.1f}\n'.format(category, size / 1024.0))
+        stream.write('\n{:<40} {:>12}\n'.format('objects', 'count'))
+        for name, count in sorted(self.objects.items()):
+            stream.write('{:<40} {:>12}\n'.format(name, count))
+        stream.write('\n{:<40} {:<8} {:>8} {:>12}\n'.format('field', 'op', 'calls', 'size (KiB)'))
+        for row in self.fields:
+            stream.write('{:<40} {:<8} {:>8} {:>12.1f}\n'.format(
+                '{}.{}'.format(row['model'], row['field']), row['operation'], row['calls'], row['size'] / 1024.0))
+
+
+def profile_memory(queryset, depth=None, nframes=25):
+    """Convert rows of queryset to protobuf messages while tracing allocations
+
+    Rows are fetched and prefetched as ``to_pb_list()`` does, rows and
+    messages are kept alive until the retained memory is measured.
+
+    :param queryset: ProtoBufQuerySet to convert
+    :param depth: depth of relation been recursively converted, same as to_pb()
+    :param nframes: number of frames stored per allocation, more frames
+        classify allocations better but cost more memory
+    :returns: :class:`MemoryReport`
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start(nframes)
+    try:
+        before = tracemalloc.take_snapshot()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+        with FieldMemory() as field_memory:
+            _objs = list(queryset.prefetch_related(*queryset.model._pb_prefetch_lookups(depth)))
+            _messages = [_obj.to_pb(depth=depth) for _obj in _objs]
+
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    _filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    categories = collections.Counter()
+    for stat in after.filter_traces(_filters).compare_to(before.filter_traces(_filters), 'traceback'):
+        if stat.size_diff > 0:
+            categories[_categorize(stat.traceback)] += stat.size_diff
+
+    return MemoryReport(
+        peak=peak - baseline,
+        retained=current - baseline,
+        categories=dict(categories),
+        fields=field_memory.get_stats(),
+        objects=dict(_count_objects(_objs), messages=len(_messages)),
+    )
+
+
+def _categorize(traceback):
+    # Traceback is ordered from the oldest frame
+    for frame in reversed(traceback):
+        for category, path in _CATEGORY_PATHS:
+            if path in frame.filename:
+                return category
+    return OTHER
+
+
+def _count_objects(objs):
+    """Count retained model instances and lists/dicts cached in their
+    ``__dict__`` by descriptors of repeated and map message fields
+    """
+    counts = collections.Counter()
+    seen = set()
+    pending = list(objs)
+    while pending:
+        _obj = pending.pop()
+        if id(_obj) in seen:
+            continue
+        seen.add(id(_obj))
+        counts['instances'] += 1
+        for _field in _obj._meta.many_to_many:
+            if not isinstance(_field, (fields.RepeatedMessageField, fields.MessageMapField)):
+                continue
+            cached = _obj.__dict__.get(_field.attname)
+            if cached is None:
+                continue
+            items = list(cached.values()) if isinstance(cached, dict) else list(cached)
+            counts['descriptor caches'] += 1
+            counts['descriptor cache items'] += len(items)
+            pending.extend(items)
+        for _field in _obj._meta.concrete_fields:
+            if _field.is_relation and _field.is_cached(_obj):
+                _related = _field.get_cached_value(_obj)
+                if _related is not None:
+                    pending.append(_related)
+    return counts
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Test data shared by the tests and the benchmarks"""
+
+import datetime
+import uuid
+
+from django.utils import timezone
+
+from google.protobuf.any_pb2 import Any
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from . import models, models_pb2
+
+
+def root_pb(i=1):
+    """A Root message with every field set
+    """
+    timestamp = Timestamp()
+    timestamp.FromDatetime(datetime.datetime(2020, 1, 1, 12, 30, 15, 123456))
+    _any = Any()
+    _any.Pack(timestamp)
+    return models_pb2.Root(
+        uint32_field=i, int32_field=-i, uint64_field=2 ** 40 + i, int64_field=-2 ** 40 - i,
+        float_field=1.5, double_field=2.25, string_field='string %d' % i, bytes_field=b'bytes',
+        bool_field=True, enum_field=models_pb2.Enum_ONE, timestamp_field=timestamp,
+        uuid_field=str(uuid.UUID(int=i)), any_field=_any,
+        repeated_uint32_field=list(range(10)), repeated_string_field=['a', 'b', 'c'],
+        repeated_double_field=[0.5, 1.5], map_string_to_string_field={'key': 'value'},
+        message_field=models_pb2.Root.Embedded(data=i),
+        repeated_message_field=[models_pb2.Root.Embedded(data=n) for n in range(3)],
+        map_string_to_message_field={'a': models_pb2.Root.Embedded(data=1)},
+        list_field_option=models_pb2.Root.ListWrapper(data=['x', 'y']),
+        inlineField=models_pb2.Root.InlineEmbedding(
+            data='inline', doublyNestedField=models_pb2.Root.InlineEmbedding.NestedEmbedding(data='nested')),
+    )
+
+
+def create_root(pb_obj):
+    """Save a Root and its nested rows from a message
+    """
+    root = models.Root().from_pb(pb_obj)
+    root.message_field.save()
+    root.message_field = root.message_field
+    for m in root.repeated_message_field:
+        m.save()
+    for m in root.map_string_to_message_field.values():
+        m.save()
+    root.list_field_option.save()
+    root.list_field_option = root.list_field_option
+    root.save()
+    return root
+
+
+def create_dataset(rows):
+    """Populate database with ``rows`` Main (with FK, deeper FK and 3 m2m rows)
+    and ``rows`` Root rows
+
+    :returns: dict of sample instances
+    """
+    m2m_items = [models.M2MRelation.objects.create(num=i) for i in range(3)]
+    for i in range(rows):
+        main = models.Main.objects.create(
+            string_field='main %d' % i, integer_field=i, float_field=i / 2.0, bool_field=bool(i % 2),
+            choices_field=models.Main.OPT1, datetime_field=timezone.now(),
+            fk_field=models.Relation.objects.create(
+                num=i, deeper_relation=models.DeeperRelation.objects.create(num=i)),
+        )
+        main.m2m_field.add(*m2m_items)
+        create_root(root_pb(i + 1))
+
+    return {
+        'relation': models.Relation.objects.order_by('pk').first(),
+        'main': models.Main.objects.order_by('pk').first(),
+        'root': models.Root.objects.order_by('pk').first(),
+    }
+
+
+def create_mains(count):
+    """Populate database with ``count`` Main rows, each with its own FK and m2m row
+    """
+    for i in range(count):
+        main_item = models.Main.objects.create(
+            string_field='Hello world', integer_field=i, float_field=1.5,
+            fk_field=models.Relation.objects.create(num=i),
+        )
+        main_item.m2m_field.add(models.M2MRelation.objects.create(num=i))
@@ -89,3 +89,10 @@ class Root(ProtoBufMixin, models.Model):
 class Proxy(Root):
     class Meta:
         proxy = True
+
+
+class Node(ProtoBufMixin, models.Model):
+    pb_model = models_pb2.Node
+
+    num = models.IntegerField(default=0)
+    children = models.ManyToManyField('self', symmetrical=False, related_name='parents')
@@ -1,17 +1,31 @@
 import datetime
+import io
+import json
 import uuid
+from unittest import mock
 
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.http import Http404
+from django.db import connection, connections as db_connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.db import models as dj_models
+from django.utils import timezone
 
+from google.protobuf import descriptor_pb2, json_format
 from google.protobuf.any_pb2 import Any
 from google.protobuf.timestamp_pb2 import Timestamp
 from google.protobuf.descriptor import FieldDescriptor
 
 # Create your tests here.
 
-from pb_model.models import ProtoBufMixin
+from pb_model import delimited, fields, ingestion, instrumentation, pagination, parallel, profiling, views
+from pb_model.benchmarks import harness, imports, suites
+from pb_model.models import DjangoPBModelError, Meta, ProtoBufMixin, _ScratchMessage, _field_kinds, warm_up
+from pb_model.ingestion import IngestionContext
 from . import models, models_pb2
+from .fixtures import create_dataset, create_mains, create_root, root_pb
 
 
 class ProtoBufConvertingTest(TestCase):
@@ -184,6 +198,60 @@ class ProtoBufConvertingTest(TestCase):
         assert _in.uuid_field != test_uuid
         assert out.uuid_field == test_uuid
 
+    def test_enum_choices(self):
+        enum_field = models.Root._meta.get_field('enum_field')
+        self.assertIs(type(enum_field), dj_models.IntegerField)
+        self.assertEqual(enum_field.choices, [(0, 'Enum_NOTSET'), (1, 'Enum_ONE'), (2, 'Enum_TWO')])
+
+    def test_enum_name_field(self):
+        class EnumNameModel(ProtoBufMixin, dj_models.Model):
+            pb_model = models_pb2.Root
+            pb_2_dj_fields = ['enum_field']
+            pb_2_dj_enum_name_fields = ['enum_field']
+
+        enum_field = EnumNameModel._meta.get_field('enum_field')
+        self.assertIs(type(enum_field), fields.EnumNameField)
+        self.assertEqual(enum_field.max_length, len('Enum_NOTSET'))
+        self.assertEqual(enum_field.choices[1], ('Enum_ONE', 'Enum_ONE'))
+
+        dj_obj = EnumNameModel().from_pb(models_pb2.Root(enum_field=models_pb2.Enum_TWO))
+        self.assertEqual(dj_obj.enum_field, 'Enum_TWO')
+        self.assertEqual(dj_obj.to_pb().enum_field, models_pb2.Enum_TWO)
+
+        with self.assertRaises(DjangoPBModelError):
+            EnumNameModel().from_pb(models_pb2.Root(enum_field=7))
+        with self.assertRaises(ValueError):
+            EnumNameModel(enum_field='Enum_THREE').to_pb()
+
+    def test_strict_enums(self):
+        class StrictEnumModel(ProtoBufMixin, dj_models.Model):
+            pb_model = models_pb2.Root
+            pb_2_dj_fields = ['enum_field']
+            pb_strict_enums = True
+
+        self.assertEqual(StrictEnumModel().from_pb(models_pb2.Root(enum_field=2)).enum_field, 2)
+        with self.assertRaises(DjangoPBModelError):
+            StrictEnumModel().from_pb(models_pb2.Root(enum_field=7))
+        # unknown values are kept by default
+        self.assertEqual(models.Root().from_pb(models_pb2.Root(enum_field=7)).enum_field, 7)
+
+    def test_uuid_bytes_field(self):
+        class UUIDBytesModel(ProtoBufMixin, dj_models.Model):
+            pb_model = models_pb2.Root
+            pb_2_dj_fields = ['uuid_field', 'bytes_field']
+            pb_2_dj_field_map = {'bytes_field': 'uuid_bytes_field'}
+            uuid_field = dj_models.UUIDField()
+            uuid_bytes_field = dj_models.UUIDField()
+
+        _in = UUIDBytesModel(uuid_field=uuid.uuid4(), uuid_bytes_field=uuid.uuid4())
+        pb_obj = _in.to_pb()
+
+        self.assertEqual(pb_obj.uuid_field, str(_in.uuid_field))
+        self.assertEqual(pb_obj.bytes_field, _in.uuid_bytes_field.bytes)
+        out = UUIDBytesModel().from_pb(models_pb2.Root.FromString(pb_obj.SerializeToString()))
+        self.assertEqual(out.uuid_field, _in.uuid_field)
+        self.assertEqual(out.uuid_bytes_field, _in.uuid_bytes_field)
+
 
     def test_auto_fields(self):
         timestamp = Timestamp()
@@ -242,6 +310,11 @@ class ProtoBufConvertingTest(TestCase):
         result = dj_object_from_db.to_pb()
         assert pb_object == result
 
+        # messages of repeated and map fields are filled in place of the parent message
+        with mock.patch.object(ProtoBufMixin, 'to_pb', autospec=True, side_effect=ProtoBufMixin.to_pb) as to_pb:
+            assert pb_object == dj_object_from_db.to_pb()
+        assert to_pb.call_count == 1
+
         # test proxy model with auto field
         proxy_object_from_db = models.Proxy.objects.get()
         assert [o.data for o in proxy_object_from_db.repeated_message_field] == [123, 456, 789]
@@ -343,3 +416,1086 @@ class ProtoBufConvertingTest(TestCase):
             num=2, deeper_relation=deeper_relation_item)
 
         test_proto = deeper_relation_item.to_pb()
+
+        self.assertEqual([r.id for r in test_proto.relations], [relation_item1.id, relation_item2.id])
+        self.assertEqual([r.num for r in test_proto.relations], [1, 2])
+        # foreign key back to the converted instance is not converted again
+        self.assertFalse(test_proto.relations[0].HasField('deeper_relation'))
+
+        self.assertEqual(len(deeper_relation_item.to_pb(depth=0).relations), 0)
+        # reverse relation item back to the converted instance is skipped as well
+        self.assertEqual([r.id for r in relation_item1.to_pb().deeper_relation.relations], [relation_item2.id])
+
+        # nested messages of reverse relations are not converted back by default
+        deeper_relation_item2 = models.DeeperRelation().from_pb(test_proto)
+        self.assertEqual(deeper_relation_item2.num, 2)
+
+    def test_reverse_relation_prefetched(self):
+        for i in range(3):
+            deeper_relation_item = models.DeeperRelation.objects.create(num=i)
+            for j in range(2):
+                models.Relation.objects.create(num=j, deeper_relation=deeper_relation_item)
+
+        self.assertIn('relations', models.DeeperRelation._pb_prefetch_lookups())
+        with self.assertNumQueries(2):
+            messages = models.DeeperRelation.objects.all().to_pb_list()
+        self.assertEqual([len(m.relations) for m in messages], [2, 2, 2])
+
+    def test_m2m_relation_cycle(self):
+        node_a = models.Node.objects.create(num=1)
+        node_b = models.Node.objects.create(num=2)
+        node_a.children.add(node_b)
+        node_b.children.add(node_a)
+
+        test_proto = node_a.to_pb()
+
+        self.assertEqual([c.num for c in test_proto.children], [2])
+        # many to many item back to the converted instance is not converted again
+        self.assertEqual(len(test_proto.children[0].children), 0)
+        self.assertEqual(node_a.to_pb_bytes(), test_proto.SerializeToString())
+        self.assertEqual(node_a.to_pb_dict(), {'id': node_a.id, 'num': 1, 'children': [{'id': node_b.id, 'num': 2}]})
+        self.assertEqual(models.Node.objects.order_by('id').to_pb_list(),
+                         [test_proto, node_b.to_pb()])
+
+
+class IngestionContextTest(TestCase):
+
+    def _main_pb(self, relation_pb):
+        return models_pb2.Main(string_field='Hello world', integer_field=1,
+                               float_field=1.5, fk_field=relation_pb)
+
+    def test_nested_messages_deduplicated(self):
+        relation_pb = models_pb2.Relation(id=42, num=7)
+        pb_objs = [self._main_pb(relation_pb) for _ in range(5)]
+
+        instances = IngestionContext().from_pb_list(models.Main, pb_objs)
+
+        self.assertEqual(len(instances), 5)
+        self.assertEqual(len({id(i.fk_field) for i in instances}), 1)
+        self.assertEqual(instances[0].fk_field.num, 7)
+
+        # without context, each message becomes a separate instance
+        instances = [models.Main().from_pb(pb_obj) for pb_obj in pb_objs]
+        self.assertEqual(len({id(i.fk_field) for i in instances}), 5)
+
+    def test_messages_without_key_not_deduplicated(self):
+        pb_objs = [self._main_pb(models_pb2.Relation(num=7)) for _ in range(3)]
+        instances = IngestionContext().from_pb_list(models.Main, pb_objs)
+        self.assertEqual(len({id(i.fk_field) for i in instances}), 3)
+
+    def test_resolve_existing(self):
+        relation_item = models.Relation.objects.create(num=7)
+        other_item = models.Relation.objects.create(num=8)
+        pb_objs = [self._main_pb(models_pb2.Relation(id=relation_item.id, num=99)),
+                   self._main_pb(models_pb2.Relation(id=other_item.id)),
+                   self._main_pb(models_pb2.Relation(id=relation_item.id, num=99)),
+                   self._main_pb(models_pb2.Relation(id=1000, num=3))]
+
+        with self.assertNumQueries(1):
+            instances = IngestionContext(resolve_existing=True).from_pb_list(models.Main, pb_objs)
+
+        self.assertIs(instances[0].fk_field, instances[2].fk_field)
+        # existing rows are used as is
+        self.assertEqual(instances[0].fk_field.num, 7)
+        self.assertEqual(instances[1].fk_field.num, 8)
+        self.assertFalse(instances[0].fk_field._state.adding)
+        # unknown keys are built from messages
+        self.assertEqual(instances[3].fk_field.num, 3)
+        self.assertTrue(instances[3].fk_field._state.adding)
+
+    def test_natural_key(self):
+        class NaturalKeyRelation(models.Relation):
+            pb_natural_key = 'num'
+
+            class Meta:
+                proxy = True
+
+        pb_objs = [models_pb2.Relation(num=1), models_pb2.Relation(num=1), models_pb2.Relation(num=2)]
+        context = IngestionContext()
+        instances = [context.resolve(NaturalKeyRelation, pb_obj) for pb_obj in pb_objs]
+
+        self.assertIs(instances[0], instances[1])
+        self.assertIsNot(instances[0], instances[2])
+
+    def test_natural_key_not_unique(self):
+        pb_objs = [self._main_pb(models_pb2.Relation(num=7))]
+
+        with mock.patch.object(models.Relation, 'pb_natural_key', 'num'):
+            self.assertEqual(models.Relation._pb_key_fields(), ('num', 'num'))
+            with self.assertRaisesRegex(DjangoPBModelError, 'must be mapped to a unique django field: num'):
+                IngestionContext(resolve_existing=True).from_pb_list(models.Main, pb_objs)
+            with self.assertRaisesRegex(DjangoPBModelError, 'must be mapped to a unique django field: num'):
+                ingestion.bulk_upsert(models.Relation, [models.Relation(num=7)])
+        self.assertEqual(models.Relation._pb_key_fields(), ('id', 'id'))
+
+
+class ReferenceMain(models.Main):
+    pb_2_dj_reference_fields = ['fk_field']
+
+    class Meta:
+        proxy = True
+
+
+class ReferenceFieldTest(TestCase):
+
+    def _main_pb(self, relation_id):
+        return models_pb2.Main(string_field='Hello world', integer_field=1, float_field=1.5,
+                               fk_field=models_pb2.Relation(id=relation_id, num=99))
+
+    def test_reference_sets_key_only(self):
+        relation_item = models.Relation.objects.create(num=7)
+
+        with self.assertNumQueries(0):
+            main_item = ReferenceMain().from_pb(self._main_pb(relation_item.id))
+
+        self.assertEqual(main_item.fk_field_id, relation_item.id)
+        self.assertFalse(ReferenceMain.fk_field.is_cached(main_item))
+        self.assertEqual(main_item.fk_field.num, 7)
+
+    def test_batch_references_validated(self):
+        relation_items = [models.Relation.objects.create(num=i) for i in range(2)]
+        pb_objs = [self._main_pb(relation_items[i % 2].id) for i in range(6)]
+
+        context = IngestionContext()
+        with self.assertNumQueries(1):
+            instances = context.from_pb_list(ReferenceMain, pb_objs)
+        self.assertEqual([i.fk_field_id for i in instances], [r.id for r in relation_items] * 3)
+
+        # keys already validated are not queried again
+        with self.assertNumQueries(0):
+            context.from_pb_list(ReferenceMain, pb_objs[:2])
+
+    def test_batch_missing_reference(self):
+        relation_item = models.Relation.objects.create(num=7)
+        pb_objs = [self._main_pb(relation_item.id), self._main_pb(relation_item.id + 100)]
+
+        with self.assertRaises(DjangoPBModelError):
+            IngestionContext().from_pb_list(ReferenceMain, pb_objs)
+
+
+class QuerySetConvertingTest(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            main_item = models.Main.objects.create(
+                string_field='Hello world', integer_field=i, float_field=1.5,
+                fk_field=models.Relation.objects.create(
+                    num=i, deeper_relation=models.DeeperRelation.objects.create(num=i)),
+            )
+            for j in range(2):
+                main_item.m2m_field.add(models.M2MRelation.objects.create(num=j))
+        self.expected = [m.to_pb() for m in models.Main.objects.order_by('id')]
+
+    def test_to_pb_list(self):
+        # mains, relations, deeper relations, their reverse relations and m2m relations
+        with self.assertNumQueries(5):
+            result = models.Main.objects.order_by('id').to_pb_list()
+        self.assertEqual(result, self.expected)
+
+    def test_to_pb_list_depth(self):
+        with self.assertNumQueries(1):
+            result = models.Main.objects.order_by('id').to_pb_list(depth=0)
+        self.assertEqual(result, [m.to_pb(depth=0) for m in models.Main.objects.order_by('id')])
+
+    def test_iter_pb(self):
+        # prefetching once per chunk
+        with self.assertNumQueries(1 + 4 * 2):
+            result = list(models.Main.objects.order_by('id').iter_pb(chunk_size=2))
+        self.assertEqual(result, self.expected)
+
+    def test_to_pb_container(self):
+        relations = models.Relation.objects.order_by('id')
+        expected = [r.to_pb() for r in relations]
+
+        # relations, deeper relations and their reverse relations
+        with self.assertNumQueries(3):
+            container = relations.to_pb_container(models_pb2.DeeperRelation)
+        self.assertEqual(list(container.relations), expected)
+
+        container = relations.to_pb_container(models_pb2.DeeperRelation(num=1), field='relations', chunk_size=2)
+        self.assertEqual(container.num, 1)
+        self.assertEqual(list(container.relations), expected)
+
+        with self.assertRaises(DjangoPBModelError):
+            models.Main.objects.to_pb_container(models_pb2.DeeperRelation)
+
+    def test_relations_converted_in_place(self):
+        main_item = models.Main.objects.order_by('id').first()
+
+        with mock.patch.object(ProtoBufMixin, 'to_pb', autospec=True, side_effect=ProtoBufMixin.to_pb) as to_pb:
+            result = main_item.to_pb()
+
+        # nested messages are filled in place of the parent message
+        self.assertEqual(to_pb.call_count, 1)
+        self.assertEqual(result, self.expected[0])
+        self.assertTrue(result.HasField('fk_field'))
+
+    def test_to_pb_into(self):
+        main_item = models.Main.objects.order_by('id').first()
+        message = models_pb2.Main(string_field='stale')
+
+        self.assertIs(main_item.to_pb(into=message), message)
+        self.assertEqual(message, self.expected[0])
+
+        relation = models.Relation.objects.order_by('id').first()
+        parent = models_pb2.Main()
+        self.assertIs(relation.fill_pb(parent.fk_field), parent.fk_field)
+        self.assertEqual(parent.fk_field, relation.to_pb())
+
+    def test_iter_pb_bytes(self):
+        # rows are converted into the reused message, not through to_pb()
+        with self.assertNumQueries(1 + 4 * 2), mock.patch.object(ProtoBufMixin, 'to_pb', side_effect=AssertionError):
+            result = list(models.Main.objects.order_by('id').iter_pb_bytes(chunk_size=2))
+        self.assertEqual(result, [m.SerializeToString() for m in self.expected])
+
+        result = b''.join(models.Main.objects.order_by('id').iter_pb_bytes(delimited=True))
+        self.assertEqual([models_pb2.Main.FromString(f) for f in delimited.iter_delimited(result)], self.expected)
+
+    def test_iter_pb_bytes_max_bytes(self):
+        frames = [delimited.encode_delimited(m.SerializeToString()) for m in self.expected]
+        max_bytes = len(frames[0]) + len(frames[1])
+
+        chunks = list(models.Main.objects.order_by('id').iter_pb_bytes(delimited=True, max_bytes=max_bytes))
+
+        self.assertEqual(chunks, [frames[0] + frames[1], frames[2]])
+        with self.assertRaises(DjangoPBModelError):
+            list(models.Main.objects.iter_pb_bytes(max_bytes=len(frames[0]) // 2))
+
+    def test_iter_pb_containers(self):
+        relations = models.Relation.objects.order_by('id')
+        expected = [r.to_pb() for r in relations]
+        one = max(models_pb2.DeeperRelation(relations=[m]).ByteSize() for m in expected)
+
+        for max_bytes in [one, 2 * one, 2 * one + 1, 100 * one]:
+            containers = list(relations.iter_pb_containers(models_pb2.DeeperRelation, max_bytes, chunk_size=2))
+            self.assertEqual(sum([list(c.relations) for c in containers], []), expected)
+            for container, next_container in zip(containers, containers[1:] + [None]):
+                self.assertLessEqual(container.ByteSize(), max_bytes)
+                if next_container is not None:
+                    # the next element didn't fit
+                    container.relations.add().CopyFrom(next_container.relations[0])
+                    self.assertGreater(container.ByteSize(), max_bytes)
+        self.assertEqual(len(containers), 1)
+
+        with self.assertRaises(DjangoPBModelError):
+            list(relations.iter_pb_containers(models_pb2.DeeperRelation, one - 1))
+
+    async def test_aiter_pb(self):
+        result = [m async for m in models.Main.objects.order_by('id').aiter_pb(chunk_size=2)]
+        self.assertEqual(result, self.expected)
+
+    async def test_aget_pb_and_ato_pb(self):
+        result = await models.Main.objects.order_by('id').aget_pb(integer_field=0)
+        self.assertEqual(result, self.expected[0])
+
+        main_item = await sync_to_async(models.Main.objects.order_by('id').first)()
+        self.assertEqual(await main_item.ato_pb(), self.expected[0])
+
+    async def test_afrom_pb_and_asave(self):
+        main_item = await models.Main().afrom_pb(self.expected[0])
+        main_item.integer_field = 100
+        await main_item.asave()
+        result = await models.Main.objects.aget_pb(integer_field=100)
+        self.assertEqual(result.id, self.expected[0].id)
+
+
+class ParallelExportTest(TransactionTestCase):
+    """Workers can't be used within the transaction of a TestCase, except on
+    an in-memory SQLite database
+    """
+
+    def setUp(self):
+        for i in range(25):
+            models.Relation.objects.create(num=i)
+        self.expected = [r.to_pb().SerializeToString() for r in models.Relation.objects.order_by('pk')]
+
+    def test_pk_ranges(self):
+        pks = list(models.Relation.objects.order_by('pk').values_list('pk', flat=True))
+        ranges = list(parallel.pk_ranges(models.Relation.objects.all(), 10))
+        self.assertEqual(ranges, [(pks[0], pks[9]), (pks[10], pks[19]), (pks[20], pks[24])])
+
+    def test_export_ordered(self):
+        frames = list(parallel.export_parallel(models.Relation.objects.all(), workers=2, chunk_size=4))
+        self.assertEqual(frames, self.expected)
+
+    def test_export_unordered_delimited(self):
+        stream = b''.join(parallel.export_parallel(
+            models.Relation.objects.filter(num__gte=5), workers=3, chunk_size=3,
+            ordered=False, delimited=True))
+        self.assertEqual(sorted(delimited.iter_delimited(stream)), sorted(self.expected[5:]))
+
+    def test_delimited_roundtrip(self):
+        frames = [b'', b'x' * 300, b'abc']
+        stream = b''.join(delimited.encode_delimited(frame) for frame in frames)
+        self.assertEqual(list(delimited.iter_delimited(stream)), frames)
+        self.assertEqual(delimited.varint_size(300), len(delimited.encode_varint(300)))
+        with self.assertRaises(DjangoPBModelError):
+            list(delimited.iter_delimited(stream[:-1]))
+        with self.assertRaises(DjangoPBModelError):
+            list(delimited.iter_delimited(stream, max_size=100))
+
+
+class ParallelIngestionTest(TestCase):
+
+    def _stream(self, pb_objs):
+        return b''.join(delimited.encode_delimited(pb_obj.SerializeToString()) for pb_obj in pb_objs)
+
+    def test_ingest_shard(self):
+        relation_item = models.Relation.objects.create(num=1)
+        pb_objs = [models_pb2.Main(string_field='main', integer_field=i, float_field=1.5,
+                                   fk_field=models_pb2.Relation(id=relation_item.id, num=99))
+                   for i in range(1, 6)]
+        frames = [pb_obj.SerializeToString() for pb_obj in pb_objs] + [b'\xff']
+
+        report = parallel._ingest_shard(('tests.Main', 'default', 3, 30, frames, None, True))
+
+        self.assertEqual(report.shard, 3)
+        self.assertEqual(report.received, 6)
+        self.assertEqual(report.written, 5)
+        self.assertEqual([index for index, _ in report.errors], [35])
+        self.assertEqual(sorted(models.Main.objects.values_list('integer_field', flat=True)), list(range(1, 6)))
+        # existing nested row is kept as is
+        self.assertEqual(list(models.Relation.objects.values_list('num', flat=True)), [1])
+
+    def test_bulk_save_nested(self):
+        pb_objs = [models_pb2.Main(string_field='main', integer_field=i, float_field=1.5,
+                                   fk_field=models_pb2.Relation(id=500, num=7))
+                   for i in range(1, 4)]
+        instances = IngestionContext().from_pb_list(models.Main, pb_objs)
+
+        ingestion.bulk_save(models.Main, instances)
+
+        self.assertEqual(models.Main.objects.filter(fk_field_id=500).count(), 3)
+        self.assertEqual(models.Relation.objects.get().num, 7)
+
+
+class ParallelIngestionWriteTest(TransactionTestCase):
+    """Rows written by workers are read back, which needs a database shared
+    with the worker processes
+    """
+
+    def setUp(self):
+        if parallel._is_in_memory_db(connection):
+            self.skipTest("workers write to their own copy of an in-memory SQLite database")
+
+    def test_ingest_parallel(self):
+        pb_objs = [models_pb2.Relation(num=i) for i in range(10)]
+        stream = b''.join(delimited.encode_delimited(pb_obj.SerializeToString()) for pb_obj in pb_objs)
+
+        reports = parallel.ingest_parallel(models.Relation, stream, workers=2, shard_size=4)
+
+        self.assertEqual([r.shard for r in reports], [0, 1, 2])
+        self.assertEqual([r.received for r in reports], [4, 4, 2])
+        self.assertEqual([r.written for r in reports], [4, 4, 2])
+        self.assertEqual([r.errors for r in reports], [[], [], []])
+        self.assertEqual(sorted(models.Relation.objects.values_list('num', flat=True)), list(range(10)))
+
+
+class BenchmarkSuiteTest(TestCase):
+
+    def test_suite_runs(self):
+        results = harness.run(suites.cases(rows=2), iterations=1)
+
+        self.assertIn('protobuf_backend', results['environment'])
+        by_name = {r['name']: r for r in results['results']}
+        self.assertEqual(by_name['main.queryset.to_pb_list']['queries_per_op'], 5)
+        self.assertEqual(by_name['relation.from_pb']['queries_per_op'], 0)
+
+    def test_import_time(self):
+        results = imports.import_time(runs=1)
+
+        self.assertEqual(set(results['import_us']), set(imports.MODULES))
+        self.assertIn('pb_model.models', results['modules'])
+        self.assertNotIn('google.protobuf.any_pb2', results['modules'])
+        # wire and JSON helpers import protobuf internals on first use
+        for module in ['google.protobuf.internal.encoder', 'google.protobuf.internal.decoder',
+                       'google.protobuf.internal.type_checkers', 'google.protobuf.message']:
+            self.assertNotIn(module, results['modules'])
+        # logging is left to the project configuration
+        self.assertEqual(results['root_handlers'], 0)
+
+
+class InstrumentationTest(TestCase):
+
+    def test_conversion_stats(self):
+        main_item = models.Main.objects.create(
+            string_field='Hello world', integer_field=1, float_field=1.5,
+            fk_field=models.Relation.objects.create(num=1),
+        )
+        main_item = models.Main.objects.get(pk=main_item.pk)
+
+        with instrumentation.ConversionStats() as stats:
+            pb_obj = main_item.to_pb()
+            models.Main().from_pb(pb_obj)
+
+        rows = {(r['model'], r['field'], r['operation']): r for r in stats.get_stats()}
+        fk_row = rows[('tests.Main', 'fk_field', instrumentation.TO_PB)]
+        self.assertEqual(fk_row['calls'], 1)
+        self.assertEqual(fk_row['queries'], 1)
+        self.assertEqual(fk_row['bytes'], pb_obj.fk_field.ByteSize() + 2)
+        # sized at top level only
+        self.assertEqual(rows[('tests.Relation', 'num', instrumentation.TO_PB)]['calls'], 1)
+        self.assertEqual(rows[('tests.Relation', 'num', instrumentation.TO_PB)]['bytes'], 0)
+        self.assertEqual(rows[('tests.Main', 'm2m_field', instrumentation.TO_PB)]['queries'], 1)
+        self.assertEqual(rows[('tests.Relation', 'num', instrumentation.FROM_PB)]['calls'], 1)
+        self.assertEqual(rows[('tests.Main', 'string_field', instrumentation.FROM_PB)]['bytes'], 0)
+
+        out = io.StringIO()
+        stats.dump(out)
+        self.assertIn('tests.Main.fk_field', out.getvalue())
+
+        # uninstalled on exit
+        self.assertEqual(instrumentation.tracers, [])
+        main_item.to_pb()
+        self.assertEqual(stats.get_stats(sort='calls')[0]['calls'], 1)
+
+    def test_query_budget_per_row_queries(self):
+        create_mains(3)
+
+        with self.assertRaises(instrumentation.QueryBudgetExceeded) as cm:
+            with instrumentation.pb_query_budget(max_queries=0):
+                [m.to_pb() for m in models.Main.objects.all()]
+
+        message = str(cm.exception)
+        self.assertIn('6 queries issued by protobuf conversion, budget is 0', message)
+        self.assertIn('3  tests.Main.fk_field', message)
+        self.assertIn('3  tests.Main.m2m_field', message)
+
+    def test_query_budget_prefetched(self):
+        create_mains(3)
+
+        with instrumentation.pb_query_budget(max_queries=0) as budget:
+            models.Main.objects.all().to_pb_list()
+        self.assertEqual(budget.total, 0)
+
+    def test_query_budget_per_field_warning(self):
+        create_mains(3)
+
+        with self.assertWarns(RuntimeWarning) as cm:
+            with instrumentation.pb_query_budget(max_queries_per_field=1, action='warn'):
+                [m.to_pb(depth=1) for m in models.Main.objects.all()]
+        self.assertIn('3 queries issued by converting tests.Main.m2m_field', str(cm.warning))
+
+    def test_query_budget_message_field_load(self):
+        root_item = models.Root().from_pb(models_pb2.Root(
+            any_field=Any(), timestamp_field=Timestamp(seconds=1),
+            repeated_message_field=[models_pb2.Root.Embedded(data=i) for i in range(1, 4)]))
+        for m in root_item.repeated_message_field:
+            m.save()
+        root_item.save()
+
+        with self.assertRaises(instrumentation.QueryBudgetExceeded) as cm:
+            with instrumentation.pb_query_budget(max_queries=2):
+                models.Root.objects.get().to_pb()
+        self.assertIn('tests.Root.repeated_message_field', str(cm.exception))
+
+
+class InstrumentationThreadTest(TransactionTestCase):
+    """Rows are committed to be read by connections of other threads"""
+
+    def _to_pb_list(self):
+        try:
+            return [m.to_pb() for m in models.Main.objects.all()]
+        finally:
+            db_connections.close_all()
+
+    async def test_query_budget_sync_to_async(self):
+        await sync_to_async(create_mains)(2)
+
+        with self.assertRaises(instrumentation.QueryBudgetExceeded) as cm:
+            with instrumentation.pb_query_budget(max_queries=0):
+                await sync_to_async(self._to_pb_list, thread_sensitive=False)()
+
+        self.assertIn('2  tests.Main.fk_field', str(cm.exception))
+        self.assertFalse(connection_created.has_listeners())
+
+
+class MemoryProfilingTest(TestCase):
+
+    def test_profile_memory(self):
+        for i in range(1, 4):
+            create_root(root_pb(i))
+
+        report = profiling.profile_memory(models.Root.objects.all())
+
+        self.assertGreater(report.peak, 0)
+        self.assertGreaterEqual(report.peak, report.retained)
+        self.assertEqual(report.objects['messages'], 3)
+        self.assertEqual(report.objects['descriptor caches'], 6)
+        self.assertEqual(report.objects['descriptor cache items'], 12)
+        self.assertGreater(report.categories[profiling.MESSAGES], 0)
+        self.assertGreater(report.categories[profiling.INSTANCES], 0)
+        rows = {(r['model'], r['field'], r['operation']): r for r in report.fields}
+        self.assertEqual(rows[('tests.Root', 'repeated_message_field', instrumentation.LOAD)]['calls'], 3)
+        self.assertFalse(profiling.tracemalloc.is_tracing())
+
+        out = io.StringIO()
+        report.dump(out)
+        self.assertIn('descriptor caches', out.getvalue())
+
+
+class ClassCreationTest(TestCase):
+
+    def test_field_kinds_cached(self):
+        self.assertEqual(_field_kinds['models.Root.map_string_to_message_field'], fields.PB_FIELD_TYPE_MESSAGE_MAP)
+        self.assertEqual(_field_kinds['models.Root.timestamp_field'], fields.PB_FIELD_TYPE_TIMESTAMP)
+        self.assertEqual(_field_kinds['models.Root.uint32_field'], FieldDescriptor.TYPE_UINT32)
+
+        # descriptors already classified by tests.Root are not inspected again
+        with mock.patch.object(Meta, '_is_map_field', side_effect=AssertionError):
+            class CachedKinds(ProtoBufMixin, dj_models.Model):
+                pb_model = models_pb2.Root
+                pb_2_dj_fields = ['uint32_field', 'map_string_to_string_field']
+
+        self.assertIs(type(CachedKinds._meta.get_field('map_string_to_string_field')), fields.MapField)
+
+        # each class owns a copy of the defaults
+        CachedKinds.pb_auto_field_type_mapping[FieldDescriptor.TYPE_UINT32] = dj_models.IntegerField
+        self.assertIs(models.Root.pb_auto_field_type_mapping[FieldDescriptor.TYPE_UINT32],
+                      dj_models.PositiveIntegerField)
+        self.assertIs(ProtoBufMixin._pb_auto_field_type_mapping[FieldDescriptor.TYPE_UINT32],
+                      dj_models.PositiveIntegerField)
+
+    def test_class_creation_times(self):
+        elapsed, created = instrumentation.class_creation_times['tests.Root']
+        self.assertGreater(elapsed, 0)
+        self.assertEqual(created, len(models_pb2.Root.DESCRIPTOR.fields_by_name) - 2)  # except uuid_field and inlineField
+
+        out = io.StringIO()
+        instrumentation.dump_class_creation_times(out, limit=1)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class WarmUpTest(TestCase):
+
+    def test_warm_up(self):
+        warmed = warm_up()
+
+        self.assertIn(models.Root, warmed)
+        self.assertNotIn(ProtoBufMixin, warmed)
+        dj_fields = models.Root._pb_dj_fields()
+        self.assertIs(models.Root.__dict__['_pb_dj_fields_cache'][1], dj_fields)
+        self.assertIn('related_manager_cls', models.Root.__dict__['repeated_message_field'].__dict__)
+        self.assertIn('related_manager_cls', models.Main.__dict__['m2m_field'].__dict__)
+
+    def test_warm_up_setting(self):
+        with mock.patch('pb_model.models.warm_up') as warm_up:
+            apps.get_app_config('pb_model').ready()
+            self.assertFalse(warm_up.called)
+            with override_settings(PB_MODEL_WARMUP=True):
+                apps.get_app_config('pb_model').ready()
+            self.assertTrue(warm_up.called)
+
+    def test_fields_cache_expired_with_django_cache(self):
+        dj_fields = models.Relation._pb_dj_fields()
+        self.assertIs(models.Relation._pb_dj_fields(), dj_fields)
+        self.assertNotIn('relatingafterwards', dj_fields)
+
+        class RelatingAfterwards(dj_models.Model):
+            relation = dj_models.ForeignKey(models.Relation, on_delete=dj_models.CASCADE)
+
+        self.assertIn('relatingafterwards', models.Relation._pb_dj_fields())
+
+
+class TimestampConvertingTest(TestCase):
+
+    values = [
+        datetime.datetime(1970, 1, 1),
+        datetime.datetime(1969, 12, 31, 23, 59, 59, 500000),
+        datetime.datetime(1, 1, 1),
+        datetime.datetime(9999, 12, 31, 23, 59, 59, 999999),
+        datetime.datetime(2020, 2, 29, 12, 30, 15, 123456),
+    ]
+
+    def test_same_as_protobuf(self):
+        for value in self.values:
+            expected = Timestamp()
+            expected.FromDatetime(value)
+            aware = timezone.make_aware(value, timezone.utc)
+            self.assertEqual(fields.datetime_to_timestamp(aware), (expected.seconds, expected.nanos))
+            self.assertEqual(fields.datetime_to_timestamp(value, use_tz=False), (expected.seconds, expected.nanos))
+
+            self.assertEqual(fields.timestamp_to_datetime(expected.seconds, expected.nanos), aware)
+            self.assertEqual(fields.timestamp_to_datetime(expected.seconds, expected.nanos, use_tz=False),
+                             expected.ToDatetime())
+
+        with self.assertRaises(ValueError):
+            fields.datetime_to_timestamp(self.values[0])
+
+    def test_round_trip(self):
+        pb_field = models_pb2.Main.DESCRIPTOR.fields_by_name['datetime_field']
+        # an offset would move the extremes out of datetime range in UTC
+        for value in self.values[:2] + self.values[4:]:
+            aware = timezone.make_aware(value, timezone.get_fixed_timezone(-300))
+            pb_obj = models_pb2.Main()
+            fields._datetimefield_to_pb(pb_obj, pb_field, aware)
+            main_item = models.Main()
+            fields._datetimefield_from_pb(main_item, 'datetime_field', pb_field, pb_obj.datetime_field)
+
+            self.assertEqual(main_item.datetime_field, aware)
+            self.assertEqual(main_item.datetime_field.utcoffset(), datetime.timedelta(0))
+            restored_pb_obj = models_pb2.Main()
+            fields._datetimefield_to_pb(restored_pb_obj, pb_field, main_item.datetime_field)
+            self.assertEqual(restored_pb_obj.datetime_field, pb_obj.datetime_field)
+
+
+class JSONConvertingTest(TestCase):
+
+    def setUp(self):
+        create_dataset(2)
+
+    def test_to_pb_dict(self):
+        objs = list(models.Root.objects.all()) + list(models.Main.objects.all()) + list(models.Relation.objects.all())
+        for obj in objs:
+            for depth in [None, 0, 1]:
+                self.assertEqual(obj.to_pb_dict(depth=depth), json_format.MessageToDict(obj.to_pb(depth=depth)))
+
+    def test_without_messages(self):
+        main_item = models.Main.objects.first()
+        expected = main_item.to_pb_dict()
+
+        with mock.patch.object(_ScratchMessage, 'get', side_effect=AssertionError):
+            self.assertEqual(main_item.to_pb_dict(), expected)
+        self.assertEqual(expected['datetimeField'][-1], 'Z')
+
+    def test_scalars(self):
+        root = models.Root.objects.first()
+        for name, value in [('float_field', 0.1), ('float_field', float('inf')), ('double_field', float('nan')),
+                            ('int64_field', 0), ('string_field', ''), ('enum_field', 7),
+                            ('bytes_field', b'\x00\xff'), ('uuid_field', None)]:
+            setattr(root, name, value)
+            self.assertEqual(json.loads(root.to_pb_json()), json.loads(json_format.MessageToJson(root.to_pb())))
+
+        root.int32_field = 2 ** 40
+        with self.assertRaises(ValueError):
+            root.to_pb_dict()
+
+    def test_iter_pb_json(self):
+        queryset = models.Main.objects.order_by('id')
+
+        self.assertEqual(json.loads(''.join(queryset.iter_pb_json(chunk_size=1))),
+                         [json_format.MessageToDict(m) for m in queryset.to_pb_list()])
+        self.assertEqual(''.join(queryset.none().iter_pb_json()), '[]')
+
+
+class WireEncodingTest(TestCase):
+
+    def setUp(self):
+        create_dataset(2)
+
+    def test_to_pb_bytes(self):
+        objs = list(models.Root.objects.all()) + list(models.Main.objects.all()) + list(models.Relation.objects.all())
+        for obj in objs:
+            for depth in [None, 0, 1]:
+                self.assertEqual(obj.to_pb_bytes(depth=depth), obj.to_pb(depth=depth).SerializeToString())
+
+    def test_scalars(self):
+        root = models.Root.objects.first()
+        for name, value in [('uint32_field_renamed', 2 ** 32 - 1), ('int32_field', -1), ('int64_field', -2 ** 63),
+                            ('uint64_field', 2 ** 64 - 1), ('float_field', float('-inf')), ('double_field', -0.0),
+                            ('string_field', u'\u00e9\u4e2d'), ('bool_field', False), ('enum_field', -7),
+                            ('bytes_field', b''), ('timestamp_field', datetime.datetime(1960, 1, 1, 0, 0, 0, 1, tzinfo=datetime.timezone.utc)),
+                            ('uuid_field', None), ('inline_field', None), ('second_inline_field', '')]:
+            setattr(root, name, value)
+            self.assertEqual(root.to_pb_bytes(), root.to_pb().SerializeToString())
+
+        root.int32_field = 2 ** 40
+        with self.assertRaises(ValueError):
+            root.to_pb_bytes()
+
+    def test_field_presence_and_wire_type(self):
+        if not hasattr(FieldDescriptor, 'has_presence'):
+            self.skipTest("FieldDescriptor.has_presence is missing from this protobuf version")
+        # proto3 and proto2 messages
+        for descriptor in [models_pb2.Root.DESCRIPTOR, models_pb2.Main.DESCRIPTOR,
+                           descriptor_pb2.FieldDescriptorProto.DESCRIPTOR]:
+            for pb_field in descriptor.fields:
+                self.assertEqual(fields.has_presence(pb_field), pb_field.has_presence, pb_field.full_name)
+
+        data = models.Root.objects.first().to_pb().SerializeToString()
+        for number, wire_type, _, _ in delimited.iter_fields(data):
+            pb_field = models_pb2.Root.DESCRIPTOR.fields_by_number[number]
+            if pb_field.label != FieldDescriptor.LABEL_REPEATED or pb_field.message_type is not None:
+                # repeated scalars are packed
+                self.assertEqual(fields.field_wire_type(pb_field), wire_type, pb_field.full_name)
+
+    def test_without_messages(self):
+        main_item = models.Main.objects.first()
+        expected = main_item.to_pb().SerializeToString()
+
+        with mock.patch.object(_ScratchMessage, 'get', side_effect=AssertionError):
+            self.assertEqual(main_item.to_pb_bytes(), expected)
+
+    def test_split_fields(self):
+        data = models.Root.objects.first().to_pb().SerializeToString()
+
+        chunks = list(delimited.split_fields(data))
+
+        self.assertEqual(b''.join(chunk for _, chunk in chunks), data)
+        self.assertEqual([number for number, _ in chunks][:3], [1, 2, 3])
+        with self.assertRaises(DjangoPBModelError):
+            list(delimited.split_fields(data[:-1]))
+
+
+class WireDecodingTest(TestCase):
+
+    def setUp(self):
+        create_dataset(2)
+
+    def _field(self, name):
+        return models_pb2.Root.DESCRIPTOR.fields_by_name[name]
+
+    def _state(self, obj):
+        """Values of concrete fields of obj and of related instances set by from_pb()"""
+        state = {f.attname: getattr(obj, f.attname) for f in obj._meta.concrete_fields}
+        for f in obj._meta.concrete_fields:
+            if f.is_relation and f.is_cached(obj):
+                state[f.name] = self._state(f.get_cached_value(obj))
+        for f in obj._meta.many_to_many:
+            if isinstance(f, fields.ProtoBufFieldMixin):
+                value = getattr(obj, f.name)
+                items = value.items() if isinstance(value, dict) else enumerate(value)
+                state[f.name] = [(key, self._state(item)) for key, item in items]
+        return state
+
+    def _assert_decoded(self, model, data):
+        expected = model().from_pb(model.pb_model.FromString(data))
+        actual = model().from_pb_bytes(data)
+        self.assertEqual(self._state(actual), self._state(expected))
+        return actual
+
+    def test_from_pb_bytes(self):
+        for model in [models.Root, models.Main, models.Relation]:
+            for obj in model.objects.all():
+                self._assert_decoded(model, obj.to_pb().SerializeToString())
+        root = self._assert_decoded(models.Root, root_pb(3).SerializeToString())
+        self.assertEqual(root.inline_field, 'inline')
+        self.assertEqual(root.second_inline_field, 'nested')
+        self.assertEqual(root.uint32_field_renamed, 3)
+
+    def test_relations(self):
+        main_item = models.Main.objects.first()
+        data = main_item.to_pb().SerializeToString()
+
+        main = self._assert_decoded(models.Main, data)
+        self.assertEqual(main.fk_field.deeper_relation.num, main_item.fk_field.deeper_relation.num)
+
+        context = IngestionContext(resolve_existing=True)
+        main = models.Main().from_pb_bytes(data, context=context)
+        self.assertEqual(main.fk_field.pk, main_item.fk_field.pk)
+
+        with instrumentation.ConversionStats() as stats:
+            models.Main().from_pb_bytes(data)
+        rows = {(r['model'], r['field'], r['operation']): r for r in stats.get_stats()}
+        self.assertEqual(rows[('tests.Main', 'fk_field', instrumentation.FROM_PB)]['calls'], 1)
+        self.assertEqual(rows[('tests.Main', 'm2m_field', instrumentation.FROM_PB)]['calls'], 1)
+        self.assertEqual(rows[('tests.Relation', 'deeper_relation', instrumentation.FROM_PB)]['calls'], 1)
+
+    def test_wire_edge_cases(self):
+        data = models.Root.objects.first().to_pb().SerializeToString()
+        timestamp = self._field('timestamp_field')
+        inline = self._field('inlineField')
+        for extra in [
+            # occurring again, last one wins
+            fields.scalar_to_wire(self._field('int32_field'), -5),
+            fields.scalar_to_wire(self._field('string_field'), u'\u00e9'),
+            # explicit default value
+            b'\x20\x00',
+            # messages are merged
+            fields.length_delimited_to_wire(timestamp, b'\x10\x05'),
+            fields.length_delimited_to_wire(inline, b''),
+            fields.length_delimited_to_wire(inline, b'\x0a\x01x'),
+            # unknown field and mismatched wire type
+            b'\xa0\x3e\x01',
+            b'\x25\x01\x00\x00\x00',
+        ]:
+            self._assert_decoded(models.Root, data + extra)
+        self._assert_decoded(models.Root, b'')
+        self._assert_decoded(models.Root, fields.length_delimited_to_wire(timestamp, b''))
+
+    def test_preserve_unknown(self):
+        unknown = b'\xa0\x3e\x01' + b'\xaa\x3e\x03abc'
+        data = models.Root.objects.first().to_pb().SerializeToString() + unknown
+
+        root = models.Root().from_pb_bytes(data, preserve_unknown=True)
+
+        self.assertEqual(root.to_pb().SerializeToString(), models_pb2.Root.FromString(data).SerializeToString())
+        self.assertEqual(root.to_pb_bytes(), root.to_pb().SerializeToString())
+        self.assertTrue(root.to_pb_bytes().endswith(unknown))
+        self.assertFalse(models.Root().from_pb_bytes(data).to_pb_bytes().endswith(unknown))
+
+    def test_malformed(self):
+        data = models.Root.objects.first().to_pb().SerializeToString()
+
+        for malformed in [data[:-1], data + b'\x08', data + b'\x0f',
+                          fields.length_delimited_to_wire(self._field('string_field'), b'\xff')]:
+            with self.assertRaises(DjangoPBModelError):
+                models.Root().from_pb_bytes(malformed)
+
+    def test_serializers_changed_after_conversion(self):
+        data = models.Root.objects.first().to_pb().SerializeToString()
+        self.assertEqual(models.Root().from_pb_bytes(data).int32_field, models_pb2.Root.FromString(data).int32_field)
+
+        def negated_from_pb(instance, dj_field_name, pb_field, pb_value):
+            setattr(instance, dj_field_name, -pb_value)
+
+        serializers = (fields._defaultfield_to_pb, negated_from_pb)
+        with mock.patch.dict(models.Root.pb_2_dj_field_serializers, {'int32_field': serializers}):
+            root = models.Root().from_pb_bytes(data)
+        self.assertEqual(root.int32_field, -models_pb2.Root.FromString(data).int32_field)
+        self._assert_decoded(models.Root, data)
+
+    def test_varint_size_limit(self):
+        largest = b'\xff' * 9 + b'\x01'
+        self.assertEqual(delimited._decode_varint(largest, 0), (2 ** 64 - 1, 10))
+        self.assertEqual(delimited._read_varint(io.BytesIO(largest)), 2 ** 64 - 1)
+        with self.assertRaises(DjangoPBModelError):
+            delimited._decode_varint(b'\xff' * 10 + b'\x01', 0)
+        with self.assertRaises(DjangoPBModelError):
+            delimited._read_varint(io.BytesIO(b'\xff' * 10 + b'\x01'))
+
+    def test_iter_fields(self):
+        data = b'\x08\x96\x01' + b'\x12\x02ab' + b'\x1d\x01\x00\x00\x00' + b'\x23\x08\x01\x24'
+
+        self.assertEqual(list(delimited.iter_fields(data)), [
+            (1, 0, 150, b'\x08\x96\x01'), (2, 2, b'ab', b'\x12\x02ab'),
+            (3, 5, b'\x01\x00\x00\x00', b'\x1d\x01\x00\x00\x00'), (4, 3, None, b'\x23\x08\x01\x24'),
+        ])
+
+
+class PaginationTest(TestCase):
+
+    def setUp(self):
+        self.deeper_relation_item = models.DeeperRelation.objects.create(num=1)
+        for i in range(7):
+            models.Relation.objects.create(num=i // 2, deeper_relation=self.deeper_relation_item)
+
+    def _all_pages(self, **kwargs):
+        pages, cursor = [], None
+        while True:
+            page = models.Relation.objects.pb_page(cursor=cursor, page_size=3, depth=0, **kwargs)
+            pages.append([m.id for m in page.messages])
+            if not page.has_next:
+                return pages
+            cursor = page.next_cursor
+
+    def test_pages(self):
+        ids = list(models.Relation.objects.order_by('id').values_list('id', flat=True))
+
+        self.assertEqual(self._all_pages(), [ids[:3], ids[3:6], ids[6:]])
+        self.assertEqual(self._all_pages(order_by='-pk'), [ids[::-1][:3], ids[::-1][3:6], ids[::-1][6:]])
+
+    def test_non_unique_ordering(self):
+        expected = list(models.Relation.objects.order_by('-num', '-id').values_list('id', flat=True))
+
+        pages = self._all_pages(order_by='-num')
+
+        self.assertEqual(sum(pages, []), expected)
+
+    def test_page_into_container(self):
+        container = models_pb2.DeeperRelation(num=5)
+
+        page = models.Relation.objects.pb_page(page_size=3, depth=0, container=container)
+
+        self.assertIs(page.container, container)
+        self.assertEqual(list(container.relations), models.Relation.objects.pb_page(page_size=3, depth=0).messages)
+        self.assertEqual([m.id for m in page.messages], [m.id for m in container.relations])
+        self.assertEqual(container.num, 5)
+
+    def test_invalid_page_size(self):
+        for page_size in [0, -1, 1.5, None]:
+            with self.assertRaises(DjangoPBModelError):
+                models.Relation.objects.pb_page(page_size=page_size)
+
+    def test_queries_per_page(self):
+        first = models.Relation.objects.pb_page(page_size=2)
+        # page, deeper relations and relations of deeper relations
+        with self.assertNumQueries(3):
+            page = models.Relation.objects.pb_page(cursor=first.next_cursor, page_size=2)
+        self.assertEqual(page.messages[0].deeper_relation.num, 1)
+
+    def test_cursor(self):
+        value = timezone.now().replace(microsecond=123456)
+        dj_field = models.Main._meta.get_field('datetime_field')
+
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor([value]), [dj_field]), [value])
+        for cursor in ['invalid', pagination.encode_cursor([1, 2])]:
+            with self.assertRaises(DjangoPBModelError):
+                models.Relation.objects.pb_page(cursor=cursor)
+
+
+class ProtoBufViewTest(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.deeper_relation_item = models.DeeperRelation.objects.create(num=1)
+        for i in range(5):
+            models.Relation.objects.create(num=i, deeper_relation=self.deeper_relation_item)
+        self.expected = [r.to_pb(depth=0) for r in models.Relation.objects.order_by('id')]
+
+    def test_detail(self):
+        relation = models.Relation.objects.order_by('id').first()
+        view = views.ProtoBufDetailView.as_view(model=models.Relation, depth=0)
+
+        response = view(self.factory.get('/'), pk=relation.pk)
+
+        self.assertEqual(response['Content-Type'], views.CONTENT_TYPE)
+        self.assertEqual(models_pb2.Relation.FromString(response.content), self.expected[0])
+        with self.assertRaises(Http404):
+            view(self.factory.get('/'), pk=0)
+
+    def test_list_streaming(self):
+        view = views.ProtoBufListView.as_view(
+            queryset=models.Relation.objects.order_by('id'), depth=0, chunk_size=2)
+
+        with self.assertNumQueries(0):
+            response = view(self.factory.get('/'))
+        self.assertEqual(response['Content-Type'], views.DELIMITED_CONTENT_TYPE)
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content)
+        self.assertEqual([models_pb2.Relation.FromString(f) for f in delimited.iter_delimited(content)],
+                         self.expected)
+
+    def test_list_wrapper(self):
+        view = views.ProtoBufListView.as_view(
+            queryset=models.Relation.objects.order_by('id'), depth=0,
+            wrapper_message=models_pb2.DeeperRelation)
+
+        response = view(self.factory.get('/'))
+
+        self.assertEqual(response['Content-Type'], views.CONTENT_TYPE)
+        self.assertEqual(list(models_pb2.DeeperRelation.FromString(response.content).relations), self.expected)
+
+        with self.assertRaises(DjangoPBModelError):
+            views.ProtoBufListView.as_view(model=models.Main, wrapper_message=models_pb2.DeeperRelation)(
+                self.factory.get('/'))
+
+    def test_list_wrapper_paginated(self):
+        view = views.ProtoBufListView.as_view(
+            queryset=models.Relation.objects.order_by('id'), depth=0, paginate_by=3,
+            wrapper_message=models_pb2.DeeperRelation)
+
+        response = view(self.factory.get('/'))
+
+        self.assertEqual(list(models_pb2.DeeperRelation.FromString(response.content).relations), self.expected[:3])
+        self.assertTrue(response.has_header('X-Next-Cursor'))
+
+    def _post(self, view, body, query=''):
+        return view(self.factory.post('/' + query, body, content_type=views.DELIMITED_CONTENT_TYPE))
+
+    def test_ingest_create(self):
+        view = views.ProtoBufIngestView.as_view(model=models.Relation, batch_size=2)
+        frames = [delimited.encode_delimited(models_pb2.Relation(num=10 + i).SerializeToString()) for i in range(3)]
+        body = frames[0] + delimited.encode_delimited(b'\xff') + frames[1] + frames[2]
+
+        response = self._post(view, body)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([r['status'] for r in data['results']], ['created', 'error', 'created', 'created'])
+        self.assertIn("Can't decode", data['results'][1]['error'])
+        self.assertEqual(data['counts'], {'created': 3, 'error': 1})
+        self.assertEqual(list(models.Relation.objects.filter(num__gte=10).order_by('num').values_list('num', flat=True)),
+                         [10, 11, 12])
+
+    def test_ingest_upsert(self):
+        existing = models.Relation.objects.order_by('id').first()
+        view = views.ProtoBufIngestView.as_view(model=models.Relation)
+        body = b''.join(delimited.encode_delimited(m.SerializeToString()) for m in [
+            models_pb2.Relation(id=existing.id, num=100), models_pb2.Relation(num=7)])
+
+        with self.assertNumQueries(0):
+            rejected = self._post(view, body, '?mode=delete')
+        self.assertEqual(rejected.status_code, 400)
+
+        response = self._post(view, body, '?mode=upsert')
+
+        self.assertEqual([r['status'] for r in json.loads(response.content)['results']], ['updated', 'created'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.num, 100)
+        self.assertEqual(models.Relation.objects.count(), 6)
+
+    def test_ingest_validate(self):
+        view = views.ProtoBufIngestView.as_view(model=models.Relation, mode=views.VALIDATE)
+        body = b''.join(delimited.encode_delimited(models_pb2.Relation(num=i).SerializeToString())
+                        for i in range(3))
+
+        response = self._post(view, body)
+
+        self.assertEqual(json.loads(response.content)['counts'], {'valid': 3})
+        self.assertEqual(models.Relation.objects.count(), 5)
+
+    def test_ingest_wrapper(self):
+        view = views.ProtoBufIngestView.as_view(model=models.Relation, wrapper_message=models_pb2.DeeperRelation)
+        wrapper = models_pb2.DeeperRelation(id=1, num=2, relations=[models_pb2.Relation(num=20 + i) for i in range(2)])
+
+        response = self._post(view, wrapper.SerializeToString())
+
+        self.assertEqual(json.loads(response.content)['counts'], {'created': 2})
+        self.assertEqual(models.Relation.objects.filter(num__gte=20).count(), 2)
+
+    def test_ingest_truncated(self):
+        view = views.ProtoBufIngestView.as_view(model=models.Relation)
+        frame = delimited.encode_delimited(models_pb2.Relation(num=30).SerializeToString())
+
+        response = self._post(view, frame + frame[:-1])
+
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.content)
+        self.assertIn('error', data)
+        self.assertEqual(data['counts'], {'created': 1})
+        self.assertEqual(models.Relation.objects.filter(num=30).count(), 1)
+
+    def test_list_paginated(self):
+        view = views.ProtoBufListView.as_view(model=models.Relation, depth=0, paginate_by=3)
+
+        response = view(self.factory.get('/'))
+        next_response = view(self.factory.get('/', {'cursor': response['X-Next-Cursor']}))
+
+        messages = [models_pb2.Relation.FromString(f) for r in [response, next_response]
+                    for f in delimited.iter_delimited(r.content)]
+        self.assertEqual(messages, self.expected)
+        self.assertFalse(next_response.has_header('X-Next-Cursor'))
+        self.assertEqual(view(self.factory.get('/', {'cursor': '!'})).status_code, 400)
+
+        view = views.ProtoBufListView.as_view(model=models.Relation, depth=0, paginate_by=-1)
+        self.assertEqual(view(self.factory.get('/')).status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='pb_model.tests.urls')
+class AsyncProtoBufViewTest(TestCase):
+    """Async views requested through the ASGI handler, see tests/urls.py"""
+
+    def setUp(self):
+        self.client = AsyncClient()
+        deeper_relation_item = models.DeeperRelation.objects.create(num=1)
+        for i in range(5):
+            models.Relation.objects.create(num=i, deeper_relation=deeper_relation_item)
+        self.expected = [r.to_pb(depth=0) for r in models.Relation.objects.order_by('id')]
+
+    async def test_async_detail(self):
+        relation = await sync_to_async(models.Relation.objects.order_by('id').first)()
+
+        response = await self.client.get('/relations/{}/'.format(relation.pk))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], views.CONTENT_TYPE)
+        self.assertEqual(models_pb2.Relation.FromString(response.content), self.expected[0])
+        self.assertEqual((await self.client.get('/relations/0/')).status_code, 404)
+        self.assertEqual((await self.client.post('/relations/{}/'.format(relation.pk))).status_code, 405)
+
+    async def test_async_list(self):
+        response = await self.client.get('/relations/')
+
+        self.assertEqual(response.status_code, 200)
+        if views.ASYNC_STREAMING:
+            content = b''.join([chunk async for chunk in response])
+        else:
+            content = b''.join(response.streaming_content)
+        self.assertEqual([models_pb2.Relation.FromString(f) for f in delimited.iter_delimited(content)],
+                         self.expected)
+
+        # converted in place, without intermediate messages
+        with mock.patch.object(ProtoBufMixin, 'to_pb', side_effect=AssertionError):
+            response = await self.client.get('/relations/wrapper/')
+        self.assertEqual(list(models_pb2.DeeperRelation.FromString(response.content).relations), self.expected)
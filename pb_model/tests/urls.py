@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django.urls import path
+
+from pb_model import views
+
+from . import models, models_pb2
+
+urlpatterns = [
+    path('relations/<int:pk>/', views.AsyncProtoBufDetailView.as_view(model=models.Relation, depth=0)),
+    path('relations/', views.AsyncProtoBufListView.as_view(
+        queryset=models.Relation.objects.order_by('id'), depth=0, chunk_size=2)),
+    path('relations/wrapper/', views.AsyncProtoBufListView.as_view(
+        queryset=models.Relation.objects.order_by('id'), depth=0, wrapper_message=models_pb2.DeeperRelation)),
+]
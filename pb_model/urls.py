@@ -1,10 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from django.conf.urls import patterns, url  # pragma: no cover
-
-
-urlpatterns = patterns(  # pragma: no cover
-    "",
-    url("^$", 'viewfunc', name='root-of-app'),
-)
+# views of pb_model take a model or queryset, route them in project urls,
+# see pb_model.views
+urlpatterns = []  # pragma: no cover
@@ -1,4 +1,351 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-# Create your views here.
+"""Class-based views serving ProtoBufMixin querysets as protobuf.
+
+List views respond with a single wrapper message when ``wrapper_message`` is
+set, otherwise with a stream of length-delimited messages (see
+:mod:`pb_model.delimited`) produced in chunks of rows::
+
+    urlpatterns = [
+        path('mains/', ProtoBufListView.as_view(model=Main)),
+        path('mains/<int:pk>/', ProtoBufDetailView.as_view(model=Main)),
+    ]
+
+The ``Async`` variants convert rows in a worker thread with ``sync_to_async``,
+for ASGI deployments, their ``as_view()`` returns a coroutine function.
+
+:class:`ProtoBufIngestView` is the other way round, it writes messages posted
+in the same formats and responds with the status of each message.
+"""
+
+import asyncio
+import collections
+import functools
+
+import django
+from django.db import router, transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.translation import gettext as _
+from django.views.generic import View
+from django.views.generic.detail import SingleObjectMixin
+from django.views.generic.list import MultipleObjectMixin
+
+from .delimited import encode_delimited, iter_delimited, iter_repeated_field
+from .ingestion import IngestionContext, bulk_save, bulk_upsert
+from .models import DjangoPBModelError, repeated_field_of
+
+CONTENT_TYPE = 'application/x-protobuf'
+DELIMITED_CONTENT_TYPE = 'application/x-protobuf; delimited=true'
+
+# StreamingHttpResponse accepts asynchronous iterators since django 4.2
+ASYNC_STREAMING = django.VERSION >= (4, 2)
+# as_view() of views with async handlers returns a coroutine function since django 4.1
+ASYNC_VIEWS = django.VERSION >= (4, 1)
+
+# modes of ProtoBufIngestView
+CREATE = 'create'
+UPSERT = 'upsert'
+VALIDATE = 'validate'
+
+
+class ProtoBufResponseMixin(object):
+    """Attributes shared by protobuf views
+
+    :ivar depth: depth of relation been recursively converted, same as to_pb()
+    """
+    depth = None
+
+    def render_to_pb_response(self, message):
+        return HttpResponse(message.SerializeToString(), content_type=CONTENT_TYPE)
+
+
+class WrapperMessageMixin(object):
+    """Attributes of views exchanging a wrapper message instead of
+    length-delimited messages
+
+    :ivar wrapper_message: message class with a repeated field of messages of
+        the model, None for length-delimited messages
+    :ivar wrapper_field: name of the repeated field of ``wrapper_message``,
+        defaults to its only repeated field of messages of the model
+    """
+    wrapper_message = None
+    wrapper_field = None
+
+    def get_wrapper_field(self, model):
+        if self.wrapper_field is not None:
+            return self.wrapper_field
+        return repeated_field_of(self.wrapper_message.DESCRIPTOR, model)
+
+
+class AsyncViewMixin(object):
+    """Views with ``async def`` handlers, awaited by django handlers before
+    4.1 as well, which only await views being coroutine functions
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super(AsyncViewMixin, cls).as_view(**initkwargs)
+        if ASYNC_VIEWS:
+            return view
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            # ex: http_method_not_allowed() and options() respond synchronously
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+        return async_view
+
+
+class ProtoBufDetailView(ProtoBufResponseMixin, SingleObjectMixin, View):
+    """Respond with the message of a single row, looked up by ``pk`` or
+    ``slug`` URL keyword argument as Django's DetailView
+    """
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return self.render_to_pb_response(self.object.to_pb(depth=self.depth))
+
+
+class AsyncProtoBufDetailView(AsyncViewMixin, ProtoBufDetailView):
+    """Asynchronous version of ProtoBufDetailView, looking up and converting
+    the row within a single thread hop
+    """
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self._get_lookup_queryset()
+        try:
+            message = await queryset.aget_pb(depth=self.depth)
+        except queryset.model.DoesNotExist:
+            raise Http404(_("No %(verbose_name)s found matching the query") %
+                          {'verbose_name': queryset.model._meta.verbose_name})
+        return self.render_to_pb_response(message)
+
+    def _get_lookup_queryset(self):
+        # lookup of SingleObjectMixin.get_object() without querying
+        queryset = self.get_queryset()
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+        if slug is not None and (pk is None or self.query_pk_and_slug):
+            queryset = queryset.filter(**{self.get_slug_field(): slug})
+        if pk is None and slug is None:
+            raise AttributeError(
+                "Generic detail view %s must be called with either an object "
+                "pk or a slug in the URLconf." % self.__class__.__name__)
+        return queryset
+
+
+class ProtoBufListView(ProtoBufResponseMixin, WrapperMessageMixin, MultipleObjectMixin, View):
+    """Respond with messages of all rows of the queryset, as a single
+    ``wrapper_message`` or a stream of length-delimited messages
+
+    With ``paginate_by``, respond with a page of rows selected by keyset
+    pagination (see :mod:`pb_model.pagination`) instead. The page after is
+    requested with the ``cursor`` query parameter set to the value of the
+    ``X-Next-Cursor`` response header, which is absent on the last page.
+
+    :ivar chunk_size: number of rows fetched and converted at a time
+    :ivar cursor_order_by: field name to paginate by, prefixed by ``-`` for
+        descending order
+    """
+    chunk_size = 100
+    cursor_order_by = 'pk'
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        if self.paginate_by:
+            page_kwargs = self.get_page_kwargs(queryset)
+            try:
+                page = queryset.pb_page(**page_kwargs)
+            except DjangoPBModelError as e:
+                return HttpResponseBadRequest(str(e))
+            return self.render_to_page_response(page, queryset.model)
+
+        if self.wrapper_message is None:
+            return StreamingHttpResponse(queryset.iter_pb_bytes(depth=self.depth, chunk_size=self.chunk_size,
+                                                                delimited=True),
+                                         content_type=DELIMITED_CONTENT_TYPE)
+
+        wrapper = queryset.to_pb_container(self.wrapper_message, self.get_wrapper_field(queryset.model),
+                                           depth=self.depth, chunk_size=self.chunk_size)
+        return self.render_to_pb_response(wrapper)
+
+    def get_page_kwargs(self, queryset):
+        kwargs = {
+            'cursor': self.request.GET.get('cursor'),
+            'page_size': self.get_paginate_by(queryset),
+            'order_by': self.cursor_order_by,
+            'depth': self.depth,
+        }
+        if self.wrapper_message is not None:
+            # rows are converted straight into the wrapper
+            kwargs.update(container=self.wrapper_message, field=self.get_wrapper_field(queryset.model))
+        return kwargs
+
+    def render_to_page_response(self, page, model):
+        if page.container is None:
+            response = HttpResponse(b''.join(encode_delimited(m.SerializeToString()) for m in page.messages),
+                                    content_type=DELIMITED_CONTENT_TYPE)
+        else:
+            response = self.render_to_pb_response(page.container)
+        if page.next_cursor is not None:
+            response['X-Next-Cursor'] = page.next_cursor
+        return response
+
+
+class AsyncProtoBufListView(AsyncViewMixin, ProtoBufListView):
+    """Asynchronous version of ProtoBufListView, each chunk of rows is fetched
+    and converted within a single thread hop, a ``wrapper_message`` is filled
+    within a single one
+
+    Streaming needs django >= 4.2, older versions respond once all frames are
+    converted.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        queryset = self.get_queryset()
+        if self.paginate_by:
+            page_kwargs = self.get_page_kwargs(queryset)
+            try:
+                page = await sync_to_async(queryset.pb_page)(**page_kwargs)
+            except DjangoPBModelError as e:
+                return HttpResponseBadRequest(str(e))
+            return self.render_to_page_response(page, queryset.model)
+
+        if self.wrapper_message is None:
+            frames = self._aiter_frames(queryset.aiter_pb(depth=self.depth, chunk_size=self.chunk_size))
+            if not ASYNC_STREAMING:
+                frames = [frame async for frame in frames]
+            return StreamingHttpResponse(frames, content_type=DELIMITED_CONTENT_TYPE)
+
+        wrapper = await sync_to_async(queryset.to_pb_container)(
+            self.wrapper_message, self.get_wrapper_field(queryset.model), depth=self.depth, chunk_size=self.chunk_size)
+        return self.render_to_pb_response(wrapper)
+
+    @staticmethod
+    async def _aiter_frames(messages):
+        async for message in messages:
+            yield encode_delimited(message.SerializeToString())
+
+
+class ProtoBufIngestView(WrapperMessageMixin, View):
+    """Write messages of ``model`` posted as length-delimited messages, or as
+    a single ``wrapper_message``, and respond with the status of each one
+
+    The request body is read one message at a time and messages are written
+    in batches, each within its own transaction. The mode is one of
+    ``create``, ``upsert`` (see :func:`pb_model.ingestion.bulk_upsert`) or
+    ``validate``, which writes as upsert does and rolls back. It can be set
+    per request with the ``mode`` query parameter.
+
+    A batch failing to write is rolled back and all of its messages are
+    reported as errors, batches already written are kept.
+
+    :ivar model: ProtoBufMixin model class of posted messages
+    :ivar mode: default mode
+    :ivar modes: modes allowed by the ``mode`` query parameter
+    :ivar batch_size: number of messages written per transaction
+    :ivar max_size: maximum size in bytes of a single message, None for no limit
+    :ivar resolve_existing: see :class:`pb_model.ingestion.IngestionContext`
+    """
+    model = None
+    mode = CREATE
+    modes = (CREATE, UPSERT, VALIDATE)
+    batch_size = 500
+    max_size = None
+    resolve_existing = False
+
+    def post(self, request, *args, **kwargs):
+        mode = request.GET.get('mode', self.mode)
+        if mode not in self.modes:
+            return JsonResponse({'error': "Unsupported mode {}".format(mode)}, status=400)
+
+        results, frames, error = [], [], None
+        try:
+            for frame in self.iter_frames(request):
+                frames.append(frame)
+                if len(frames) >= self.batch_size:
+                    results.extend(self.write_batch(frames, len(results), mode))
+                    frames = []
+        except DjangoPBModelError as e:
+            error = str(e)
+        if frames:
+            results.extend(self.write_batch(frames, len(results), mode))
+
+        data = {'results': results, 'counts': collections.Counter(r['status'] for r in results)}
+        if error is not None:
+            data['error'] = error
+        return JsonResponse(data, status=200 if error is None else 400)
+
+    def iter_frames(self, request):
+        """Getting serialized messages of the request body, read incrementally
+
+        :raises DjangoPBModelError: if the body is truncated or malformed
+        """
+        if self.wrapper_message is None:
+            return iter_delimited(request, max_size=self.max_size)
+        field_name = self.get_wrapper_field(self.model)
+        field_number = self.wrapper_message.DESCRIPTOR.fields_by_name[field_name].number
+        return iter_repeated_field(request, field_number, max_size=self.max_size)
+
+    def write_batch(self, frames, first_index, mode):
+        """Decode, convert and write a batch of serialized messages
+
+        :param frames: list of serialized messages
+        :param first_index: index of the first message in the request
+        :param mode: ``create``, ``upsert`` or ``validate``
+        :returns: list of per message status dicts
+        """
+        results = [{'index': index, 'status': None} for index in range(first_index, first_index + len(frames))]
+        context = IngestionContext(resolve_existing=self.resolve_existing)
+
+        pb_objs = []
+        for result, frame in zip(results, frames):
+            try:
+                pb_objs.append((result, self.model.pb_model.FromString(frame)))
+            except Exception as e:
+                self._set_error(result, "Can't decode message: {}".format(e))
+
+        using = router.db_for_write(self.model)
+        try:
+            if self.resolve_existing:
+                context.preload(self.model, [pb_obj for _, pb_obj in pb_objs])
+            converted, instances = [], []
+            for result, pb_obj in pb_objs:
+                try:
+                    instances.append(context.from_pb(self.model, pb_obj))
+                    converted.append(result)
+                except Exception as e:
+                    self._set_error(result, "Can't convert message: {}".format(e))
+
+            with transaction.atomic(using=using):
+                context.validate_references()
+                if mode == CREATE:
+                    bulk_save(self.model, instances, using=using, batch_size=self.batch_size)
+                    statuses = ['created'] * len(instances)
+                else:
+                    created = bulk_upsert(self.model, instances, using=using, batch_size=self.batch_size)
+                    statuses = ['created' if c else 'updated' for c in created]
+                if mode == VALIDATE:
+                    statuses = ['valid'] * len(instances)
+                    transaction.set_rollback(True, using=using)
+        except Exception as e:
+            for result in results:
+                if result['status'] is None:
+                    self._set_error(result, str(e))
+            return results
+
+        for result, status in zip(converted, statuses):
+            result['status'] = status
+        return results
+
+    @staticmethod
+    def _set_error(result, error):
+        result['status'] = 'error'
+        result['error'] = error
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark runner, with the same settings as runtests.py against an in-memory
+SQLite database:
+
+    python runbenchmarks.py --rows 1000 --iterations 50 --output results.json
+"""
+
+import argparse
+import json
+import os, sys
+from django.conf import settings
+from django.apps import apps
+
+BASE_DIR = os.path.dirname(__file__)
+settings.configure(
+    DEBUG=False,
+    DATABASES={
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'ENCODING': 'utf-8',
+            'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        }
+    },
+    INSTALLED_APPS=[
+        'pb_model',
+        'pb_model.tests',
+    ],
+    USE_TZ = True,
+)
+
+apps.populate(settings.INSTALLED_APPS)
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from pb_model.benchmarks import harness, imports, suites
+
+parser = argparse.ArgumentParser(description='Benchmark to_pb/from_pb conversion')
+parser.add_argument('--rows', type=int, default=1000, help='rows of the synthetic dataset')
+parser.add_argument('--iterations', type=int, default=20, help='measured calls per case')
+parser.add_argument('--filter', help='only run cases whose name contains this string')
+parser.add_argument('--import-runs', type=int, default=5,
+                    help='fresh interpreters measuring import time, 0 to skip')
+parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+args = parser.parse_args()
+
+setup_test_environment()
+old_name = connection.creation.create_test_db(verbosity=0)
+try:
+    results = harness.run(suites.cases(args.rows), args.iterations,
+                          name_filter=args.filter, log=sys.stderr)
+    results['environment']['rows'] = args.rows
+    if args.import_runs:
+        results['imports'] = imports.import_time(runs=args.import_runs)
+finally:
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+
+if args.output:
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+else:
+    json.dump(results, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
@@ -18,6 +18,8 @@ settings.configure(
             'ENGINE': 'django.db.backends.sqlite3',
             'ENCODING': 'utf-8',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            # file-backed, so worker processes of pb_model.parallel share it
+            'TEST': {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')},
         }
     },
     INSTALLED_APPS=[
@@ -25,9 +25,12 @@ setup(
     description='Protobuf mixin for Django model',
     author='myyang',
     author_email='ymy1019@gmail.com',
+    python_requires='>=3.6',
     install_requires=[
-        'django>=1.11',
-        'protobuf>=3.1',
+        'django>=3.1',
+        # wire format and JSON conversion check values with the internal
+        # type_checkers of protobuf 3
+        'protobuf>=3.1,<4',
     ],
     classifiers=[
         'Environment :: Web Environment',
@@ -37,6 +40,7 @@ setup(
         'Operating System :: OS Independent',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: Internet :: WWW/HTTP :: Dynamic Content',
     ],